@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# Check resumable MODIS downloads against a local server
+# Runs `3b_parameters/MODIS_MCD12Q1_V6/1_download/download_modis_mcd12q1_v6.py` against a small HTTP server on this
+# machine that serves a single test file. The server supports 'Range' and 'If-Range' requests in the same way as the
+# EarthData server. Each check starts from a different partial download and confirms that the download script asks for
+# the right bytes and ends with a file that is identical to the one on the server.
+#
+# Usage:
+#   MODIS_check_download_resume.py [file_size_mb (default 2)]
+#
+# Checks:
+# - connection drops part-way: the download resumes from the end of the partial file in the same run;
+# - resume from an earlier run: a partial file and download state exist, only the remainder is requested;
+# - file changed on the server: the 'If-Range' validator no longer matches and the full file is downloaded again;
+# - rejected range, unknown size: the server returns HTTP 416, the partial file is discarded and the download restarts;
+# - rejected range, complete file: the server returns HTTP 416 because the partial file is complete, nothing is downloaded.
+#
+# Notes:
+# - Does not use `control_active.txt`. The download script is run in a temporary copy of the workflow folders, with a
+#   control file made from `control_Bow_at_Banff.txt`, a download links file and dummy login details;
+# - The links file also contains a file of a MODIS tile outside the domain, which should never be requested.
+
+# modules
+import os
+import re
+import sys
+import json
+import socket
+import hashlib
+import tempfile
+import threading
+import subprocess
+import http.server
+from pathlib import Path
+from shutil import copyfile
+
+
+# --- Settings
+# Workflow folders
+repo_path = Path(__file__).resolve().parent.parent
+script_folder = Path('3b_parameters/MODIS_MCD12Q1_V6/1_download')
+script_name = 'download_modis_mcd12q1_v6.py'
+control_template = repo_path / '0_control_files' / 'control_Bow_at_Banff.txt'
+
+# Test file; the Bow at Banff domain is covered by a single MODIS tile (h10v03)
+file_name = 'MCD12Q1.A2007001.h10v03.006.2018145222617.hdf'
+other_name = 'MCD12Q1.A2007001.h22v02.006.2018145224134.hdf' # tile outside the domain
+file_size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 2 * 1024 * 1024
+
+# Maximum time [s] a single check may take
+check_timeout = 120
+
+
+# --- Test server
+# Serves the test file with 'Range' and 'If-Range' support and records the requests it receives
+class TileServer(http.server.ThreadingHTTPServer):
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), TileHandler)
+        self.set_file(os.urandom(file_size), 'v1')
+        self.drop_after = None # number of bytes after which the next response is cut off
+        self.requests = []
+
+    def set_file(self, data, version):
+        self.data = data
+        self.etag = '"{}-{}"'.format(version, hashlib.md5(data).hexdigest()[:8])
+
+class TileHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        return # keep the output of the checks readable
+
+    def send(self, status, body=b'', headers={}):
+        self.send_response(status)
+        for key, val in headers.items():
+            self.send_header(key, val)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', self.server.etag)
+        self.end_headers()
+
+        # Cut the connection part-way through the response if requested
+        drop_after, self.server.drop_after = self.server.drop_after, None
+        if drop_after is not None:
+            self.wfile.write(body[:drop_after])
+            self.wfile.flush()
+            self.connection.shutdown(socket.SHUT_RDWR)
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        byte_range = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+
+        # Decide how to respond
+        if self.path.lstrip('/') != file_name:
+            status = 404
+        elif byte_range is None or (if_range is not None and if_range != server.etag):
+            status = 200
+        elif int(byte_range.split('=')[1].split('-')[0]) >= len(server.data):
+            status = 416
+        else:
+            status = 206
+        server.requests.append((byte_range, if_range, status))
+
+        # Respond
+        if status == 404:
+            self.send(404)
+        elif status == 200:
+            self.send(200, server.data)
+        elif status == 416:
+            self.send(416, headers={'Content-Range': 'bytes */{}'.format(len(server.data))})
+        else:
+            start = int(byte_range.split('=')[1].split('-')[0])
+            self.send(206, server.data[start:],
+                      headers={'Content-Range': 'bytes {}-{}/{}'.format(start, len(server.data)-1, len(server.data))})
+
+
+# --- Temporary workflow folders
+# Function to make a control file line with a new value
+def set_setting(control, setting, value):
+    return re.sub(r'^({}\s*\|\s*)\S+'.format(setting), lambda match: match.group(1) + value, control, flags=re.M)
+
+# Function to read a setting from the control file text
+def read_setting(control, setting):
+    return re.search(r'^{}\s*\|\s*(\S+)'.format(setting), control, flags=re.M).group(1)
+
+# Function to create the folders, control file and login details that the download script needs
+def make_workflow(tmp, url):
+
+    # Control file; downloads go to the temporary folder and the shared data cache is not used
+    control = control_template.read_text()
+    control = set_setting(control, 'root_path', str(tmp / 'data'))
+    control = set_setting(control, 'data_cache_path', 'none')
+    control = set_setting(control, 'parameter_land_dl_workers', '1')
+    (tmp / '0_control_files').mkdir()
+    (tmp / '0_control_files' / 'control_active.txt').write_text(control)
+
+    # Shared modules and the download script
+    (tmp / '0_tools').symlink_to(repo_path / '0_tools', target_is_directory=True)
+    (tmp / script_folder).mkdir(parents=True)
+    copyfile(repo_path / script_folder / script_name, tmp / script_folder / script_name)
+
+    # Download links; the default links file location is the script folder
+    links_file = read_setting(control, 'parameter_land_list_name')
+    (tmp / script_folder / links_file).write_text(url + other_name + '\n' + url + file_name + '\n')
+
+    # Dummy login details
+    (tmp / '.netrc').write_text('machine urs.earthdata.nasa.gov\nlogin test\npassword test\n')
+    (tmp / '.netrc').chmod(0o600)
+
+    # Folder the file is downloaded to
+    return tmp / 'data' / 'domain_BowAtBanff' / 'parameters' / 'landclass' / '1_MODIS_raw_data'
+
+# Function to run the download script
+def run_download(tmp):
+    env = dict(os.environ, HOME=str(tmp)) # login details are read from ~/.netrc
+    return subprocess.run([sys.executable, script_name], cwd=tmp / script_folder, env=env, timeout=check_timeout,
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+
+
+# --- Checks
+# Each check prepares the server and the download folder, and lists the (status, has If-Range) of each request the
+# download script should make; the file outside the domain is never requested
+def check_drop(server, dl_path):
+    server.drop_after = file_size // 3
+    return [(200, False), (206, True)]
+
+def check_resume(server, dl_path):
+    (dl_path / (file_name + '.part')).write_bytes(server.data[:file_size//2])
+    write_state(dl_path, size=file_size, validator=server.etag)
+    return [(206, True)]
+
+def check_changed(server, dl_path):
+    (dl_path / (file_name + '.part')).write_bytes(server.data[:file_size//2])
+    write_state(dl_path, size=file_size, validator=server.etag)
+    server.set_file(os.urandom(file_size), 'v2')
+    return [(200, True)]
+
+def check_rejected(server, dl_path):
+    (dl_path / (file_name + '.part')).write_bytes(os.urandom(file_size + 100))
+    return [(416, False), (200, False)]
+
+def check_complete(server, dl_path):
+    (dl_path / (file_name + '.part')).write_bytes(server.data)
+    write_state(dl_path, size=file_size, validator=server.etag)
+    return [(416, True)]
+
+# Function to write a download state as left behind by an earlier run
+def write_state(dl_path, **values):
+    with open(dl_path / '_download_state.json', 'w') as file:
+        json.dump({file_name: dict(values, status='downloading')}, file)
+
+checks = [('connection drops part-way',        check_drop),
+          ('resume from an earlier run',       check_resume),
+          ('file changed on the server',       check_changed),
+          ('rejected range, unknown size',     check_rejected),
+          ('rejected range, complete file',    check_complete)]
+
+
+# --- Run the checks
+failed = 0
+for name, prepare in checks:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        # Start a fresh server and workflow for each check
+        server = TileServer()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        dl_path = make_workflow(tmp, 'http://127.0.0.1:{}/'.format(server.server_address[1]))
+        dl_path.mkdir(parents=True)
+        expected = prepare(server, dl_path)
+
+        # Download and compare the result with the file on the server
+        result = run_download(tmp)
+        server.shutdown()
+        server.server_close()
+        requests = [(status, if_range is not None) for _, if_range, status in server.requests]
+        problems = []
+        if result.returncode != 0:
+            problems.append('download script exited with code {}'.format(result.returncode))
+        if not (dl_path / file_name).is_file() or (dl_path / file_name).read_bytes() != server.data:
+            problems.append('downloaded file differs from the file on the server')
+        if (dl_path / (file_name + '.part')).exists():
+            problems.append('partial file was left behind')
+        if requests != expected:
+            problems.append('requests (status, If-Range) were {}, expected {}'.format(requests, expected))
+
+    # Report
+    print('{:<32} {}'.format(name, 'OK' if not problems else 'FAILED'))
+    for problem in problems:
+        print('    ' + problem)
+    if problems:
+        print('    Download script output:\n' + '\n'.join('      ' + line for line in result.stdout.splitlines()))
+        failed += 1
+
+print('{} of {} checks passed'.format(len(checks) - failed, len(checks)))
+sys.exit(1 if failed else 0)
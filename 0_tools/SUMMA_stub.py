@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# Stand-in for the SUMMA executable
+# Mimics SUMMA's command line (`-m fileManager.txt` and optionally `-g gru_start gru_count`) and the end of SUMMA's
+# terminal output, without running a simulation. Useful to test run scripts (e.g. `6_model_runs/1_run_summa_parallel.py`)
+# and log tools (e.g. `SUMMA_summarize_logs.py`) on a machine without SUMMA. To use it, set `install_path_summa` to this
+# folder and `exe_name_summa` to `SUMMA_stub.py` in the control file.
+#
+# Usage:
+#   SUMMA_stub.py -m <fileManager.txt> [-g <gru_start> <gru_count>]
+#
+# Environment variables:
+#   SUMMA_STUB_FAIL            Comma-separated list of gru_start values of runs that end with a SUMMA 'FATAL ERROR';
+#   SUMMA_STUB_CRASH           Comma-separated list of gru_start values of runs that stop without SUMMA's final message;
+#   SUMMA_STUB_SECONDS_PER_GRU Time [s] each run takes per GRU (default 0.01).
+#
+# Notes:
+# - Runs that fail or crash return a non-zero exit code, as SUMMA does;
+# - Timing lines are written in the same format as SUMMA, so that the elapsed time is found by the log tools.
+
+# modules
+import os
+import sys
+import time
+from pathlib import Path
+
+
+# --- Command line arguments
+args = sys.argv[1:]
+if '-m' not in args:
+    print(' FATAL ERROR: summa_init/no file manager specified (use -m)')
+    sys.exit(1)
+file_manager = args[args.index('-m')+1]
+if '-g' in args:
+    gru_start = int(args[args.index('-g')+1])
+    gru_count = int(args[args.index('-g')+2])
+else:
+    gru_start, gru_count = 1, 1
+
+
+# --- Run
+print(' file_suffix is ' + ('_G{:06d}-{:06d}'.format(gru_start, gru_start+gru_count-1) if '-g' in args else ''))
+print(' file_master is ' + file_manager)
+sys.stdout.flush()
+if not Path(file_manager).is_file():
+    print(' FATAL ERROR: summa_init/file manager {} not found'.format(file_manager))
+    sys.exit(1)
+
+# Pretend to run the GRUs
+start = time.time()
+time.sleep(float(os.environ.get('SUMMA_STUB_SECONDS_PER_GRU', 0.01)) * gru_count)
+elapsed = time.time() - start
+
+# End the way the selected runs end
+if str(gru_start) in os.environ.get('SUMMA_STUB_FAIL', '').split(','):
+    print(' FATAL ERROR: coupled_em/stub failure for GRUs starting at {}'.format(gru_start))
+    sys.exit(1)
+if str(gru_start) in os.environ.get('SUMMA_STUB_CRASH', '').split(','):
+    print(' 1990 1 1 0 0') # last time step written before the process stopped
+    sys.exit(137)
+
+# Timing summary and final message, as written by SUMMA
+print('')
+for part in ['init', 'setup', 'restart', 'read', 'write', 'physics']:
+    print(' elapsed {} = {:13.6f} s'.format(part, elapsed/6))
+print(' elapsed time = {:13.6f} s'.format(elapsed))
+print('    or {:13.6f} m'.format(elapsed/60))
+print('    or {:13.6f} h'.format(elapsed/3600))
+print('    or {:13.6f} d'.format(elapsed/86400))
+print('')
+print(' number threads = {:10d}'.format(1))
+print('')
+print(' FORTRAN STOP: finished simulation successfully.')
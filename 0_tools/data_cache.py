@@ -0,0 +1,333 @@
+# Shared data cache
+# Content-addressed cache for global input data (MERIT Hydro, MODIS, SOILGRIDS, ERA5 geopotential) that is shared by
+# all domains. Downloaders consult the cache before fetching a file, and add every file they fetch to the cache. Domain
+# folders get a hard link (or symbolic link) to the cached file instead of their own copy, so that overlapping domains
+# store and download the same data only once.
+#
+# Layout of the cache folder:
+# - objects/ab/abcdef...   File contents, named after their SHA-256 checksum. Identical files are stored only once.
+#                          Objects are read-only, so that a domain can't change the cached data through its link;
+# - keys/[sha1].json       Maps a key (typically the download URL) to an object, and records the checksum and size of
+#                          the object. The modification time of this file is the time the key was last used;
+# - refs/[sha256]/[sha1]   One file per domain file that links to an object, containing the path of that domain file;
+# - tmp/                   Files that are being added to the cache.
+# Every file is written to a temporary name first and then renamed, and no file is shared by different keys or links.
+# This means that multiple domains (processes, cluster jobs) can use the cache at the same time without locking.
+#
+# Workflow scripts use this file as a module:
+#   sys.path.append('../../../0_tools')
+#   import data_cache
+#   data_cache.fetch(cache_path, key, target, link)                        # True if 'target' was linked from the cache
+#   data_cache.store(cache_path, key, target, link, size_budget)           # adds 'target' to the cache
+#
+# Usage from the command line:
+#   python data_cache.py <cache_path> status                    # summarize the cache contents
+#   python data_cache.py <cache_path> verify                    # recompute all checksums, remove corrupt objects
+#   python data_cache.py <cache_path> evict <size_budget_gb>    # remove unused objects until the budget is met
+#
+# Notes:
+# - Objects are checked against their recorded size every time they are used and against their checksum when they
+#   are added and when the cache is verified;
+# - Eviction only removes objects that are not linked to by any domain file, least recently used first. Links are
+#   tracked in 'refs/'; a link that no longer exists (e.g. a deleted domain folder) no longer counts;
+# - Hard links require the cache and the domain folders to be on the same file system. If a hard link can't be made,
+#   a symbolic link is used instead.
+
+# modules
+import os
+import sys
+import json
+import errno
+import uuid
+import shutil
+import hashlib
+from pathlib import Path
+
+
+# --- Settings
+# Size of the chunks in which files are read to compute checksums [bytes]
+chunk_size = 1024*1024
+
+
+# --- Cache layout
+# Function to compute the checksum of a file
+def hash_file(file):
+    checksum = hashlib.sha256()
+    with open(file, 'rb') as data:
+        for chunk in iter(lambda: data.read(chunk_size), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+# Function to find where an object is stored
+def object_path(cache_path, digest):
+    return Path(cache_path) / 'objects' / digest[:2] / digest
+
+# Function to find where the record of a key is stored
+def key_path(cache_path, key):
+    return Path(cache_path) / 'keys' / (hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+# Function to find where the reference of a domain file to an object is stored
+def ref_path(cache_path, digest, target):
+    return Path(cache_path) / 'refs' / digest / hashlib.sha1(os.path.abspath(target).encode()).hexdigest()
+
+# Function to make a unique temporary file name inside the cache
+def temp_path(cache_path):
+    path = Path(cache_path) / 'tmp'
+    path.mkdir(parents=True, exist_ok=True)
+    return path / uuid.uuid4().hex
+
+# Function to write a small text file in one go, so that it is never incomplete
+def write_atomic(file, text):
+    file.parent.mkdir(parents=True, exist_ok=True)
+    temp = file.with_name(file.name + '.' + uuid.uuid4().hex)
+    with open(temp, 'w') as out:
+        out.write(text)
+    os.replace(temp, file)
+    return
+
+# Function to remove a file that may already have been removed by another process
+def remove(file):
+    try:
+        os.remove(file)
+    except FileNotFoundError:
+        pass
+    return
+
+
+# --- Keys and links
+# Function to read the record of a key; returns None if the key is not in the cache
+def read_key(cache_path, key):
+    try:
+        with open(key_path(cache_path, key)) as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+# Function to check if a domain file is a (hard or symbolic) link to an object
+def is_linked(obj, target):
+    try:
+        if os.path.islink(target):
+            return os.path.realpath(target) == os.path.realpath(obj)
+        return os.path.samefile(target, obj)
+    except OSError:
+        return False
+
+# Function to replace a domain file with a link to an object
+def link_object(obj, target, link='hard'):
+
+    # Make the link under a temporary name first, then replace the domain file in one go
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temp = target.with_name(target.name + '.cachelink')
+    remove(temp)
+    if link == 'hard':
+        try:
+            os.link(obj, temp)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise # e.g. FileNotFoundError if the object was evicted in the meantime
+            os.symlink(os.path.realpath(obj), temp) # cache on a different file system, or no hard links allowed
+    else:
+        os.symlink(os.path.realpath(obj), temp)
+    os.replace(temp, target)
+    return
+
+# Function to record that a domain file links to an object
+def add_ref(cache_path, digest, target):
+    write_atomic(ref_path(cache_path, digest, target), os.path.abspath(target))
+    return
+
+# Function to find the domain files that still link to an object; references to files that don't are removed
+def live_refs(cache_path, digest):
+    obj = object_path(cache_path, digest)
+    refs = []
+    folder = Path(cache_path) / 'refs' / digest
+    if not folder.is_dir():
+        return refs
+    for ref in folder.iterdir():
+        try:
+            target = ref.read_text()
+        except FileNotFoundError:
+            continue
+        if is_linked(obj, target):
+            refs.append(target)
+        else:
+            remove(ref)
+    return refs
+
+
+# --- Fetch and store
+# Function to link a domain file to the cached object of a key. Returns True if successful and False if the key is not
+# in the cache (or its object is missing or damaged), in which case the file needs to be downloaded as usual
+def fetch(cache_path, key, target, link='hard'):
+
+    # Check if we use a cache
+    if cache_path is None:
+        return False
+
+    # Find the object
+    record = read_key(cache_path, key)
+    if record is None:
+        return False
+    obj = object_path(cache_path, record['sha256'])
+
+    # Check that the object exists and is complete; forget the key if not
+    if not obj.is_file() or obj.stat().st_size != record['size']:
+        remove(key_path(cache_path, key))
+        return False
+
+    # Link the domain file to the object and keep track of the reference
+    try:
+        link_object(obj, target, link)
+    except FileNotFoundError: # object was evicted in the meantime
+        return False
+    add_ref(cache_path, record['sha256'], target)
+
+    # Mark the key as recently used
+    os.utime(key_path(cache_path, key))
+
+    return True
+
+# Function to add a downloaded domain file to the cache under a given key. The domain file is replaced by a link to the
+# cached object. If a size budget [bytes] is given, unused objects are evicted afterwards until the cache fits
+def store(cache_path, key, target, link='hard', size_budget=None):
+
+    # Check if we use a cache
+    if cache_path is None:
+        return None
+
+    # Find the object this file belongs to
+    digest = hash_file(target)
+    size = os.path.getsize(target)
+    obj = object_path(cache_path, digest)
+
+    # Add the object if we don't have it yet; identical files are stored only once
+    if not obj.is_file():
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        temp = temp_path(cache_path)
+        try:
+            os.link(target, temp) # no copy needed if the cache is on the same file system
+        except OSError:
+            shutil.copyfile(target, temp)
+        os.chmod(temp, 0o444)
+        os.replace(temp, obj)
+
+    # Record the key
+    write_atomic(key_path(cache_path, key), json.dumps({'key': key, 'sha256': digest, 'size': size}))
+
+    # Replace the domain file with a link to the object, unless it already is one
+    if not is_linked(obj, target):
+        try:
+            link_object(obj, target, link)
+        except FileNotFoundError: # object was evicted in the meantime; keep the domain file as it is
+            return None
+    add_ref(cache_path, digest, target)
+
+    # Stay within the size budget
+    if size_budget is not None:
+        evict(cache_path, size_budget)
+
+    return obj
+
+
+# --- Maintenance
+# Function to list all objects with their size and the keys that point to them
+def list_objects(cache_path):
+
+    # Find the objects
+    objects = {}
+    for obj in (Path(cache_path) / 'objects').glob('*/*'):
+        try:
+            objects[obj.name] = {'size': obj.stat().st_size, 'keys': [], 'last_used': 0}
+        except FileNotFoundError:
+            continue
+
+    # Find the keys that point to each object and when each object was last used
+    for file in (Path(cache_path) / 'keys').glob('*.json'):
+        try:
+            with open(file) as data:
+                record = json.load(data)
+            last_used = file.stat().st_mtime
+        except (FileNotFoundError, ValueError):
+            continue
+        if record['sha256'] in objects:
+            objects[record['sha256']]['keys'].append(file)
+            objects[record['sha256']]['last_used'] = max(objects[record['sha256']]['last_used'], last_used)
+
+    return objects
+
+# Function to remove an object, the keys that point to it and its references
+def remove_object(cache_path, digest, keys):
+    for file in keys:
+        remove(file)
+    remove(object_path(cache_path, digest))
+    shutil.rmtree(Path(cache_path) / 'refs' / digest, ignore_errors=True)
+    return
+
+# Function to remove unused objects, least recently used first, until the cache is no larger than the size budget
+# [bytes]. Objects that are linked to by a domain file are never removed. Returns the removed objects
+def evict(cache_path, size_budget):
+
+    # Check the cache size
+    objects = list_objects(cache_path)
+    total = sum(obj['size'] for obj in objects.values())
+    if total <= size_budget:
+        return []
+
+    # Remove unused objects, oldest first
+    removed = []
+    for digest in sorted(objects, key=lambda digest: objects[digest]['last_used']):
+        if total <= size_budget:
+            break
+        if len(live_refs(cache_path, digest)) > 0:
+            continue
+        remove_object(cache_path, digest, objects[digest]['keys'])
+        total -= objects[digest]['size']
+        removed.append(digest)
+
+    # Warn if all remaining objects are in use
+    if total > size_budget:
+        print('Warning: data cache {} uses {:.1f} GB, which is more than its budget of {:.1f} GB, '
+              'but all remaining files are in use by a domain.'.format(cache_path, total/1e9, size_budget/1e9))
+
+    return removed
+
+# Function to recompute the checksum of every object and remove objects that are damaged. Returns the removed objects
+def verify(cache_path):
+    removed = []
+    for digest,obj in list_objects(cache_path).items():
+        if hash_file(object_path(cache_path, digest)) != digest:
+            print('Checksum mismatch for {}, removing it from the cache. Linked domain files: {}'.format(
+                   digest, live_refs(cache_path, digest)))
+            remove_object(cache_path, digest, obj['keys'])
+            removed.append(digest)
+    return removed
+
+# Function to summarize the cache contents
+def status(cache_path):
+    objects = list_objects(cache_path)
+    in_use = {digest: live_refs(cache_path, digest) for digest in objects}
+    print('Data cache {}'.format(cache_path))
+    print('- {} files, {:.2f} GB'.format(len(objects), sum(obj['size'] for obj in objects.values())/1e9))
+    print('- {} files in use by {} domain files'.format(sum(len(refs) > 0 for refs in in_use.values()),
+                                                        sum(len(refs) for refs in in_use.values())))
+    return
+
+
+# --- Command line use
+if __name__ == '__main__':
+
+    # Check args
+    if len(sys.argv) < 3 or sys.argv[2] not in ['status', 'verify', 'evict'] or \
+       (sys.argv[2] == 'evict' and len(sys.argv) != 4):
+        print('Usage: python {} <cache_path> status|verify|evict [size_budget_gb]'.format(sys.argv[0]))
+        sys.exit(0)
+    cache_path = Path(sys.argv[1])
+
+    # Do the requested task
+    if sys.argv[2] == 'status':
+        status(cache_path)
+    elif sys.argv[2] == 'verify':
+        print('Removed {} damaged files'.format(len(verify(cache_path))))
+    elif sys.argv[2] == 'evict':
+        print('Removed {} unused files'.format(len(evict(cache_path, float(sys.argv[3])*1e9))))
@@ -0,0 +1,160 @@
+# Domain HRU index
+# Small netCDF file that describes the SUMMA-ready forcing files of a domain: the order of the HRUs (hruId), the GRU
+# each HRU belongs to, and the time period that each forcing file covers. It is written once, when the forcing files are
+# finalized by `4b_remapping/2_forcing/3_temperature_lapsing_and_datastep.py`. Scripts that only need to know the HRU
+# order (e.g. the scripts that create the attributes, initial conditions and trial parameter files) read this index
+# instead of opening a forcing file. The time periods make the index a catalog of the forcing files: it can be used to
+# find the files that overlap a simulation period, or the file that contains a given time, without opening any file.
+#
+# Workflow scripts use this file as a module:
+#   sys.path.append('../../../0_tools')
+#   import forcing_index
+#   forcing_index.write_index(index_file, hru_ids, hru2gru_ids, files)        # files: list of dicts, see below
+#   hru_ids = forcing_index.read_hru_ids(index_file, forcing_path)            # hruId order of the forcing files
+#   index   = forcing_index.read_index(index_file)
+#   files   = forcing_index.files_in_period(index, '2008-01-01 00:00', '2008-12-31 23:00') # files that overlap
+#   file    = forcing_index.file_at(index, '2008-07-01 12:00')               # file that contains this time
+#
+# Usage from the command line:
+#   python forcing_index.py <index_file> <time>                              # file that contains this time
+#   python forcing_index.py <index_file> <start_time> <end_time>             # files that overlap this period
+#
+# Contents of the index:
+# - hruId(hru), hru2gruId(hru)       HRU IDs in the order of the forcing files and the GRU ID of each HRU;
+# - gruId(gru)                       GRU IDs in order of first occurence in 'hruId';
+# - file(file)                       Names of the forcing files, sorted;
+# - time_start(file), time_end(file) First and last time step in each forcing file;
+# - time_steps(file)                 Number of time steps in each forcing file;
+# - data_step(file)                  Size of the time step in each forcing file [s].
+#
+# Notes:
+# - If no index exists (e.g. for forcing files prepared before the index was introduced), read_hru_ids() reads the HRU
+#   order from the first forcing file in alphabetical order instead. Only the 'hruId' variable of that file is read.
+
+# modules
+import sys
+import numpy as np
+import pandas as pd
+import xarray as xr
+import netCDF4 as nc4
+from pathlib import Path
+from datetime import datetime
+
+
+# --- Writing
+# Function to describe a single forcing file: its name, first and last time step, number of time steps and time step
+# size [s]. The time step size is found from the times if it is not given
+def describe_file(name, times, data_step=None):
+    times = pd.to_datetime(np.asarray(times))
+    if data_step is None:
+        data_step = (times[1] - times[0]).total_seconds() if len(times) > 1 else 0
+    return {'file': name, 'time_start': times[0], 'time_end': times[-1], 'time_steps': len(times),
+            'data_step': int(data_step)}
+
+# Function to write the index. 'files' is a list of dictionaries as returned by describe_file()
+def write_index(index_file, hru_ids, hru2gru_ids, files):
+
+    # Sort the files by name
+    files = pd.DataFrame(files).sort_values('file')
+
+    # Make the dataset
+    index = xr.Dataset({'hruId':      ('hru',  np.asarray(hru_ids).astype('int64')),
+                        'hru2gruId':  ('hru',  np.asarray(hru2gru_ids).astype('int64')),
+                        'gruId':      ('gru',  pd.unique(np.asarray(hru2gru_ids).astype('int64'))),
+                        'file':       ('file', files['file'].values.astype(str)),
+                        'time_start': ('file', pd.to_datetime(files['time_start']).values),
+                        'time_end':   ('file', pd.to_datetime(files['time_end']).values),
+                        'time_steps': ('file', files['time_steps'].values.astype('int64')),
+                        'data_step':  ('file', files['data_step'].values.astype('int64'))})
+    index['hruId'].attrs['long_name'] = 'Index of hydrological response unit (HRU), in forcing file order'
+    index['hru2gruId'].attrs['long_name'] = 'Index of GRU to which the HRU belongs'
+    index['gruId'].attrs['long_name'] = 'Index of grouped response unit (GRU), in order of first occurence'
+    index['file'].attrs['long_name'] = 'Name of the forcing file'
+    index['time_start'].attrs['long_name'] = 'First time step in the forcing file'
+    index['time_end'].attrs['long_name'] = 'Last time step in the forcing file'
+    index['time_steps'].attrs['long_name'] = 'Number of time steps in the forcing file'
+    index['data_step'].attrs['long_name'] = 'Time step size of the forcing file'
+    index['data_step'].attrs['units'] = 's'
+    index.attrs['History'] = 'Created ' + datetime.now().strftime('%Y/%m/%d %H:%M:%S')
+
+    # Write to a temporary file first, so that an incomplete index is never read
+    index_file = Path(index_file)
+    index_file.parent.mkdir(parents=True, exist_ok=True)
+    temp = index_file.with_name(index_file.name + '.tmp')
+    index.to_netcdf(temp)
+    temp.replace(index_file)
+    return index_file
+
+
+# --- Reading
+# Function to read the full index
+def read_index(index_file):
+    with xr.open_dataset(index_file) as index:
+        return index.load()
+
+# Function to find the hruId order of the forcing files. Uses the index if it exists, and the first forcing file in
+# alphabetical order otherwise
+def read_hru_ids(index_file, forcing_path=None):
+    if Path(index_file).is_file():
+        with nc4.Dataset(index_file) as index:
+            return np.asarray(index['hruId'][:]).astype(int)
+    if forcing_path is None:
+        raise FileNotFoundError('Forcing index {} not found.'.format(index_file))
+    forcing_files = sorted(file for file in Path(forcing_path).iterdir() if file.suffix == '.nc')
+    if len(forcing_files) == 0:
+        raise FileNotFoundError('Forcing index {} not found, and no forcing files in {}.'.format(index_file, forcing_path))
+    print('Forcing index {} not found, using the HRU order of {}'.format(index_file, forcing_files[0]))
+    with nc4.Dataset(forcing_files[0]) as forc:
+        return np.asarray(forc['hruId'][:]).astype(int) # 'hruId' is prescribed by SUMMA so this variable must exist
+
+# Function to find the forcing files that contain data for (part of) a period, in order of time
+def files_in_period(index, start, end):
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    files = index[['file', 'time_start', 'time_end']].to_dataframe().reset_index().sort_values('time_start')
+    files = files[(files['time_end'] >= start) & (files['time_start'] <= end)]
+    return list(files['file'].astype(str))
+
+# Function to find the forcing file that contains a given time
+def file_at(index, time):
+    files = files_in_period(index, time, time)
+    if len(files) == 0:
+        raise KeyError('No forcing file contains time {}.'.format(time))
+    return files[0]
+
+# Function to check that a list of forcing files (in order of time) covers a period without gaps. Returns a list of
+# problems, which is empty if the period is fully covered
+def check_coverage(index, files, start, end):
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    problems = []
+    if len(files) == 0:
+        return ['No forcing files overlap {} to {}'.format(start, end)]
+    info = index.sel(file=files)
+    time_start = pd.to_datetime(info['time_start'].values)
+    time_end = pd.to_datetime(info['time_end'].values)
+    steps = pd.to_timedelta(info['data_step'].values, unit='s') if 'data_step' in info else [pd.Timedelta(0)]*len(files)
+    if time_start[0] > start:
+        problems.append('Forcing starts at {}, after the start of the period ({})'.format(time_start[0], start))
+    if time_end[-1] < end:
+        problems.append('Forcing ends at {}, before the end of the period ({})'.format(time_end[-1], end))
+    for i in range(1,len(files)):
+        if time_start[i] > time_end[i-1] + steps[i-1]:
+            problems.append('Gap in forcing between {} ({}) and {} ({})'.format(files[i-1], time_end[i-1],
+                                                                              files[i], time_start[i]))
+    return problems
+
+
+# --- Command line use
+if __name__ == '__main__':
+
+    # Check args
+    if len(sys.argv) not in [3,4]:
+        print('Usage: python {} <index_file> <time> | <start_time> <end_time>'.format(sys.argv[0]))
+        sys.exit(0)
+    index = read_index(sys.argv[1])
+
+    # Find the file(s)
+    if len(sys.argv) == 3:
+        print(file_at(index, sys.argv[2]))
+    else:
+        for file in files_in_period(index, sys.argv[2], sys.argv[3]):
+            print(file)
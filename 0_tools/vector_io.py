@@ -0,0 +1,155 @@
+# Vector file input and output
+# Reads and writes the vector files the workflow creates for its own use (e.g. the sorted catchment and its
+# intersections with the DEM, soil and land class maps) as GeoParquet, GeoPackage or shapefile. The format is set by
+# `vector_format` in the control file. Shapefiles provided by the user (e.g. the catchment and river network) are only
+# read as an import format, and shapefiles are only written for tools that require them (e.g. EASYMORE).
+#
+# Workflow scripts use this file as a module:
+#   sys.path.append('../../0_tools')
+#   import vector_io
+#   file = vector_io.find_vector(path/'catchment.shp', vector_format) # workflow's own version of the file, if it exists
+#   shp  = vector_io.read_vector(file, columns=['HRU_ID'])            # only reads the geometry and the listed columns
+#   shp  = vector_io.read_vector(file, columns=['HRU_ID'], geometry=False, dtypes={'HRU_ID': 'int32'}) # table only
+#   csv  = vector_io.read_table(path/'intersection.csv', columns=['HRU_ID'])  # tables without geometry (.csv)
+#   vector_io.write_vector(shp, path/'catchment.shp', vector_format)  # writes 'catchment.parquet' for 'parquet'
+#
+# Notes:
+# - GeoParquet is a columnar format. Reading only the required columns avoids reading the full file, which makes
+#   reading large catchments (100k+ HRUs) much faster than reading a shapefile. GeoParquet requires the `pyarrow` package;
+# - GeoParquet and GeoPackage have no limit on the length of field names (shapefiles are limited to 10 characters);
+# - GeoPackages contain a spatial index. GeoParquet files contain the bounding box of each geometry if the geopandas
+#   version supports this. A spatial index of the geometries that are read is available as `shp.sindex` in all cases.
+# - Tables without geometries are read through Arrow (`pyarrow`, or `pyogrio` for GeoPackages and shapefiles) where
+#   available. Geometries are then never parsed, and memory use and load time depend only on the columns that are read;
+# - Columns can be stored in compact data types (e.g. int32 IDs, uint32 pixel counts, float32 values) while reading.
+#   Integer types are only used if all values fit, so that IDs are never changed. Text IDs are left as they are.
+
+# modules
+import re
+import numpy as np
+import geopandas as gpd
+import pandas as pd
+from pathlib import Path
+
+
+# --- Settings
+# File extension of each supported format
+vector_suffixes = {'parquet': '.parquet',
+                   'gpkg':    '.gpkg',
+                   'shp':     '.shp'}
+
+# Installed geopandas version, as (major, minor). Decides which arguments gpd.read_file() accepts: 'ignore_geometry'
+# exists from 0.11, 'columns' from 1.0. Older versions pass unknown arguments on to fiona instead of raising an error
+geopandas_version = tuple(int(part) for part in re.findall(r'\d+', gpd.__version__)[:2])
+
+
+# --- File names
+# Function to find the file name that a vector file has in a given format
+def vector_file(file, vector_format):
+    if vector_format not in vector_suffixes:
+        raise ValueError('Unknown vector format {}. Use one of {}.'.format(vector_format, list(vector_suffixes)))
+    return Path(file).with_suffix(vector_suffixes[vector_format])
+
+# Function to find the workflow's own version of a vector file if it exists, or the (imported) file itself otherwise
+def find_vector(file, vector_format):
+    internal = vector_file(file, vector_format)
+    if internal.is_file():
+        return internal
+    return Path(file)
+
+
+# --- Reading
+# Function to find the column names in a vector file, without reading the data
+def vector_columns(file):
+    file = Path(file)
+    if file.suffix == '.parquet':
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(file).names)
+    try:
+        import pyogrio
+        return list(pyogrio.read_info(file)['fields']) + ['geometry']
+    except ImportError:
+        import fiona
+        with fiona.open(file) as src:
+            return list(src.schema['properties']) + ['geometry']
+
+# Function to store columns in compact data types, e.g. {'HRU_ID': 'int32', 'USGS_1': 'uint32', 'elev_mean': 'float32'}.
+# Integer types are only used for integer columns whose values all fit in the new type; other columns are left as is
+def compact_dtypes(data, dtypes):
+    for column,dtype in dtypes.items():
+        if column not in data.columns:
+            continue
+        dtype = np.dtype(dtype)
+        if dtype.kind in 'iu':
+            if data[column].dtype.kind not in 'iu':
+                continue # e.g. text IDs, or counts with missing values
+            limits = np.iinfo(dtype)
+            if len(data) > 0 and (data[column].min() < limits.min or data[column].max() > limits.max):
+                continue
+        data[column] = data[column].astype(dtype)
+    return data
+
+# Function to read a vector file. If 'columns' is given, only these columns (and the geometry) are returned. If
+# 'geometry' is False, no geometries are read and a DataFrame is returned. 'dtypes' optionally specifies compact data
+# types for some of the columns, see compact_dtypes()
+def read_vector(file, columns=None, geometry=True, dtypes=None):
+    file = Path(file)
+    columns = None if columns is None else list(columns)
+
+    # GeoParquet; only the requested columns are read from file
+    if file.suffix == '.parquet':
+        if not geometry:
+            data = pd.read_parquet(file, columns=columns)
+        else:
+            if columns is not None and 'geometry' not in columns:
+                columns = columns + ['geometry']
+            data = gpd.read_parquet(file, columns=columns)
+        return compact_dtypes(data, dtypes or {})
+
+    # GeoPackage or shapefile without geometries; read as an Arrow table if pyogrio supports this
+    if not geometry:
+        try:
+            import pyogrio
+            data = pyogrio.read_dataframe(file, columns=columns, read_geometry=False, use_arrow=True)
+            return compact_dtypes(pd.DataFrame(data), dtypes or {})
+        except (ImportError, TypeError):
+            pass
+
+    # GeoPackage or shapefile; only the requested columns are read from file if the geopandas version supports this
+    if geopandas_version >= (1, 0):
+        data = gpd.read_file(file, columns=columns, ignore_geometry=not geometry)
+    elif geopandas_version >= (0, 11):
+        data = gpd.read_file(file, ignore_geometry=not geometry)
+    else:
+        data = gpd.read_file(file)
+    if not geometry and 'geometry' in data.columns:
+        data = pd.DataFrame(data.drop(columns='geometry'))
+    if columns is not None:
+        data = data[columns + (['geometry'] if geometry and 'geometry' not in columns else [])]
+    return compact_dtypes(data, dtypes or {})
+
+# Function to read a table without geometries (e.g. a .csv file written by EASYMORE). Only the columns in 'columns' are
+# read; the file is parsed by Arrow if the pandas version supports this
+def read_table(file, columns=None, dtypes=None):
+    try:
+        data = pd.read_csv(file, usecols=columns, engine='pyarrow')
+    except (ImportError, ValueError):
+        data = pd.read_csv(file, usecols=columns)
+    return compact_dtypes(data, dtypes or {})
+
+
+# --- Writing
+# Function to write a vector file in a given format. Returns the name of the file that was written
+def write_vector(data, file, vector_format):
+    file = vector_file(file, vector_format)
+    file.parent.mkdir(parents=True, exist_ok=True)
+    if vector_format == 'parquet':
+        try:
+            data.to_parquet(file, index=False, write_covering_bbox=True) # per-geometry bounding boxes
+        except TypeError:
+            data.to_parquet(file, index=False)
+    elif vector_format == 'gpkg':
+        data.to_file(file, driver='GPKG') # includes a spatial index
+    else:
+        data.to_file(file)
+    return file
@@ -9,11 +9,16 @@
 import cdsapi    # copernicus connection
 import calendar  # to find days per month
 import os        # to check if file already exists
+import sys       # to find the shared data cache functions
 import math
 from pathlib import Path
 from shutil import copyfile
 from datetime import datetime
 
+# Shared data cache functions, see 0_tools/data_cache.py
+sys.path.append('../../0_tools')
+import data_cache
+
 
 # --- Control file handling
 
@@ -73,6 +78,23 @@ else:
 geoPath.mkdir(parents=True, exist_ok=True)
 
 
+# --- Shared data cache
+# Find the shared data cache
+cache_path = read_from_control(controlFolder/controlFile,'data_cache_path')
+
+# Specify the default paths if required
+if cache_path == 'default':
+    cache_path = Path( read_from_control(controlFolder/controlFile,'root_path') ) / '_data_cache' # outputs a Path()
+elif cache_path == 'none':
+    cache_path = None # don't use a cache
+else:
+    cache_path = Path(cache_path) # make sure a user-specified path is a Path()
+
+# Find how domain files link to the cache and how large the cache may become
+cache_link = read_from_control(controlFolder/controlFile,'data_cache_link')
+cache_budget = float(read_from_control(controlFolder/controlFile,'data_cache_size_gb')) * 1e9 # [GB] to [bytes]
+
+
 # --- Find spatial domain from control file
 
 # Find the spatial extent the data needs to cover
@@ -125,6 +147,13 @@ date = '2019-01-01'
 # Specify a filename
 file = geoPath / 'ERA5_geopotential.nc'
 
+# Key under which the file is stored in the shared data cache; domains with the same download area get the same file
+cache_key = 'era5/reanalysis-era5-complete/invariants/' + coordinates + '/' + date
+
+# if file doesn't yet exist, link it from the shared data cache if another domain downloaded it already
+if not os.path.isfile(file) and data_cache.fetch(cache_path, cache_key, file, cache_link):
+    print('Linked ' + str(file) + ' from the shared data cache')
+
 # if file doesn't yet exist, download the data
 if not os.path.isfile(file):
 
@@ -158,6 +187,10 @@ if not os.path.isfile(file):
             continue
         else:
             break
+    
+    # Add the file to the shared data cache so that other domains don't need to download it
+    if retries_cur <= retries_max:
+        data_cache.store(cache_path, cache_key, file, cache_link, cache_budget)
             
             
 # --- Code provenance
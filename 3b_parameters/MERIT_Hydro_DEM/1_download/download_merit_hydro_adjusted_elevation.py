@@ -6,6 +6,20 @@
 # - Find data locations;
 # - Determine the files that need to be downloaded to cover the modelling domain;
 # - Download data.
+#
+# Download strategy:
+# - Tiles are downloaded in parallel with a bounded number of workers (`parameter_dem_dl_workers`) that share a
+#   single pooled HTTP session, so connections and authentication are reused between requests;
+# - Tiles are first downloaded into a partial file '[tile].part'. If a download fails, the next attempt sends an HTTP
+#   'Range' request and continues from the end of the partial file instead of starting from zero. If the server ignores
+#   the range request (or the file changed on the server), the partial file is discarded and the download restarts. The
+#   same happens if the server rejects the range (HTTP 416) and the partial file doesn't have the expected size;
+# - The size and server version (ETag/Last-Modified) of each tile are stored in '_download_state.json' in the download
+#   folder, so that interrupted downloads can also be resumed in a later run of this script. A tile is only renamed
+#   to its final name once it has been downloaded completely;
+# - Tiles that another domain already downloaded are linked from the shared data cache (`data_cache_path`) instead of
+#   downloaded, and newly downloaded tiles are added to the cache. See `0_tools/data_cache.py`;
+# - `0_tools/MERIT_check_download_resume.py` runs this script against a local test server to check resuming.
 
 # Modules
 from datetime import datetime
@@ -13,8 +27,16 @@ from shutil import copyfile
 from pathlib import Path
 import numpy as np
 import requests
-import shutil
+import threading
+import json
+import time
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared data cache functions, see 0_tools/data_cache.py
+sys.path.append('../../../0_tools')
+import data_cache
 
 
 # --- Control file handling
@@ -73,6 +95,23 @@ else:
 merit_path.mkdir(parents=True, exist_ok=True)
 
 
+# --- Shared data cache
+# Find the shared data cache
+cache_path = read_from_control(controlFolder/controlFile,'data_cache_path')
+
+# Specify the default paths if required
+if cache_path == 'default':
+    cache_path = Path( read_from_control(controlFolder/controlFile,'root_path') ) / '_data_cache' # outputs a Path()
+elif cache_path == 'none':
+    cache_path = None # don't use a cache
+else:
+    cache_path = Path(cache_path) # make sure a user-specified path is a Path()
+
+# Find how domain files link to the cache and how large the cache may become
+cache_link = read_from_control(controlFolder/controlFile,'data_cache_link')
+cache_budget = float(read_from_control(controlFolder/controlFile,'data_cache_size_gb')) * 1e9 # [GB] to [bytes]
+
+
 # --- Find the download area and which MERIT packages cover this area
 # Get the download url info
 merit_url = read_from_control(controlFolder/controlFile,'parameter_dem_main_url')
@@ -118,11 +157,156 @@ usr = merit_login['user']
 pwd = merit_login['pass']
 
 
-# --- Do the downloads
+# --- Download settings
+# Number of tiles to download at the same time
+download_workers = int(read_from_control(controlFolder/controlFile,'parameter_dem_dl_workers'))
+
 # Retry settings
 retries_max = 10
+retry_wait = 10 # [s], multiplied by the attempt number
+
+# Size of the chunks written to file [bytes]
+chunk_size = 64*1024
+
+# File that keeps track of download progress across runs
+state_file = merit_path / '_download_state.json'
+
+
+# --- Download state
+# Load the state of previous runs, if any
+if os.path.isfile(state_file):
+    with open(state_file) as file:
+        state = json.load(file)
+else:
+    state = {}
+
+# Make sure only one worker updates the state file at a time
+state_lock = threading.Lock()
+
+# Function to save the state file; only call this while holding the state lock
+def save_state():
+    with open(str(state_file) + '.tmp', 'w') as file:
+        json.dump(state, file, indent=1)
+    os.replace(str(state_file) + '.tmp', state_file) # replace in one go so the state file is never incomplete
+    return
+
+# Function to update and save the state of a single file
+def update_state(file_name, **values):
+    with state_lock:
+        state.setdefault(file_name, {}).update(values)
+        save_state()
+    return
+
+# Function to forget the state of a single file
+def clear_state(file_name):
+    with state_lock:
+        state.pop(file_name, None)
+        save_state()
+    return
+
+
+# --- Download function
+# Shared session; connections are pooled and re-used by all workers
+session = requests.Session()
+session.auth = (usr, pwd)
+adapter = requests.adapters.HTTPAdapter(pool_connections=download_workers, pool_maxsize=download_workers)
+session.mount('http://', adapter)
+session.mount('https://', adapter)
+
+# Function to download a single file, resuming from a partial download if possible
+def download_file(file_url, file_name):
+    
+    # Partial file that the download is written to
+    part_file = merit_path / (file_name + '.part')
+    
+    # Make sure the connection is re-tried if it fails
+    retries_cur = 1
+    while retries_cur <= retries_max:
+        try:
+            
+            # Find how much we already have and ask the server for the remainder only
+            headers = {}
+            have = os.path.getsize(part_file) if os.path.isfile(part_file) else 0
+            validator = state.get(file_name, {}).get('validator')
+            if have > 0:
+                headers['Range'] = 'bytes={}-'.format(have)
+                if validator:
+                    headers['If-Range'] = validator # server sends the full file instead if it has changed
+            
+            # 'stream = True' ensures that only response headers are downloaded initially (and not all file contents too, which are 2GB+)
+            with session.get(file_url, headers=headers, stream=True, timeout=60) as response:
+                
+                # Server can't serve the requested range
+                if response.status_code == 416 and have > 0:
+                    
+                    # Partial file is already complete
+                    if have == state.get(file_name, {}).get('size'):
+                        break
+                    
+                    # Partial file doesn't match the file on the server; discard it and start again from byte 0
+                    print('Server rejected resuming ' + file_url + ' at byte ' + str(have) + ', restarting the download')
+                    os.remove(part_file)
+                    clear_state(file_name)
+                    continue
+                
+                # Don't retry if the file doesn't exist or we're not allowed to download it
+                if response.status_code in [401, 403, 404]:
+                    print('Cannot download ' + file_url + ', server returned HTTP status ' + str(response.status_code))
+                    retries_cur = retries_max + 1
+                    break
+                response.raise_for_status()
+                
+                # Server sends the remainder of the file (206) or the full file (200)
+                if response.status_code == 206:
+                    mode = 'ab'
+                    size = int(response.headers['Content-Range'].split('/')[-1])
+                else:
+                    mode = 'wb'
+                    have = 0
+                    size = int(response.headers.get('Content-Length', -1))
+                
+                # Store what we know about this file so that later runs can resume
+                validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+                update_state(file_name, url=file_url, size=size, validator=validator, status='downloading')
+                
+                # Write to file
+                with open(part_file, mode) as data:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        data.write(chunk)
+                        have += len(chunk)
+            
+            # Check if the file is complete
+            if size >= 0 and have != size:
+                raise IOError('received {} out of {} bytes'.format(have, size))
+            
+        except Exception as e:
+            print('Error downloading ' + file_url + ' on try ' + str(retries_cur) + ' with error: ' + str(e))
+            retries_cur += 1
+            if retries_cur <= retries_max: # no need to wait after the last attempt
+                time.sleep(retry_wait * (retries_cur-1))
+            continue
+        else:
+            break
+    
+    # Give the file its final name if the download succeeded
+    if retries_cur > retries_max:
+        update_state(file_name, status='failed')
+        return False
+    os.replace(part_file, merit_path / file_name)
+    update_state(file_name, status='complete')
+    
+    # Add the file to the shared data cache so that other domains don't need to download it
+    data_cache.store(cache_path, file_url, merit_path / file_name, cache_link, cache_budget)
+    
+    # print a completion message
+    print('Successfully downloaded ' + str(merit_path) + '/' + file_url)
+    
+    return True
+
 
-# Loop over the download files
+# --- Do the downloads
+# Find the files to download
+downloads = []
 for dl_lon in dl_lons:
     for dl_lat in dl_lats:
         
@@ -133,7 +317,7 @@ for dl_lon in dl_lons:
             continue
         
         # Make the download URL
-        file_url = (merit_url + merit_template).format(dl_lat,dl_lon)
+        file_url = (merit_url + merit_template).format(dl_lat,dl_lon).strip()
         
         # Extract the filename from the URL
         file_name = file_url.split('/')[-1].strip() # Get the last part of the url, strip whitespace and characters
@@ -141,33 +325,23 @@ for dl_lon in dl_lons:
         # If file already exists in destination, move to next file
         if os.path.isfile(merit_path / file_name):
             continue
-            
-        # Make sure the connection is re-tried if it fails
-        retries_cur = 1
-        while retries_cur <= retries_max:
-            try: 
-
-                # Send a HTTP request to the server and save the HTTP response in a response object called resp
-                # 'stream = True' ensures that only response headers are downloaded initially (and not all file contents too, which are 2GB+)
-                with requests.get(file_url.strip(), auth=(usr, pwd), stream=True) as response:
-    
-                    # Decode the response
-                    response.raw.decode_content = True
-                    content = response.raw
-    
-                    # Write to file
-                    with open(merit_path / file_name, 'wb') as data:
-                        shutil.copyfileobj(content, data)
-
-                    # print a completion message
-                    print('Successfully downloaded ' + str(merit_path) + '/' + file_url)
-
-            except Exception as e:
-                print('Error downloading ' + file_url + ' on try ' + str(retries_cur) + ' with error: ' + str(e))
-                retries_cur += 1
-                continue
-            else:
-                break
+        
+        # Link the file from the shared data cache if another domain downloaded it already
+        if data_cache.fetch(cache_path, file_url, merit_path / file_name, cache_link):
+            print('Linked ' + file_name + ' from the shared data cache')
+            continue
+        
+        downloads.append((file_url, file_name))
+
+# Download the files in parallel
+with ThreadPoolExecutor(max_workers=download_workers) as pool:
+    success = list(pool.map(lambda dl: download_file(*dl), downloads))
+session.close()
+
+# Report any failed downloads; these are resumed when this script is run again
+for (file_url,_),ok in zip(downloads,success):
+    if not ok:
+        print('Failed to download ' + file_url + '. Run this script again to resume.')
                 
                 
 # --- Code provenance
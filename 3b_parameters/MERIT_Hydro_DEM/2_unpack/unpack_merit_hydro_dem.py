@@ -0,0 +1,239 @@
+# Unpack downloaded MERIT Hydro data
+# Extracts the MERIT Hydro tiles that cover the modelling domain from the downloaded `.tar` files.
+#
+# Each downloaded `.tar` file covers a 30x30 degree area and contains 5x5 degree `.tif` tiles named after their lower-left
+# corner, e.g. `elv_n30w120/n45w115_elv.tif` covers 45N-50N and 115W-110W. A domain typically needs only a few of these.
+#
+# Workflow:
+# - Find data locations and the domain bounding box;
+# - Stream through each `.tar` file and check the name of each tile against the domain bounding box;
+# - Write only the tiles that overlap the domain to the unpack folder, keeping the folder structure inside the `.tar`.
+#
+# Notes:
+# - The `.tar` files are read as a stream (front to back, no seeking). Tiles that are not needed are never written to disk;
+# - Multiple `.tar` files are processed in parallel. The number of processes is taken from environment variable
+#   `SLURM_CPUS_PER_TASK` if it exists and is 1 otherwise;
+# - Tiles that already exist in the unpack folder with the correct size are not extracted again. Tiles that another
+#   domain already extracted are linked from the shared data cache (`data_cache_path`), see `0_tools/data_cache.py`.
+
+# Modules
+import os
+import re
+import shutil
+import sys
+import tarfile
+import numpy as np
+import multiprocessing as mp
+from pathlib import Path
+from shutil import copyfile
+from datetime import datetime
+
+# Shared data cache functions, see 0_tools/data_cache.py
+sys.path.append('../../../0_tools')
+import data_cache
+
+
+# --- Control file handling
+# Easy access to control file folder
+controlFolder = Path('../../../0_control_files')
+
+# Store the name of the 'active' file in a variable
+controlFile = 'control_active.txt'
+
+# Function to extract a given setting from the control file
+def read_from_control( file, setting ):
+
+    # Open 'control_active.txt' and ...
+    with open(file) as contents:
+        for line in contents:
+
+            # ... find the line with the requested setting
+            if setting in line and not line.startswith('#'):
+                break
+
+    # Extract the setting's value
+    substring = line.split('|',1)[1]      # Remove the setting's name (split into 2 based on '|', keep only 2nd part)
+    substring = substring.split('#',1)[0] # Remove comments, does nothing if no '#' is found
+    substring = substring.strip()         # Remove leading and trailing whitespace, tabs, newlines
+
+    # Return this value
+    return substring
+
+# Function to specify a default path
+def make_default_path(suffix):
+
+    # Get the root path
+    rootPath = Path( read_from_control(controlFolder/controlFile,'root_path') )
+
+    # Get the domain folder
+    domainName = read_from_control(controlFolder/controlFile,'domain_name')
+    domainFolder = 'domain_' + domainName
+
+    # Specify the forcing path
+    defaultPath = rootPath / domainFolder / suffix
+
+    return defaultPath
+
+
+# --- Find the source and destination folders
+# Find the path where the raw files are
+merit_path = read_from_control(controlFolder/controlFile,'parameter_dem_raw_path')
+
+# Specify the default paths if required
+if merit_path == 'default':
+    merit_path = make_default_path('parameters/dem/1_MERIT_raw_data') # outputs a Path()
+else:
+    merit_path = Path(merit_path) # make sure a user-specified path is a Path()
+
+# Find the path where the unpacked files need to go
+unpack_path = read_from_control(controlFolder/controlFile,'parameter_dem_unpack_path')
+
+# Specify the default paths if required
+if unpack_path == 'default':
+    unpack_path = make_default_path('parameters/dem/2_MERIT_hydro_unpacked_data') # outputs a Path()
+else:
+    unpack_path = Path(unpack_path) # make sure a user-specified path is a Path()
+
+# Make the folder if it doesn't exist
+unpack_path.mkdir(parents=True, exist_ok=True)
+
+
+# --- Shared data cache
+# Find the shared data cache
+cache_path = read_from_control(controlFolder/controlFile,'data_cache_path')
+
+# Specify the default paths if required
+if cache_path == 'default':
+    cache_path = Path( read_from_control(controlFolder/controlFile,'root_path') ) / '_data_cache' # outputs a Path()
+elif cache_path == 'none':
+    cache_path = None # don't use a cache
+else:
+    cache_path = Path(cache_path) # make sure a user-specified path is a Path()
+
+# Find how domain files link to the cache and how large the cache may become
+cache_link = read_from_control(controlFolder/controlFile,'data_cache_link')
+cache_budget = float(read_from_control(controlFolder/controlFile,'data_cache_size_gb')) * 1e9 # [GB] to [bytes]
+
+
+# --- Find the domain bounding box
+# Find which locations to extract
+coordinates = read_from_control(controlFolder/controlFile,'forcing_raw_space')
+
+# Split coordinates into the format the download interface needs
+coordinates = coordinates.split('/')
+
+# Store coordinates as floats in individual variables
+domain_min_lon = np.array(float(coordinates[1]))
+domain_max_lon = np.array(float(coordinates[3]))
+domain_min_lat = np.array(float(coordinates[2]))
+domain_max_lat = np.array(float(coordinates[0]))
+
+
+# --- Functions
+# Size of the tiles inside the .tar files [degrees]
+tile_size = 5
+
+# Tile names encode the lower-left corner of the tile, e.g. 'n45w115_elv.tif'
+tile_pattern = re.compile(r'([ns])(\d{2})([ew])(\d{3})_elv\.tif$')
+
+# Function to check if a tile overlaps the domain, based on its name
+def tile_in_domain(name):
+
+    # Find the lower-left corner of the tile
+    match = tile_pattern.search(name)
+    if match is None:
+        return False
+    lat = int(match.group(2)) * (1 if match.group(1) == 'n' else -1)
+    lon = int(match.group(4)) * (1 if match.group(3) == 'e' else -1)
+
+    # Check for overlap with the domain
+    return (domain_min_lon < lon + tile_size) and (domain_max_lon > lon) and \
+           (domain_min_lat < lat + tile_size) and (domain_max_lat > lat)
+
+# Function to extract the tiles that overlap the domain from a single .tar file or stream
+def extract_tiles(tar_file):
+
+    # Keep track of what we extract
+    extracted = []
+
+    # Open in streaming mode ('r|'); members are read in the order they are stored and the file is never searched.
+    # This also accepts an open stream (e.g. a download in progress) instead of a file name
+    if hasattr(tar_file, 'read'):
+        tar = tarfile.open(fileobj=tar_file, mode='r|')
+    else:
+        tar = tarfile.open(tar_file, mode='r|')
+    with tar:
+        for member in tar:
+
+            # Skip anything that is not a tile inside the domain; its contents are read past but not written
+            if not member.isfile() or not tile_in_domain(member.name):
+                continue
+
+            # Keep the folder structure inside the .tar, but never write outside the unpack folder
+            member_path = Path(member.name)
+            target = unpack_path / member_path.parent.name / member_path.name
+
+            # Skip tiles we already have
+            if target.is_file() and target.stat().st_size == member.size:
+                continue
+            
+            # Link tiles that another domain already extracted from the shared data cache
+            cache_key = 'merit_hydro/' + member_path.parent.name + '/' + member_path.name
+            if data_cache.fetch(cache_path, cache_key, target, cache_link):
+                extracted.append(str(target))
+                continue
+
+            # Write to a temporary file first, so that incomplete tiles are never mistaken for complete ones
+            target.parent.mkdir(parents=True, exist_ok=True)
+            temp = target.with_name(target.name + '.part')
+            with tar.extractfile(member) as src, open(temp, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024*1024)
+            os.replace(temp, target)
+            extracted.append(str(target))
+            
+            # Add the tile to the shared data cache so that other domains don't need to extract it
+            data_cache.store(cache_path, cache_key, target, cache_link, cache_budget)
+
+    print('Extracted {} tiles from {}'.format(len(extracted), tar_file))
+
+    return extracted
+
+
+# --- Unpack the data
+# Find the downloaded files
+tar_files = sorted([str(file) for file in merit_path.glob('*.tar')])
+
+# Extract the tiles in parallel
+ncpus = int(os.environ.get('SLURM_CPUS_PER_TASK',default=1))
+if __name__ == "__main__":
+    pool = mp.Pool(processes=max(1,min(ncpus,len(tar_files))))
+    pool.map(extract_tiles,tar_files)
+    pool.close()
+
+
+# --- Code provenance
+# Generates a basic log file in the domain folder and copies the control file and itself there.
+
+# Set the log path and file name
+logPath = unpack_path
+log_suffix = '_merit_dem_unpack_log.txt'
+
+# Create a log folder
+logFolder = '_workflow_log'
+Path( logPath / logFolder ).mkdir(parents=True, exist_ok=True)
+
+# Copy this script
+thisFile = 'unpack_merit_hydro_dem.py'
+copyfile(thisFile, logPath / logFolder / thisFile);
+
+# Get current date and time
+now = datetime.now()
+
+# Create a log file
+logFile = now.strftime('%Y%m%d') + log_suffix
+with open( logPath / logFolder / logFile, 'w') as file:
+
+    lines = ['Log generated by ' + thisFile + ' on ' + now.strftime('%Y/%m/%d %H:%M:%S') + '\n',
+             'Unpacked raw MERIT Hydro data for area (lat_max, lon_min, lat_min, lon_max) [{}].'.format(coordinates)]
+    for txt in lines:
+        file.write(txt)
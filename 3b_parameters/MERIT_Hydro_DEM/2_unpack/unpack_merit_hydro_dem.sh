@@ -1,86 +0,0 @@
-#!/bin/bash
-
-# Script to unpack downloaded MERIT data.
-
-
-#---------------------------------
-# Specify settings
-#---------------------------------
-
-# --- Location of raw data
-dest_line=$(grep -m 1 "^parameter_dem_raw_path" ../../../0_control_files/control_active.txt) # full settings line
-source_path=$(echo ${dest_line##*|})   # removing the leading text up to '|'
-source_path=$(echo ${source_path%%#*}) # removing the trailing comments, if any are present
-
-# Specify the default path if needed
-if [ "$source_path" = "default" ]; then
-  
- # Get the root path and append the appropriate install directories
- root_line=$(grep -m 1 "^root_path" ../../../0_control_files/control_active.txt)
- root_path=$(echo ${root_line##*|}) 
- root_path=$(echo ${root_path%%#*})
-
- # domain name
- domain_line==$(grep -m 1 "^domain_name" ../../../0_control_files/control_active.txt)
- domain_name=$(echo ${domain_line##*|}) 
- domain_name=$(echo ${domain_name%%#*})
- 
- # source path
- source_path="${root_path}/domain_${domain_name}/parameters/dem/1_MERIT_raw_data"
-
-fi
-
-# --- Location where converted data needs to go
-dest_line=$(grep -m 1 "^parameter_dem_unpack_path" ../../../0_control_files/control_active.txt) # full settings line
-dest_path=$(echo ${dest_line##*|})   # removing the leading text up to '|'
-dest_path=$(echo ${dest_path%%#*}) # removing the trailing comments, if any are present
-
-# Specify the default path if needed
-if [ "$dest_path" = "default" ]; then
-  
- # Get the root path and append the appropriate install directories
- root_line=$(grep -m 1 "^root_path" ../../../0_control_files/control_active.txt)
- root_path=$(echo ${root_line##*|}) 
- root_path=$(echo ${root_path%%#*})
-
- # domain name
- domain_line==$(grep -m 1 "^domain_name" ../../../0_control_files/control_active.txt)
- domain_name=$(echo ${domain_line##*|}) 
- domain_name=$(echo ${domain_name%%#*})
- 
- # destination path
- dest_path="${root_path}/domain_${domain_name}/parameters/dem/2_MERIT_hydro_unpacked_data"
-fi
-
-# Make destination directory 
-mkdir -p $dest_path
-
-
-#---------------------------------
-# Unpack the data
-#---------------------------------
-
-for file in $source_path/*.tar; do
- tar xf "$file" -C $dest_path
-done
-
-
-#---------------------------------
-# Code provenance
-#---------------------------------
-# Generates a basic log file in the domain folder and copies the control file and itself there.
-# Make a log directory if it doesn't exist
-log_path="${dest_path}/_workflow_log"
-mkdir -p $log_path
-
-# Log filename
-today=`date '+%F'`
-log_file="${today}_compile_log.txt"
-
-# Make the log
-this_file='unpack_merit_hydro_dem.sh'
-echo "Log generated by ${this_file} on `date '+%F %H:%M:%S'`"  > $log_path/$log_file # 1st line, store in new file
-echo 'Unpacked raw MERIT Hydro data.' >> $log_path/$log_file # 2nd line, append to existing file
-
-# Copy this file to log directory
-cp $this_file $log_path
@@ -0,0 +1,240 @@
+# Create the domain DEM from MERIT Hydro tiles
+# Mosaics the unpacked MERIT Hydro tiles, crops the mosaic to the modelling domain and writes the result as a single
+# internally tiled, compressed GeoTIFF with overviews. This replaces the sequence of creating a VRT of all tiles,
+# cropping that VRT to the domain and converting the cropped VRT to .tif.
+#
+# Workflow:
+# - Find data locations and the domain bounding box;
+# - Read the headers of the unpacked tiles and keep those that overlap the domain;
+# - Define the output grid: the domain bounding box, expanded outwards to the nearest MERIT Hydro pixel edges;
+# - Fill the output file one block-aligned window at a time, copying the overlapping part of each tile into the window;
+# - Add internal overviews.
+#
+# Notes:
+# - All MERIT Hydro tiles share the same grid. Tiles are therefore copied into the output pixel-for-pixel, without any
+#   resampling or reprojection;
+# - The mosaic only exists as a mapping between tiles and output windows (i.e. virtually); at most one output window
+#   is kept in memory;
+# - The output is stored in blocks of 512x512 pixels. This matches the zonal statistics code in
+#   `4b_remapping/1_topo/zonal_statistics.py`, which reads windows of 1024x1024 pixels aligned with raster blocks, so
+#   that every zonal statistics window maps onto exactly 2x2 blocks;
+# - Compression and overview creation use all available CPUs.
+
+# Modules
+import math
+import numpy as np
+import rasterio
+from pathlib import Path
+from shutil import copyfile
+from datetime import datetime
+from rasterio.windows import Window
+from rasterio.enums import Resampling
+
+
+# --- Control file handling
+# Easy access to control file folder
+controlFolder = Path('../../../0_control_files')
+
+# Store the name of the 'active' file in a variable
+controlFile = 'control_active.txt'
+
+# Function to extract a given setting from the control file
+def read_from_control( file, setting ):
+
+    # Open 'control_active.txt' and ...
+    with open(file) as contents:
+        for line in contents:
+
+            # ... find the line with the requested setting
+            if setting in line and not line.startswith('#'):
+                break
+
+    # Extract the setting's value
+    substring = line.split('|',1)[1]      # Remove the setting's name (split into 2 based on '|', keep only 2nd part)
+    substring = substring.split('#',1)[0] # Remove comments, does nothing if no '#' is found
+    substring = substring.strip()         # Remove leading and trailing whitespace, tabs, newlines
+
+    # Return this value
+    return substring
+
+# Function to specify a default path
+def make_default_path(suffix):
+
+    # Get the root path
+    rootPath = Path( read_from_control(controlFolder/controlFile,'root_path') )
+
+    # Get the domain folder
+    domainName = read_from_control(controlFolder/controlFile,'domain_name')
+    domainFolder = 'domain_' + domainName
+
+    # Specify the forcing path
+    defaultPath = rootPath / domainFolder / suffix
+
+    return defaultPath
+
+
+# --- Find the source and destination
+# Find the path where the unpacked tiles are
+unpack_path = read_from_control(controlFolder/controlFile,'parameter_dem_unpack_path')
+
+# Specify the default paths if required
+if unpack_path == 'default':
+    unpack_path = make_default_path('parameters/dem/2_MERIT_hydro_unpacked_data') # outputs a Path()
+else:
+    unpack_path = Path(unpack_path) # make sure a user-specified path is a Path()
+
+# Find the path and name of the domain DEM
+dem_path = read_from_control(controlFolder/controlFile,'parameter_dem_tif_path')
+dem_name = read_from_control(controlFolder/controlFile,'parameter_dem_tif_name')
+
+# Specify the default paths if required
+if dem_path == 'default':
+    dem_path = make_default_path('parameters/dem/5_elevation') # outputs a Path()
+else:
+    dem_path = Path(dem_path) # make sure a user-specified path is a Path()
+
+# Make the folder if it doesn't exist
+dem_path.mkdir(parents=True, exist_ok=True)
+
+
+# --- Find the domain bounding box
+# Find the domain extent
+coordinates = read_from_control(controlFolder/controlFile,'forcing_raw_space')
+
+# Split coordinates into the format the download interface needs
+coordinates = coordinates.split('/')
+
+# Store coordinates as floats in individual variables
+domain_min_lon = float(coordinates[1])
+domain_max_lon = float(coordinates[3])
+domain_min_lat = float(coordinates[2])
+domain_max_lat = float(coordinates[0])
+
+
+# --- Output settings
+# Block size of the output file [pixels]; see notes at the top of this script
+block_size = 512
+
+# Number of blocks per window that is filled and written in one go
+window_blocks = 4
+
+# Overview levels, only those that result in overviews of at least one block are made
+overview_levels = [2,4,8,16,32,64]
+
+# Tolerance used to snap coordinates to pixel edges [fraction of a pixel]
+snap_tolerance = 1e-6
+
+
+# --- Find the tiles that overlap the domain
+# Read the headers of all unpacked tiles
+tiles = []
+for tile_file in sorted(unpack_path.rglob('*.tif')):
+    with rasterio.open(tile_file) as src:
+        left, bottom, right, top = src.bounds
+        if (left < domain_max_lon) and (right > domain_min_lon) and (bottom < domain_max_lat) and (top > domain_min_lat):
+            tiles.append({'file': tile_file, 'transform': src.transform, 'width': src.width, 'height': src.height,
+                          'profile': src.profile})
+
+# Check that we found something
+if len(tiles) == 0:
+    raise FileNotFoundError('No MERIT Hydro tiles in {} overlap the domain {}.'.format(unpack_path, coordinates))
+
+
+# --- Define the output grid
+# Use the grid of the first tile as reference; all MERIT Hydro tiles share this grid
+ref = tiles[0]['transform']
+res_x = ref.a
+res_y = -ref.e
+
+# Expand the domain outwards to the nearest pixel edges of the reference grid
+col_min = math.floor((domain_min_lon - ref.c) / res_x + snap_tolerance)
+col_max = math.ceil( (domain_max_lon - ref.c) / res_x - snap_tolerance)
+row_min = math.floor((ref.f - domain_max_lat) / res_y + snap_tolerance)
+row_max = math.ceil( (ref.f - domain_min_lat) / res_y - snap_tolerance)
+
+# Output grid
+out_width  = col_max - col_min
+out_height = row_max - row_min
+out_transform = rasterio.Affine(res_x, 0, ref.c + col_min*res_x, 0, -res_y, ref.f - row_min*res_y)
+
+# Find where each tile is in the output grid [pixels]
+for tile in tiles:
+    tile['col_off'] = int(round((tile['transform'].c - out_transform.c) / res_x))
+    tile['row_off'] = int(round((out_transform.f - tile['transform'].f) / res_y))
+
+# Output file settings
+nodata = tiles[0]['profile']['nodata']
+dtype  = tiles[0]['profile']['dtype']
+profile = {'driver': 'GTiff', 'height': out_height, 'width': out_width, 'count': 1, 'dtype': dtype,
+           'crs': tiles[0]['profile']['crs'], 'transform': out_transform, 'nodata': nodata,
+           'tiled': True, 'blockxsize': block_size, 'blockysize': block_size,
+           'compress': 'deflate', 'predictor': 3 if np.dtype(dtype).kind == 'f' else 2,
+           'num_threads': 'all_cpus', 'BIGTIFF': 'IF_SAFER'}
+
+
+# --- Create the domain DEM
+# Fill value for areas without tiles
+fill = nodata if nodata is not None else 0
+
+# Write the mosaic one window at a time
+dem_file = dem_path / dem_name
+window_size = block_size * window_blocks
+with rasterio.Env(GDAL_NUM_THREADS='ALL_CPUS'):
+    with rasterio.open(dem_file, 'w', **profile) as dst:
+        for row in range(0, out_height, window_size):
+            for col in range(0, out_width, window_size):
+
+                # Output window
+                window = Window(col, row, min(window_size, out_width-col), min(window_size, out_height-row))
+                data = np.full((window.height, window.width), fill, dtype=dtype)
+
+                # Copy the overlapping part of each tile into the window
+                for tile in tiles:
+                    row_start = max(row, tile['row_off'])
+                    row_stop  = min(row + window.height, tile['row_off'] + tile['height'])
+                    col_start = max(col, tile['col_off'])
+                    col_stop  = min(col + window.width, tile['col_off'] + tile['width'])
+                    if row_start >= row_stop or col_start >= col_stop:
+                        continue
+                    with rasterio.open(tile['file']) as src:
+                        data[row_start-row:row_stop-row, col_start-col:col_stop-col] = \
+                            src.read(1, window=Window(col_start-tile['col_off'], row_start-tile['row_off'],
+                                                      col_stop-col_start, row_stop-row_start))
+
+                # Write the window
+                dst.write(data, 1, window=window)
+
+    # Add internal overviews
+    with rasterio.Env(GDAL_NUM_THREADS='ALL_CPUS', COMPRESS_OVERVIEW='DEFLATE'):
+        with rasterio.open(dem_file, 'r+') as dst:
+            levels = [level for level in overview_levels if min(out_width, out_height) / level >= block_size]
+            if len(levels) > 0:
+                dst.build_overviews(levels, Resampling.average)
+
+
+# --- Code provenance
+# Generates a basic log file in the domain folder and copies the control file and itself there.
+
+# Set the log path and file name
+logPath = dem_path
+log_suffix = '_merit_dem_domain_tif_log.txt'
+
+# Create a log folder
+logFolder = '_workflow_log'
+Path( logPath / logFolder ).mkdir(parents=True, exist_ok=True)
+
+# Copy this script
+thisFile = 'make_domain_dem_tif.py'
+copyfile(thisFile, logPath / logFolder / thisFile);
+
+# Get current date and time
+now = datetime.now()
+
+# Create a log file
+logFile = now.strftime('%Y%m%d') + log_suffix
+with open( logPath / logFolder / logFile, 'w') as file:
+
+    lines = ['Log generated by ' + thisFile + ' on ' + now.strftime('%Y/%m/%d %H:%M:%S') + '\n',
+             'Created domain DEM from {} MERIT Hydro tiles for area (lat_max, lon_min, lat_min, lon_max) [{}].'.format(len(tiles),coordinates)]
+    for txt in lines:
+        file.write(txt)
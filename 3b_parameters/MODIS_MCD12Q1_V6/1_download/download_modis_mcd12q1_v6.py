@@ -1,17 +1,40 @@
 # Download MODIS MCD12Q1_V6
 # Script based on example provided on: https://git.earthdata.nasa.gov/projects/LPDUR/repos/daac_data_download_python/browse
 # Requires a `.netrc` file in user's home directory with login credentials for `urs.earthdata.nasa.gov`. See: https://lpdaac.usgs.gov/resources/e-learning/how-access-lp-daac-data-command-line/
+#
+# Download strategy:
+# - MODIS data is provided in tiles of 10x10 degrees (at the equator) on a sinusoidal grid, identified by their
+#   horizontal (h) and vertical (v) position. Only the tiles that intersect the domain bounding box are downloaded;
+# - Files are downloaded in parallel with a small, bounded number of workers (`parameter_land_dl_workers`) that share
+#   a single authenticated HTTP session. Each worker pauses briefly between files so we don't overwhelm the server;
+# - Files are first downloaded into a partial file '[file].part'. Failed downloads are resumed with an HTTP 'Range'
+#   request instead of restarted. If the server rejects the range (HTTP 416) and the partial file doesn't have the
+#   expected size, the partial file is discarded and the download restarts. The size and server version of each file
+#   are stored in '_download_state.json' in the download folder, so that interrupted downloads can also be resumed in a
+#   later run of this script;
+# - Files that another domain already downloaded are linked from the shared data cache (`data_cache_path`) instead of
+#   downloaded, and newly downloaded files are added to the cache. See `0_tools/data_cache.py`;
+# - `0_tools/MODIS_check_download_resume.py` runs this script against a local test server to check resuming.
 
 # modules
 import os
+import sys
+import re
+import json
+import math
 import time
-import shutil
 import requests
+import threading
 from netrc import netrc
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from shutil import copyfile
 from datetime import datetime
 
+# Shared data cache functions, see 0_tools/data_cache.py
+sys.path.append('../../../0_tools')
+import data_cache
+
 
 # --- Control file handling
 # Easy access to control file folder
@@ -78,6 +101,82 @@ else:
 # Make output dir
 modis_path.mkdir(parents=True, exist_ok=True)
 
+# Number of files to download at the same time
+download_workers = int(read_from_control(controlFolder/controlFile,'parameter_land_dl_workers'))
+
+
+# --- Shared data cache
+# Find the shared data cache
+cache_path = read_from_control(controlFolder/controlFile,'data_cache_path')
+
+# Specify the default paths if required
+if cache_path == 'default':
+    cache_path = Path( read_from_control(controlFolder/controlFile,'root_path') ) / '_data_cache' # outputs a Path()
+elif cache_path == 'none':
+    cache_path = None # don't use a cache
+else:
+    cache_path = Path(cache_path) # make sure a user-specified path is a Path()
+
+# Find how domain files link to the cache and how large the cache may become
+cache_link = read_from_control(controlFolder/controlFile,'data_cache_link')
+cache_budget = float(read_from_control(controlFolder/controlFile,'data_cache_size_gb')) * 1e9 # [GB] to [bytes]
+
+
+# --- Find the MODIS tiles that intersect the domain
+# Find the domain extent
+coordinates = read_from_control(controlFolder/controlFile,'forcing_raw_space')
+
+# Split coordinates into the format the download interface needs
+coordinates = coordinates.split('/')
+
+# Store coordinates as floats in individual variables
+domain_min_lon = float(coordinates[1])
+domain_max_lon = float(coordinates[3])
+domain_min_lat = float(coordinates[2])
+domain_max_lat = float(coordinates[0])
+
+# MODIS sinusoidal grid definition
+earth_radius = 6371007.181                # [m], sphere used by the MODIS sinusoidal projection
+tile_width = 1111950.5196666666           # [m], width and height of a single tile
+grid_left = -20015109.354                 # [m], left edge of tile h = 0
+grid_top = 10007554.677                   # [m], top edge of tile v = 0
+
+# Function to find the (h,v) tiles that intersect a lat/lon bounding box
+def find_modis_tiles(min_lon, max_lon, min_lat, max_lat):
+    
+    '''In the sinusoidal projection y depends only on latitude and x = R * lon * cos(lat). For each row of tiles we 
+    therefore find the part of the bounding box inside that row, and the smallest and largest x inside that part.'''
+    
+    tiles = set()
+    for v in range(0,18):
+        
+        # Find the latitudes covered by this tile row and the domain
+        row_top = math.degrees((grid_top - v*tile_width) / earth_radius)
+        row_bottom = math.degrees((grid_top - (v+1)*tile_width) / earth_radius)
+        lat_top = min(max_lat, row_top)
+        lat_bottom = max(min_lat, row_bottom)
+        if lat_top <= lat_bottom:
+            continue
+        
+        # Find the largest and smallest value of cos(lat) in this latitude range
+        cos_max = 1 if lat_bottom <= 0 <= lat_top else math.cos(math.radians(min(abs(lat_bottom),abs(lat_top))))
+        cos_min = math.cos(math.radians(max(abs(lat_bottom),abs(lat_top))))
+        
+        # Find the x-range covered by the domain in this latitude range
+        x_min = earth_radius * math.radians(min_lon) * (cos_max if min_lon < 0 else cos_min)
+        x_max = earth_radius * math.radians(max_lon) * (cos_min if max_lon < 0 else cos_max)
+        
+        # Convert to tile numbers
+        h_min = max(0,  math.floor((x_min - grid_left) / tile_width))
+        h_max = min(35, math.floor((x_max - grid_left) / tile_width))
+        for h in range(h_min,h_max+1):
+            tiles.add((h,v))
+    
+    return tiles
+
+# Find the tiles for this domain
+modis_tiles = find_modis_tiles(domain_min_lon, domain_max_lon, domain_min_lat, domain_max_lat)
+
 
 # --- Get the authentication info
 # authentication url
@@ -91,49 +190,193 @@ usr = netrc(netrc_folder).authenticators(url)[0]
 pwd = netrc(netrc_folder).authenticators(url)[2]
 
 
-# --- Do the downloads
-# Get the download links from file
-file_list = open(links_file, 'r').readlines()
-
+# --- Download settings
 # Retry settings: connection can be unstable, so specify a number of retries
-retries_max = 100 
+retries_max = 100
+retry_wait = 10 # [s], maximum wait time between retries
 
-# Loop over the download files
-for file_url in file_list:
+# Pause between files for each worker, so we don't overwhelm the server [s]
+request_pause = 1
+
+# Size of the chunks written to file [bytes]
+chunk_size = 64*1024
+
+# File that keeps track of download progress across runs
+state_file = modis_path / '_download_state.json'
+
+
+# --- Download state
+# Load the state of previous runs, if any
+if os.path.isfile(state_file):
+    with open(state_file) as file:
+        state = json.load(file)
+else:
+    state = {}
+
+# Make sure only one worker updates the state file at a time
+state_lock = threading.Lock()
+
+# Function to save the state file; only call this while holding the state lock
+def save_state():
+    with open(str(state_file) + '.tmp', 'w') as file:
+        json.dump(state, file, indent=1)
+    os.replace(str(state_file) + '.tmp', state_file) # replace in one go so the state file is never incomplete
+    return
+
+# Function to update and save the state of a single file
+def update_state(file_name, **values):
+    with state_lock:
+        state.setdefault(file_name, {}).update(values)
+        save_state()
+    return
+
+# Function to forget the state of a single file
+def clear_state(file_name):
+    with state_lock:
+        state.pop(file_name, None)
+        save_state()
+    return
+
+
+# --- Download function
+# Shared session; the EarthData login cookies and connections are re-used by all workers
+session = requests.Session()
+session.auth = (usr, pwd)
+adapter = requests.adapters.HTTPAdapter(pool_connections=download_workers, pool_maxsize=download_workers)
+session.mount('http://', adapter)
+session.mount('https://', adapter)
+
+# Function to download a single file, resuming from a partial download if possible
+def download_file(file_url, file_name):
     
-    # Make the file name
-    file_name = file_url.split('/')[-1].strip() # Get the last part of the url, strip whitespace and characters
+    # Partial file that the download is written to
+    part_file = modis_path / (file_name + '.part')
     
-    # Check if file already exists (i.e. interupted earlier download) and move to next file if so
-    if (modis_path / file_name).is_file():
-        continue 
-        
     # Make sure the connection is re-tried if it fails
     retries_cur = 1
     while retries_cur <= retries_max:
         try:
-            # Send a HTTP request to the server and save the HTTP response in a response object called resp
-            # 'stream = True' ensures that only response headers are downloaded initially (and not all file contents too, which are 2GB+)
-            with requests.get(file_url.strip(), verify=True, stream=True, auth=(usr,pwd)) as response:
-        
-                # Decode the response
-                response.raw.decode_content = True
-                content = response.raw        
-        
-                # Write to file
-                with open(modis_path / file_name, 'wb') as data:
-                    shutil.copyfileobj(content, data)
             
-                # Progress
-                print('Successfully downloaded: {}'.format(file_name))
-                time.sleep(3) # sleep for a bit so we don't overwhelm the server
+            # Find how much we already have and ask the server for the remainder only
+            headers = {}
+            have = os.path.getsize(part_file) if os.path.isfile(part_file) else 0
+            validator = state.get(file_name, {}).get('validator')
+            if have > 0:
+                headers['Range'] = 'bytes={}-'.format(have)
+                if validator:
+                    headers['If-Range'] = validator # server sends the full file instead if it has changed
+            
+            # 'stream = True' ensures that only response headers are downloaded initially (and not all file contents too)
+            with session.get(file_url, headers=headers, verify=True, stream=True, timeout=60) as response:
+                
+                # Server can't serve the requested range
+                if response.status_code == 416 and have > 0:
+                    
+                    # Partial file is already complete
+                    if have == state.get(file_name, {}).get('size'):
+                        break
+                    
+                    # Partial file doesn't match the file on the server; discard it and start again from byte 0
+                    print('Server rejected resuming ' + file_name + ' at byte ' + str(have) + ', restarting the download')
+                    os.remove(part_file)
+                    clear_state(file_name)
+                    continue
                 
-        except:
-            print('Error downloading ' + file_name + ' on try ' + str(retries_cur))
+                # Don't retry if the file doesn't exist or we're not allowed to download it
+                if response.status_code in [401, 403, 404]:
+                    print('Cannot download ' + file_name + ', server returned HTTP status ' + str(response.status_code))
+                    retries_cur = retries_max + 1
+                    break
+                response.raise_for_status()
+                
+                # Server sends the remainder of the file (206) or the full file (200)
+                if response.status_code == 206:
+                    mode = 'ab'
+                    size = int(response.headers['Content-Range'].split('/')[-1])
+                else:
+                    mode = 'wb'
+                    have = 0
+                    size = int(response.headers.get('Content-Length', -1))
+                
+                # Store what we know about this file so that later runs can resume
+                validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+                update_state(file_name, url=file_url, size=size, validator=validator, status='downloading')
+                
+                # Write to file
+                with open(part_file, mode) as data:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        data.write(chunk)
+                        have += len(chunk)
+            
+            # Check if the file is complete
+            if size >= 0 and have != size:
+                raise IOError('received {} out of {} bytes'.format(have, size))
+            
+        except Exception as e:
+            print('Error downloading ' + file_name + ' on try ' + str(retries_cur) + ' with error: ' + str(e))
             retries_cur += 1
+            time.sleep(min(retry_wait, retries_cur))
             continue
         else:
-            break  
+            break
+    
+    # Give the file its final name if the download succeeded
+    if retries_cur > retries_max:
+        update_state(file_name, status='failed')
+        return False
+    os.replace(part_file, modis_path / file_name)
+    update_state(file_name, status='complete')
+    
+    # Add the file to the shared data cache so that other domains don't need to download it
+    data_cache.store(cache_path, file_url, modis_path / file_name, cache_link, cache_budget)
+    
+    # Progress
+    print('Successfully downloaded: {}'.format(file_name))
+    time.sleep(request_pause) # sleep for a bit so we don't overwhelm the server
+    
+    return True
+
+
+# --- Do the downloads
+# Get the download links from file
+with open(links_path / links_file, 'r') as file:
+    file_list = [line.strip() for line in file if line.strip()]
+
+# Only keep the files of tiles that intersect the domain, and that we don't have yet
+downloads = []
+for file_url in file_list:
+    
+    # Make the file name
+    file_name = file_url.split('/')[-1].strip() # Get the last part of the url, strip whitespace and characters
+    
+    # Find the tile in the file name, e.g. 'MCD12Q1.A2007001.h22v02.006.2018145224134.hdf'
+    tile = re.search(r'\.h(\d{2})v(\d{2})\.', file_name)
+    if tile is None or (int(tile.group(1)),int(tile.group(2))) not in modis_tiles:
+        continue
+    
+    # Check if file already exists (i.e. interupted earlier download) and move to next file if so
+    if (modis_path / file_name).is_file():
+        continue
+    
+    # Link the file from the shared data cache if another domain downloaded it already
+    if data_cache.fetch(cache_path, file_url, modis_path / file_name, cache_link):
+        print('Linked {} from the shared data cache'.format(file_name))
+        continue
+    
+    downloads.append((file_url, file_name))
+
+# Progress
+print('Downloading {} files for MODIS tiles {}'.format(len(downloads), sorted(modis_tiles)))
+
+# Download the files in parallel
+with ThreadPoolExecutor(max_workers=download_workers) as pool:
+    success = list(pool.map(lambda dl: download_file(*dl), downloads))
+session.close()
+
+# Report any failed downloads; these are resumed when this script is run again
+for (_,file_name),ok in zip(downloads,success):
+    if not ok:
+        print('Failed to download ' + file_name + '. Run this script again to resume.')
         
 
 # --- Code provenance
@@ -159,6 +402,6 @@ logFile = now.strftime('%Y%m%d') + log_suffix
 with open( logPath / logFolder / logFile, 'w') as file:
     
     lines = ['Log generated by ' + thisFile + ' on ' + now.strftime('%Y/%m/%d %H:%M:%S') + '\n',
-             'Downloaded MODIS MCD12Q1_V6 data with global coverage.']
+             'Downloaded MODIS MCD12Q1_V6 data for area (lat_max, lon_min, lat_min, lon_max) [{}].'.format(coordinates)]
     for txt in lines:
         file.write(txt) 
\ No newline at end of file
@@ -0,0 +1,231 @@
+# Create the multiband domain land class file from MODIS granules
+# Warps the MODIS MCD12Q1 land classes of all years directly from the downloaded `.hdf` granules onto a regular lat/lon
+# grid (EPSG:4326) that covers only the modelling domain, and stores the result as a multiband `.tif` with one band per
+# year. This replaces the sequence of creating global VRTs per year, reprojecting these, cropping them to the domain,
+# combining them into a multiband VRT and converting that to `.tif`.
+#
+# Workflow:
+# - Find data locations and the domain bounding box;
+# - Find the granules that overlap the domain and sort them by year;
+# - Define the output grid: the domain bounding box, expanded outwards to whole pixels at the native MODIS resolution;
+# - For each year, warp only the domain window from the granules of that year into the corresponding band.
+#
+# Notes:
+# - Our variable of interest (MCD12Q1:LC_Type1) is stored in the first sub dataset of each `.hdf` file;
+# - Land classes are categorical and are therefore warped with nearest neighbour resampling;
+# - Warping uses multiple threads. The number of threads is taken from environment variable `SLURM_CPUS_PER_TASK` if it
+#   exists and is otherwise equal to the number of available CPUs;
+# - The output resolution is the native MODIS pixel size converted to degrees latitude (15 arc seconds for the 463 m
+#   MCD12Q1 pixels). The output grid starts at (-180,90), so that domains processed separately share the same grid.
+
+# Modules
+import os
+import re
+import math
+import numpy as np
+import rasterio
+from pathlib import Path
+from shutil import copyfile
+from datetime import datetime
+from rasterio.enums import Resampling
+from rasterio.warp import reproject, transform_bounds
+
+
+# --- Control file handling
+# Easy access to control file folder
+controlFolder = Path('../../../0_control_files')
+
+# Store the name of the 'active' file in a variable
+controlFile = 'control_active.txt'
+
+# Function to extract a given setting from the control file
+def read_from_control( file, setting ):
+
+    # Open 'control_active.txt' and ...
+    with open(file) as contents:
+        for line in contents:
+
+            # ... find the line with the requested setting
+            if setting in line and not line.startswith('#'):
+                break
+
+    # Extract the setting's value
+    substring = line.split('|',1)[1]      # Remove the setting's name (split into 2 based on '|', keep only 2nd part)
+    substring = substring.split('#',1)[0] # Remove comments, does nothing if no '#' is found
+    substring = substring.strip()         # Remove leading and trailing whitespace, tabs, newlines
+
+    # Return this value
+    return substring
+
+# Function to specify a default path
+def make_default_path(suffix):
+
+    # Get the root path
+    rootPath = Path( read_from_control(controlFolder/controlFile,'root_path') )
+
+    # Get the domain folder
+    domainName = read_from_control(controlFolder/controlFile,'domain_name')
+    domainFolder = 'domain_' + domainName
+
+    # Specify the forcing path
+    defaultPath = rootPath / domainFolder / suffix
+
+    return defaultPath
+
+
+# --- Find source and destination locations
+# Find where the downloaded MODIS data is
+modis_path = read_from_control(controlFolder/controlFile,'parameter_land_raw_path')
+
+# Specify the default paths if required
+if modis_path == 'default':
+    modis_path = make_default_path('parameters/landclass/1_MODIS_raw_data') # outputs a Path()
+else:
+    modis_path = Path(modis_path) # make sure a user-specified path is a Path()
+
+# Find where the multiband domain file needs to go
+tif_path = read_from_control(controlFolder/controlFile,'parameter_land_tif_path')
+
+# Specify the default paths if required
+if tif_path == 'default':
+    tif_path = make_default_path('parameters/landclass/6_tif_multiband') # outputs a Path()
+else:
+    tif_path = Path(tif_path) # make sure a user-specified path is a Path()
+
+# Make the folder if it doesn't exist
+tif_path.mkdir(parents=True, exist_ok=True)
+
+
+# --- Find the domain bounding box
+# Find the domain extent
+coordinates = read_from_control(controlFolder/controlFile,'forcing_raw_space')
+
+# Split coordinates into the format the download interface needs
+coordinates = coordinates.split('/')
+
+# Store coordinates as floats in individual variables
+domain_min_lon = float(coordinates[1])
+domain_max_lon = float(coordinates[3])
+domain_min_lat = float(coordinates[2])
+domain_max_lat = float(coordinates[0])
+
+
+# --- Settings
+# Output projection
+dst_crs = 'EPSG:4326'
+
+# Radius of the sphere used by the MODIS sinusoidal projection [m]
+earth_radius = 6371007.181
+
+# Block size of the output file [pixels]
+block_size = 512
+
+# Number of threads used for warping
+ncpus = int(os.environ.get('SLURM_CPUS_PER_TASK', default=os.cpu_count() or 1))
+
+
+# --- Find the granules that overlap the domain
+# Function to find the data set with the land classes in a granule
+def land_class_dataset(file):
+    with rasterio.open(file) as src:
+        if src.subdatasets:
+            return src.subdatasets[0] # MCD12Q1:LC_Type1
+    return str(file)
+
+# Find the granules per year, e.g. 'MCD12Q1.A2001001.h10v03.006.2018142182903.hdf'
+granules = {}
+for file in sorted(modis_path.glob('MCD12Q1.A*.hdf')):
+
+    # Check if this granule overlaps the domain
+    dataset = land_class_dataset(file)
+    with rasterio.open(dataset) as src:
+        left, bottom, right, top = transform_bounds(src.crs, dst_crs, *src.bounds, densify_pts=101)
+    if (left >= domain_max_lon) or (right <= domain_min_lon) or (bottom >= domain_max_lat) or (top <= domain_min_lat):
+        continue
+
+    # Store by year
+    year = int(re.search(r'MCD12Q1\.A(\d{4})', file.name).group(1))
+    granules.setdefault(year, []).append(dataset)
+
+# Check that we found something
+if len(granules) == 0:
+    raise FileNotFoundError('No MODIS granules in {} overlap the domain {}.'.format(modis_path, coordinates))
+years = sorted(granules.keys())
+
+
+# --- Define the output grid
+# Find the output resolution from the native pixel size [m] of one of the granules
+with rasterio.open(granules[years[0]][0]) as src:
+    res = abs(src.transform.a) / (earth_radius * math.pi / 180)
+    src_nodata = src.nodata if src.nodata is not None else 255
+    dtype = src.dtypes[0]
+
+# Expand the domain outwards to whole pixels, on a grid that starts at (-180,90)
+col_min = math.floor((domain_min_lon + 180) / res)
+col_max = math.ceil( (domain_max_lon + 180) / res)
+row_min = math.floor((90 - domain_max_lat) / res)
+row_max = math.ceil( (90 - domain_min_lat) / res)
+
+# Output grid
+out_width  = col_max - col_min
+out_height = row_max - row_min
+out_transform = rasterio.Affine(res, 0, -180 + col_min*res, 0, -res, 90 - row_min*res)
+
+# Output file settings
+profile = {'driver': 'GTiff', 'height': out_height, 'width': out_width, 'count': len(years), 'dtype': dtype,
+           'crs': dst_crs, 'transform': out_transform, 'nodata': src_nodata,
+           'tiled': True, 'blockxsize': block_size, 'blockysize': block_size, 'compress': 'deflate',
+           'num_threads': 'all_cpus', 'BIGTIFF': 'IF_SAFER'}
+
+
+# --- Create the multiband domain file
+# File name
+tif_file = tif_path / 'domain_MCD12Q1_{}_{}.tif'.format(years[0], years[-1])
+
+# Warp each year into its own band
+with rasterio.Env(GDAL_NUM_THREADS='ALL_CPUS'):
+    with rasterio.open(tif_file, 'w', **profile) as dst:
+        for band,year in enumerate(years, start=1):
+
+            # Start with an empty domain
+            data = np.full((out_height, out_width), src_nodata, dtype=dtype)
+
+            # Warp the domain window from each granule of this year; granules don't overlap so the order doesn't matter
+            for dataset in granules[year]:
+                with rasterio.open(dataset) as src:
+                    reproject(source=rasterio.band(src, 1), destination=data,
+                              src_nodata=src_nodata, dst_transform=out_transform, dst_crs=dst_crs, dst_nodata=src_nodata,
+                              init_dest_nodata=False, resampling=Resampling.nearest, num_threads=ncpus)
+
+            # Write the band
+            dst.write(data, band)
+            dst.set_band_description(band, str(year))
+            print('Added land classes for {} from {} granule(s)'.format(year, len(granules[year])))
+
+
+# --- Code provenance
+# Generates a basic log file in the domain folder and copies the control file and itself there.
+
+# Set the log path and file name
+logPath = tif_path
+log_suffix = '_create_domain_tif_log.txt'
+
+# Create a log folder
+logFolder = '_workflow_log'
+Path( logPath / logFolder ).mkdir(parents=True, exist_ok=True)
+
+# Copy this script
+thisFile = 'make_domain_multiband_tif.py'
+copyfile(thisFile, logPath / logFolder / thisFile);
+
+# Get current date and time
+now = datetime.now()
+
+# Create a log file
+logFile = now.strftime('%Y%m%d') + log_suffix
+with open( logPath / logFolder / logFile, 'w') as file:
+
+    lines = ['Log generated by ' + thisFile + ' on ' + now.strftime('%Y/%m/%d %H:%M:%S') + '\n',
+             'Created multiband land class .tif for years {}-{} and area (lat_max, lon_min, lat_min, lon_max) [{}].'.format(years[0],years[-1],coordinates)]
+    for txt in lines:
+        file.write(txt)
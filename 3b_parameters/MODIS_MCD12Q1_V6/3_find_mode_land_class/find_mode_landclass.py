@@ -1,13 +1,28 @@
 # Find mode land class
+# Finds the most common land class over all years (bands) for each pixel in the multiband land class `.tif`.
+#
+# Workflow:
+# - Open the multiband `.tif` once; the number of years is taken from the number of bands in the file;
+# - Split the raster into blocks that are processed in parallel. For each block:
+#   - Read all bands of the block in one go;
+#   - Count per pixel how often each land class occurs, using small integer counters (one 2D counter per class that is
+#     present in the block);
+#   - The mode is the class with the highest count. In case of ties the lowest class is used (as in `scipy.stats.mode`);
+# - Write the mode land class to the output `.tif` block by block.
+#
+# Memory use depends on the block size and number of parallel workers, but not on the size of the domain. The number of
+# parallel workers is taken from environment variable `SLURM_CPUS_PER_TASK` if it exists and is otherwise equal to the
+# number of available CPUs.
 
 # Modules
 import os
 import numpy as np
+import rasterio
 from pathlib import Path
-import scipy.stats as sc
 from shutil import copyfile
 from datetime import datetime
-from osgeo import gdal, ogr, osr
+from rasterio.windows import Window
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Control file handling
 # Easy access to control file folder
@@ -83,89 +98,68 @@ for file in os.listdir(landClassPath):
 dest_file = read_from_control(controlFolder/controlFile,'parameter_land_tif_name')
 
 
+# --- Settings
+# Block size [pixels]; the output is stored in blocks of this size and processed one block per task
+block_size = 512
+
+# Number of parallel workers
+ncpus = int(os.environ.get('SLURM_CPUS_PER_TASK', default=os.cpu_count() or 1))
+
+
 # --- Function definition
-# Opens geotif file, extracts data from a single band and computes corner & center coordinates in lat/lon
-def open_geotif(file,band):
-    
-    # Do the things
-    ds = gdal.Open(file) # open the file
-    band = ds.GetRasterBand(band) # get the data band; there should be 18 for each of the 18 years
-    data = band.ReadAsArray() # convert to numpy array for further manipulation
-    width = ds.RasterXSize # pixel width
-    height = ds.RasterYSize # pixel height
-    rasterSize = [width,height]
-    geoTransform = ds.GetGeoTransform() # geolocation
-    boundingBox = np.zeros((5,2)) # coordinates of bounding box
-    boundingBox[0,0] = boundingBox[1,0] = geoTransform[0]
-    boundingBox[0,1] = boundingBox[2,1] = geoTransform[3]
-    boundingBox[2,0] = boundingBox[3,0] = geoTransform[0] + width*geoTransform[1]
-    boundingBox[1,1] = boundingBox[3,1] = geoTransform[3] + height*geoTransform[5]
-    boundingBox[4,0] = geoTransform[0] + (width/2)*geoTransform[1]
-    boundingBox[4,1] = geoTransform[3] + (height/2)*geoTransform[5]
-    
-    return data, geoTransform, rasterSize, boundingBox
+# Finds the mode over the first dimension of a (years x rows x cols) array of land classes
+def mode_over_years(data):
     
-# Writes data into a new geotif file
-# Source: https://gis.stackexchange.com/questions/199477/gdal-python-cut-geotiff-image/199565
-def write_geotif_sameDomain(src_file,des_file,des_data):
+    # Find the classes present in this block
+    classes = np.unique(data)
     
-    # load the source file to get the appropriate attributes
-    src_ds = gdal.Open(src_file)
+    # Count per pixel how often each class occurs; counts never exceed the number of years
+    count_type = np.min_scalar_type(data.shape[0])
+    counts = np.zeros((len(classes),) + data.shape[1:], dtype=count_type)
+    for idx,value in enumerate(classes):
+        counts[idx] = (data == value).sum(axis=0, dtype=count_type)
     
-    # get the geotransform
-    des_transform = src_ds.GetGeoTransform()
-    
-    # get the data dimensions
-    ncols = des_data.shape[1]
-    nrows = des_data.shape[0]
-    
-    # make the file
-    driver = gdal.GetDriverByName("GTiff")
-    dst_ds = driver.Create(des_file,ncols,nrows,1,gdal.GDT_Float32, options = [ 'COMPRESS=DEFLATE' ])
-    dst_ds.GetRasterBand(1).WriteArray( des_data ) 
-    dst_ds.SetGeoTransform(des_transform)
-    wkt = src_ds.GetProjection()
-    srs = osr.SpatialReference()
-    srs.ImportFromWkt(wkt)
-    dst_ds.SetProjection( srs.ExportToWkt() )
-    
-    # close files
-    src_ds = None
-    des_ds = None
+    # Mode = class with the highest count; np.argmax() returns the first (i.e. lowest) class in case of ties
+    return classes[np.argmax(counts, axis=0)]
 
-    return
+# Reads all bands of a single block and finds the mode land class in it
+def process_block(window):
     
+    # Open the file for each block; open files cannot be shared between threads
+    with rasterio.open(src_file) as src:
+        data = src.read(window=window) # all bands
+        
+    return window, mode_over_years(data)
+
 
 # -------------------------------------------------------------
 
 # ---  Find mode land class 
-# Get land use classes for each year
-land_use_classes = np.dstack((open_geotif( str(landClassPath/source_file) ,1)[0], \
-                              open_geotif( str(landClassPath/source_file) ,2)[0], \
-                              open_geotif( str(landClassPath/source_file) ,3)[0], \
-                              open_geotif( str(landClassPath/source_file) ,4)[0], \
-                              open_geotif( str(landClassPath/source_file) ,5)[0], \
-                              open_geotif( str(landClassPath/source_file) ,6)[0], \
-                              open_geotif( str(landClassPath/source_file) ,7)[0], \
-                              open_geotif( str(landClassPath/source_file) ,8)[0], \
-                              open_geotif( str(landClassPath/source_file) ,9)[0], \
-                              open_geotif( str(landClassPath/source_file) ,10)[0], \
-                              open_geotif( str(landClassPath/source_file) ,11)[0], \
-                              open_geotif( str(landClassPath/source_file) ,12)[0], \
-                              open_geotif( str(landClassPath/source_file) ,13)[0], \
-                              open_geotif( str(landClassPath/source_file) ,14)[0], \
-                              open_geotif( str(landClassPath/source_file) ,15)[0], \
-                              open_geotif( str(landClassPath/source_file) ,16)[0], \
-                              open_geotif( str(landClassPath/source_file) ,17)[0], \
-                              open_geotif( str(landClassPath/source_file) ,18)[0]))
-
-# Extract mode
-mode = sc.mode(land_use_classes,axis=2)[0].squeeze()
-
-# Store this in a new geotif file
+# File names
 src_file = str(landClassPath/source_file)
 des_file = str(modeLandClassPath/dest_file)
-write_geotif_sameDomain(src_file,des_file,mode)
+
+# Get the file properties; each band contains the land classes for a given year
+with rasterio.open(src_file) as src:
+    num_years = src.count
+    profile = src.profile
+
+# Output file settings
+profile.update(count=1, tiled=True, blockxsize=block_size, blockysize=block_size, compress='deflate',
+               BIGTIFF='IF_SAFER')
+print('Finding mode land class over {} years'.format(num_years))
+
+# Split the raster into blocks
+blocks = []
+for row in range(0, profile['height'], block_size):
+    for col in range(0, profile['width'], block_size):
+        blocks.append( Window(col, row, min(block_size, profile['width']-col), min(block_size, profile['height']-row)) )
+
+# Process the blocks in parallel and write the results as they come in, a limited number of blocks at a time
+with rasterio.open(des_file, 'w', **profile) as dst, ThreadPoolExecutor(max_workers=ncpus) as pool:
+    for start in range(0, len(blocks), 4*ncpus):
+        for window, mode in pool.map(process_block, blocks[start:start+4*ncpus]):
+            dst.write(mode, 1, window=window)
 
 
 # --- Code provenance
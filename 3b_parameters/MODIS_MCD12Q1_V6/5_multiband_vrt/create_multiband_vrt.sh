@@ -1,94 +0,0 @@
-# Create a new multiband VRT with each data year being one band
-
-# load the module
-module load gdal/3.0.4
-
-#---------------------------------
-# Specify settings
-#---------------------------------
-
-# --- Location of source data
-dest_line=$(grep -m 1 "^parameter_land_vrt3_path" ../../../0_control_files/control_active.txt) # full settings line
-source_path=$(echo ${dest_line##*|})   # removing the leading text up to '|'
-source_path=$(echo ${source_path%%#*}) # removing the trailing comments, if any are present
-
-# Specify the default path if needed
-if [ "$source_path" = "default" ]; then
-  
- # Get the root path and append the appropriate install directories
- root_line=$(grep -m 1 "^root_path" ../../../0_control_files/control_active.txt)
- root_path=$(echo ${root_line##*|}) 
- root_path=$(echo ${root_path%%#*})
-
- # domain name
- domain_line==$(grep -m 1 "^domain_name" ../../../0_control_files/control_active.txt)
- domain_name=$(echo ${domain_line##*|}) 
- domain_name=$(echo ${domain_name%%#*})
- 
- # source path
- source_path="${root_path}/domain_${domain_name}/parameters/landclass/4_domain_vrt_epsg_4326"
-
-fi
-
-# --- Location where converted data needs to go
-dest_line=$(grep -m 1 "^parameter_land_vrt4_path" ../../../0_control_files/control_active.txt) # full settings line
-dest_path=$(echo ${dest_line##*|})   # removing the leading text up to '|'
-dest_path=$(echo ${dest_path%%#*}) # removing the trailing comments, if any are present
-
-# Specify the default path if needed
-if [ "$dest_path" = "default" ]; then
-  
- # Get the root path and append the appropriate install directories
- root_line=$(grep -m 1 "^root_path" ../../../0_control_files/control_active.txt)
- root_path=$(echo ${root_line##*|}) 
- root_path=$(echo ${root_path%%#*})
-
- # domain name
- domain_line==$(grep -m 1 "^domain_name" ../../../0_control_files/control_active.txt)
- domain_name=$(echo ${domain_line##*|}) 
- domain_name=$(echo ${domain_name%%#*})
- 
- # destination path
- dest_path="${root_path}/domain_${domain_name}/parameters/landclass/5_multiband_domain_vrt_epsg_4326"
-fi
-
-# Make destination directory 
-mkdir -p $dest_path
-
-# --- Specify output filename
-FILENAME="domain_MCD12Q1_2001_2018.vrt"
-
-
-#---------------------------------
-# Create multiband VRT
-#---------------------------------
-
-# Find VRT filenames and store in temporary file
-ls ${source_path}/*.vrt > filelist.txt
-
-# Create the multiband VRT
-gdalbuildvrt -separate -input_file_list filelist.txt ${dest_path}/${FILENAME} -resolution highest
-
-# Remove the temporary file
-rm -f filelist.txt
-
-
-#---------------------------------
-# Code provenance
-#---------------------------------
-# Generates a basic log file in the domain folder and copies the control file and itself there.
-# Make a log directory if it doesn't exist
-log_path="${dest_path}/_workflow_log"
-mkdir -p $log_path
-
-# Log filename
-today=`date '+%F'`
-log_file="${today}_compile_log.txt"
-
-# Make the log
-this_file='create_multiband_vrt.sh'
-echo "Log generated by ${this_file} on `date '+%F %H:%M:%S'`"  > $log_path/$log_file # 1st line, store in new file
-echo 'Combined annual VRTs into a single multiband VRT.' >> $log_path/$log_file # 2nd line, append to existing file
-
-# Copy this file to log directory
-cp $this_file $log_path
\ No newline at end of file
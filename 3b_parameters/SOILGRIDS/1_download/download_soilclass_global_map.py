@@ -7,11 +7,16 @@
 
 # modules
 import os
+import sys
 from pathlib import Path
 from shutil import copyfile
 from datetime import datetime
 from hs_restclient import HydroShare, HydroShareAuthBasic
 
+# Shared data cache functions, see 0_tools/data_cache.py
+sys.path.append('../../../0_tools')
+import data_cache
+
 # --- Control file handling
 # Easy access to control file folder
 controlFolder = Path('../../../0_control_files')
@@ -73,6 +78,23 @@ else:
 soil_path.mkdir(parents=True, exist_ok=True)
 
 
+# --- Shared data cache
+# Find the shared data cache
+cache_path = read_from_control(controlFolder/controlFile,'data_cache_path')
+
+# Specify the default paths if required
+if cache_path == 'default':
+    cache_path = Path( read_from_control(controlFolder/controlFile,'root_path') ) / '_data_cache' # outputs a Path()
+elif cache_path == 'none':
+    cache_path = None # don't use a cache
+else:
+    cache_path = Path(cache_path) # make sure a user-specified path is a Path()
+
+# Find how domain files link to the cache and how large the cache may become
+cache_link = read_from_control(controlFolder/controlFile,'data_cache_link')
+cache_budget = float(read_from_control(controlFolder/controlFile,'data_cache_size_gb')) * 1e9 # [GB] to [bytes]
+
+
 # --- Get authentication info
 # Open the login details file and store as a dictionary
 hydroshare_login = {}
@@ -87,18 +109,30 @@ pwd = hydroshare_login['pass']
 
 
 # --- Download the data
-# Authenticate the user
-auth = HydroShareAuthBasic(username = usr, password = pwd)
-
-# Make a hydroshare object - note: needs authentication
-hs = HydroShare(auth=auth)
+# Name of the global map in the Hydroshare resource, and the key it is stored under in the shared data cache
+soil_name = 'usda_mode_soilclass_250m_ll.tif'
+soil_key = 'hydroshare/' + download_ID + '/' + soil_name
 
-# Specify the resource ID and download the resource data
-#out = hs.getResource(download_ID, destination=soil_path)
-out = hs.getResourceFile(download_ID, "usda_mode_soilclass_250m_ll.tif", destination = soil_path)
-
-# Check for output messages
-print(out)
+# Link the map from the shared data cache if another domain downloaded it already
+if data_cache.fetch(cache_path, soil_key, soil_path / soil_name, cache_link):
+    print('Linked ' + soil_name + ' from the shared data cache')
+else:
+    
+    # Authenticate the user
+    auth = HydroShareAuthBasic(username = usr, password = pwd)
+    
+    # Make a hydroshare object - note: needs authentication
+    hs = HydroShare(auth=auth)
+    
+    # Specify the resource ID and download the resource data
+    #out = hs.getResource(download_ID, destination=soil_path)
+    out = hs.getResourceFile(download_ID, soil_name, destination = soil_path)
+    
+    # Check for output messages
+    print(out)
+    
+    # Add the map to the shared data cache so that other domains don't need to download it
+    data_cache.store(cache_path, soil_key, soil_path / soil_name, cache_link, cache_budget)
 
 
 # --- Code provenance
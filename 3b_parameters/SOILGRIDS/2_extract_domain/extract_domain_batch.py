@@ -0,0 +1,262 @@
+# Extract multiple modelling domains
+# Batch version of `extract_domain.py`. Subsets the global map of soil classes to the domains specified in a list of
+# control files, reading the global map only once. This is much faster than running `extract_domain.py` once per
+# domain when many domains are prepared at the same time.
+#
+# Usage: python extract_domain_batch.py <control_file_1> <control_file_2> ...
+# Control files are specified by their name and must be located in the control file folder (`0_control_files`).
+#
+# Workflow:
+# - Find data locations and the bounding box of each domain in each control file;
+# - Group the domains by the global map they use;
+# - Read each global map block by block, skipping blocks that do not overlap any domain;
+# - Write each block that is read into the subset maps of all domains that overlap it.
+#
+# Notes:
+# - Subsets are expanded outwards to whole pixels of the global map, so that each subset covers its entire domain;
+# - The global map is read in windows of `chunk_size` pixels (rounded up to whole blocks of the global map). Windows
+#   are processed row by row, so that GDAL's block cache (capped at `gdal_cache_mb`) only needs to hold about one row of
+#   output blocks per domain;
+# - The name of the global map is the name used by the download script, instead of the last `.tif` file found in the
+#   download folder.
+
+# module
+import sys
+import math
+import rasterio
+from pathlib import Path
+from shutil import copyfile
+from datetime import datetime
+from rasterio.windows import Window
+
+# --- Control file handling
+# Easy access to control file folder
+controlFolder = Path('../../../0_control_files')
+
+# Function to extract a given setting from the control file
+def read_from_control( file, setting ):
+
+    # Open the control file and ...
+    with open(file) as contents:
+        for line in contents:
+
+            # ... find the line with the requested setting
+            if setting in line and not line.startswith('#'):
+                break
+
+    # Extract the setting's value
+    substring = line.split('|',1)[1]      # Remove the setting's name (split into 2 based on '|', keep only 2nd part)
+    substring = substring.split('#',1)[0] # Remove comments, does nothing if no '#' is found
+    substring = substring.strip()         # Remove leading and trailing whitespace, tabs, newlines
+
+    # Return this value
+    return substring
+
+# Function to specify a default path for the domain in a given control file
+def make_default_path(file, suffix):
+
+    # Get the root path
+    rootPath = Path( read_from_control(file,'root_path') )
+
+    # Get the domain folder
+    domainName = read_from_control(file,'domain_name')
+    domainFolder = 'domain_' + domainName
+
+    # Specify the forcing path
+    defaultPath = rootPath / domainFolder / suffix
+
+    return defaultPath
+
+
+# --- Settings
+# Name of the global soil class map, as downloaded by `../1_download/download_soilclass_global_map.py`
+soil_raw_name = 'usda_mode_soilclass_250m_ll.tif'
+
+# Size of the windows in which the global map is read [pixels]; rounded up to whole blocks of the global map
+chunk_size = 1024
+
+# Block size of the subset maps [pixels]
+block_size = 512
+
+# Size of GDAL's block cache [MB]
+gdal_cache_mb = 256
+
+# Tolerance used to snap coordinates to pixel edges [fraction of a pixel]
+snap_tolerance = 1e-6
+
+
+# --- Find the domains
+# Get the control files from the command line
+control_files = sys.argv[1:]
+if len(control_files) == 0:
+    print('Usage: python {} <control_file_1> <control_file_2> ...'.format(sys.argv[0]))
+    sys.exit(0)
+
+# Find data locations and the domain extent for each control file
+domains = []
+for control_file in control_files:
+    control = controlFolder / control_file
+
+    # Find the path where the raw soil maps are
+    soil_raw_path = read_from_control(control,'parameter_soil_raw_path')
+
+    # Specify the default paths if required
+    if soil_raw_path == 'default':
+        soil_raw_path = make_default_path(control,'parameters/soilclass/1_soil_classes_global') # outputs a Path()
+    else:
+        soil_raw_path = Path(soil_raw_path) # make sure a user-specified path is a Path()
+
+    # Find the path where the subset soil map need to go
+    soil_domain_path = read_from_control(control,'parameter_soil_domain_path')
+    soil_domain_name = read_from_control(control,'parameter_soil_tif_name')
+
+    # Specify the default paths if required
+    if soil_domain_path == 'default':
+        soil_domain_path = make_default_path(control,'parameters/soilclass/2_soil_classes_domain') # outputs a Path()
+    else:
+        soil_domain_path = Path(soil_domain_path) # make sure a user-specified path is a Path()
+
+    # Find the domain extent and split coordinates into (lat_max, lon_min, lat_min, lon_max)
+    coordinates = read_from_control(control,'forcing_raw_space').split('/')
+
+    domains.append({'control': control_file,
+                    'source': soil_raw_path / soil_raw_name,
+                    'path': soil_domain_path,
+                    'file': soil_domain_path / soil_domain_name,
+                    'coordinates': coordinates,
+                    'bbox': (float(coordinates[1]), float(coordinates[2]),  # min_lon, min_lat,
+                             float(coordinates[3]), float(coordinates[0]))}) # max_lon, max_lat
+
+# Group the domains by the global map they use, so that each map is read only once
+sources = {}
+for domain in domains:
+    sources.setdefault(domain['source'], []).append(domain)
+
+
+# --- Functions
+# Function to find the window of a global map that covers a domain, expanded outwards to whole pixels
+def domain_window(src, bbox):
+
+    # Find the pixel edges
+    min_lon, min_lat, max_lon, max_lat = bbox
+    col_min = math.floor((min_lon - src.transform.c) /  src.transform.a + snap_tolerance)
+    col_max = math.ceil( (max_lon - src.transform.c) /  src.transform.a - snap_tolerance)
+    row_min = math.floor((max_lat - src.transform.f) / src.transform.e + snap_tolerance)
+    row_max = math.ceil( (min_lat - src.transform.f) / src.transform.e - snap_tolerance)
+
+    # Clip to the extent of the map
+    col_min, col_max = max(col_min, 0), min(col_max, src.width)
+    row_min, row_max = max(row_min, 0), min(row_max, src.height)
+    if col_min >= col_max or row_min >= row_max:
+        return None
+
+    return Window(col_min, row_min, col_max-col_min, row_max-row_min)
+
+# Function to find the overlap between two windows, or None if they don't overlap
+def overlap(a, b):
+    col_start = max(a.col_off, b.col_off)
+    col_stop  = min(a.col_off + a.width, b.col_off + b.width)
+    row_start = max(a.row_off, b.row_off)
+    row_stop  = min(a.row_off + a.height, b.row_off + b.height)
+    if col_start >= col_stop or row_start >= row_stop:
+        return None
+    return Window(col_start, row_start, col_stop-col_start, row_stop-row_start)
+
+
+# --- Open the maps and do the subsetting
+with rasterio.Env(GDAL_CACHEMAX=gdal_cache_mb):
+    for source,group in sources.items():
+
+        # Check that the global map exists
+        if not source.is_file():
+            raise FileNotFoundError('Global soil class map {} not found. Used by control file(s) {}.'.format(
+                                     source, [domain['control'] for domain in group]))
+
+        with rasterio.open(source) as src:
+
+            # Find the window of each domain and open its subset map
+            active = []
+            for domain in group:
+                window = domain_window(src, domain['bbox'])
+                if window is None:
+                    print('Domain in {} does not overlap {}, skipping.'.format(domain['control'], source))
+                    continue
+                domain['path'].mkdir(parents=True, exist_ok=True)
+                profile = src.profile.copy()
+                profile.update({'driver': 'GTiff', 'height': window.height, 'width': window.width,
+                                'transform': src.window_transform(window),
+                                'tiled': True, 'blockxsize': block_size, 'blockysize': block_size,
+                                'compress': 'deflate', 'BIGTIFF': 'IF_SAFER'})
+                domain['window'] = window
+                domain['dst'] = rasterio.open(domain['file'], 'w', **profile)
+                active.append(domain)
+
+            # Read the global map in block-aligned windows, row by row
+            block_height, block_width = src.block_shapes[0]
+            chunk_height = math.ceil(chunk_size / block_height) * block_height
+            chunk_width  = math.ceil(chunk_size / block_width)  * block_width
+            try:
+                for row in range(0, src.height, chunk_height):
+                    for col in range(0, src.width, chunk_width):
+                        chunk = Window(col, row, min(chunk_width, src.width-col), min(chunk_height, src.height-row))
+
+                        # Find the domains that overlap this window; skip the window if there are none
+                        parts = [(domain, overlap(chunk, domain['window'])) for domain in active]
+                        parts = [(domain, part) for domain,part in parts if part is not None]
+                        if len(parts) == 0:
+                            continue
+
+                        # Read only the part of the window that is needed by at least one domain
+                        col_start = min(part.col_off for _,part in parts)
+                        col_stop  = max(part.col_off + part.width for _,part in parts)
+                        row_start = min(part.row_off for _,part in parts)
+                        row_stop  = max(part.row_off + part.height for _,part in parts)
+                        data = src.read(window=Window(col_start, row_start, col_stop-col_start, row_stop-row_start))
+
+                        # Write the overlapping part into each domain's subset map
+                        for domain,part in parts:
+                            r = part.row_off - row_start
+                            c = part.col_off - col_start
+                            domain['dst'].write(data[:, r:r+part.height, c:c+part.width],
+                                                window=Window(part.col_off - domain['window'].col_off,
+                                                              part.row_off - domain['window'].row_off,
+                                                              part.width, part.height))
+            finally:
+                for domain in active:
+                    domain['dst'].close()
+
+            print('Cropped {} to {} domain(s)'.format(source, len(active)))
+
+
+# --- Code provenance
+# Generates a basic log file in each domain folder and copies itself there.
+
+# Get current date and time
+now = datetime.now()
+
+# Log each domain that was cropped
+thisFile = 'extract_domain_batch.py'
+for domain in domains:
+    if 'window' not in domain:
+        continue
+
+    # Set the log path and file name
+    logPath = domain['path']
+    log_suffix = '_soilclass_cropping_log.txt'
+
+    # Create a log folder
+    logFolder = '_workflow_log'
+    Path( logPath / logFolder ).mkdir(parents=True, exist_ok=True)
+
+    # Copy this script
+    copyfile(thisFile, logPath / logFolder / thisFile);
+
+    # Create a log file
+    logFile = now.strftime('%Y%m%d') + log_suffix
+    with open( logPath / logFolder / logFile, 'w') as file:
+
+        lines = ['Log generated by ' + thisFile + ' on ' + now.strftime('%Y/%m/%d %H:%M:%S') + '\n',
+                 'Cropped SOILGRIDS-derived soil texture class map to local domain (lat_max, lon_min, lat_min, lon_max) [{}], '
+                 'as one of {} domains cropped in the same pass.'.format(domain['coordinates'], len(domains))]
+        for txt in lines:
+            file.write(txt)
@@ -2,11 +2,15 @@
 # Sorts the catchment shape by `gruId` first and `hruId` second, to ensure HRU order follows SUMMA conventions. Not strictly necessary for cases where each GRU contains one HRU, but essential for cases where the GRUs contain multiple HRUs.
 
 # modules
-import geopandas as gpd
+import sys
 from pathlib import Path
 from shutil import copyfile
 from datetime import datetime
 
+# Vector file input and output, see 0_tools/vector_io.py
+sys.path.append('../0_tools')
+import vector_io
+
 
 # --- Control file handling
 # Easy access to control file folder
@@ -66,15 +70,19 @@ gru_id = read_from_control(controlFolder/controlFile,'catchment_shp_gruid')
 hru_id = read_from_control(controlFolder/controlFile,'catchment_shp_hruid')
 
 
+# Find the format of the workflow's own vector files
+vector_format = read_from_control(controlFolder/controlFile,'vector_format')
+
+
 # --- Open shape and sort
-# Open the shape
-shp = gpd.read_file(catchment_path/catchment_name)
+# Open the shape; the user's shapefile is the import format
+shp = vector_io.read_vector(catchment_path/catchment_name)
 
 # Sort
 shp = shp.sort_values(by=[gru_id,hru_id])
 
-# Save
-shp.to_file(catchment_path/catchment_name)
+# Save in the workflow's own vector format; later steps read this file instead of the shapefile
+vector_io.write_vector(shp, catchment_path/catchment_name, vector_format)
 
 
 # --- Code provenance
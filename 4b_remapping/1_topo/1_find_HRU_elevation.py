@@ -1,22 +1,25 @@
 # Intersect catchment with MERIT DEM
-# Finds the mean elevation of each HRU in the model setup with pyQGIS.
+# Finds the elevation statistics, mean slope and contour length of each HRU in the model setup.
 #
 # Note:
-# The pyQGIS function `QgsZonalStatistics` automatically adds the calculated value to the shapefile used as input to the function. The workflow is thus:
-# 1. Find the source catchment shapefile;
-# 2. Copy the source catchment shapefile to the destintion location;
-# 3. Run the zonal statistics algorithm on the copy.
+# Zonal statistics are computed with the NumPy/rasterio engine in `zonal_statistics.py` (no QGIS install needed). The workflow is thus:
+# 1. Load the source catchment shape;
+# 2. Compute the terrain statistics of each HRU in a single pass over the DEM, stored in new columns:
+#    - `elev_mean`, `elev_min`, `elev_max`, `elev_std`: mean, minimum, maximum and standard deviation of elevation [m];
+#    - `tan_slope`: mean tangent slope [-], computed on DEM windows with a 1-pixel halo;
+#    - `contourLen`: contour length [m], estimated as HRU area divided by hillslope length (elevation range / mean slope);
+# 3. Save the catchment shape with the new columns to the intersection location, in the format set by `vector_format`.
 
 # modules
-import os
+import sys
 from pathlib import Path
-from shutil import which
 from shutil import copyfile
 from datetime import datetime
-from qgis.core import QgsApplication
-from qgis.core import QgsVectorLayer
-from qgis.core import QgsRasterLayer
-from qgis.analysis import QgsZonalStatistics
+import zonal_statistics as zs # zonal statistics engine in this folder
+
+# Vector file input and output, see 0_tools/vector_io.py
+sys.path.append('../../0_tools')
+import vector_io
 
 
 # --- Control file handling
@@ -98,58 +101,38 @@ else:
 intersect_path.mkdir(parents=True, exist_ok=True)
 
 
-# --- Copy the source catchment shapefile into the destination location
-# Find the name without extension
-catchment_base = catchment_name.replace('.shp','')
-
-# Loop over directory contents and copy files that match the filename of the shape
-for file in os.listdir(catchment_path):
-    if catchment_base in file: # copy only the relevant files in case there are more than 1 .shp files
-        
-        # make the output file name
-        _,ext = os.path.splitext(file)                    # extension of current file
-        basefile,_ = os.path.splitext(intersect_name)     # name of the intersection file w/o extension
-        newfile = basefile + ext                          # new name + old extension
-        
-        # copy
-        copyfile(catchment_path/file, intersect_path/newfile);
-        
-        
-# --- QGIS analysis
-# Initialize QGIS
-os.environ["QT_QPA_PLATFORM"] = "offscreen" # disable QT trying to connect to display; needed on HPC infrastructure
-qgis_path = which('qgis') # find the QGIS install location
-QgsApplication.setPrefixPath(qgis_path, True) # supply path to qgis install location
-qgs = QgsApplication([], False) # create a reference to the QgsApplication, GUI = False
-qgs.initQgis() # load providers
-
-# Convert Path() to string for QGIS
-catchment_file = str(intersect_path/intersect_name) # needs to be the copied file because output is automatically added to this
-dem_file = str(dem_path/dem_name)
-
-# Load the shape and raster
-layer_polygon = QgsVectorLayer(catchment_file,'merit_hydro_basin','ogr')
-layer_raster  = QgsRasterLayer(dem_file,'merit_hydro_dem')
-
-# Check we loaded the layers correctly
-if not layer_raster.isValid():
-    print('Raster layer failed to load')
-    
-if not layer_polygon.isValid():
-    print('Polygon layer failed to load')
-    
-# Create a zonal statistics object, automatically saved to file
+# --- Find where the HRU label grids are cached
+# Label cache path; shared by the DEM, soil and land class intersections
+label_cache_path = read_from_control(controlFolder/controlFile,'intersect_label_cache_path')
+
+# Specify default path if needed
+if label_cache_path == 'default':
+    label_cache_path = make_default_path('shapefiles/catchment_intersection/label_cache') # outputs a Path()
+else:
+    label_cache_path = Path(label_cache_path) # make sure a user-specified path is a Path()
+
+
+# --- Zonal statistics
+# Find the format of the workflow's own vector files
+vector_format = read_from_control(controlFolder/controlFile,'vector_format')
+
+# Load the catchment shape; the sorted catchment in the workflow's own format if it exists
+shp = vector_io.read_vector(vector_io.find_vector(catchment_path/catchment_name, vector_format))
+
+# Make sure the HRUs are in the same coordinate system as the DEM
+dem_file = dem_path/dem_name
+geometries = zs.geometries_in_raster_crs(shp, dem_file)
+
+# Find the terrain statistics of each HRU
 band = 1 # raster band with the data we are after
-zonalstats = QgsZonalStatistics(layer_polygon,                 # shapefile
-                                layer_raster,                  # .tif
-                                'elev_',                       # prefix for the new column added to the shapefile  
-                                band,                          # raster band we're interested in
-                                stats=QgsZonalStatistics.Mean).calculateStatistics(None)
-                                
-# Clean memory
-qgs.exitQgis()
-
-                                
+terrain = zs.zonal_terrain(dem_file, geometries, band=band, cache_path=label_cache_path)
+for column,values in terrain.items():
+    shp[column] = values
+
+# Save the catchment shape with the new columns to the intersection location
+vector_io.write_vector(shp, intersect_path/intersect_name, vector_format)
+
+
 # --- Code provenance
 # Generates a basic log file in the domain folder and copies the control file and itself there.
 
@@ -164,6 +147,7 @@ Path( logPath / logFolder ).mkdir(parents=True, exist_ok=True)
 # Copy this script
 thisFile = '1_find_HRU_elevation.py'
 copyfile(thisFile, logPath / logFolder / thisFile);
+copyfile('zonal_statistics.py', logPath / logFolder / 'zonal_statistics.py');
 
 # Get current date and time
 now = datetime.now()
@@ -172,6 +156,6 @@ logFile = now.strftime('%Y%m%d') + log_suffix
 with open( logPath / logFolder / logFile, 'w') as file:
     
     lines = ['Log generated by ' + thisFile + ' on ' + now.strftime('%Y/%m/%d %H:%M:%S') + '\n',
-             'Found mean HRU elevation from MERIT Hydro adjusted elevation DEM.']
+             'Found HRU elevation statistics, mean slope and contour length from MERIT Hydro adjusted elevation DEM.']
     for txt in lines:
         file.write(txt)  
@@ -1,18 +1,16 @@
 # Intersect catchment with SOILGRIDS soil classes
-# Counts the occurence of each soil class in each HRU in the model setup with pyQGIS.
+# Counts the occurence of each soil class in each HRU in the model setup.
 
 # modules
-import os
 import sys
 from pathlib import Path
-from shutil import which
 from shutil import copyfile
 from datetime import datetime
-from qgis.core import QgsApplication
-from qgis.core import QgsVectorLayer
-from qgis.core import QgsRasterLayer
-from qgis.core import QgsProcessingFeedback
-from qgis.analysis import QgsNativeAlgorithms
+import zonal_statistics as zs # zonal statistics engine in this folder
+
+# Vector file input and output, see 0_tools/vector_io.py
+sys.path.append('../../0_tools')
+import vector_io
 
 
 # --- Control file handling
@@ -94,46 +92,38 @@ else:
 intersect_path.mkdir(parents=True, exist_ok=True)
 
 
-# --- Initialize QGIS connection
-qgis_path = which('qgis') # find the QGIS install location
-QgsApplication.setPrefixPath(qgis_path, True) # supply path to qgis install location
+# --- Find where the HRU label grids are cached
+# Label cache path; shared by the DEM, soil and land class intersections
+label_cache_path = read_from_control(controlFolder/controlFile,'intersect_label_cache_path')
 
-# Now import the processing toolbox
-import processing # QGIS algorithm runner
+# Specify default path if needed
+if label_cache_path == 'default':
+    label_cache_path = make_default_path('shapefiles/catchment_intersection/label_cache') # outputs a Path()
+else:
+    label_cache_path = Path(label_cache_path) # make sure a user-specified path is a Path()
 
-# Import all native QGIS algorithms
-QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms());
 
+# --- Zonal statistics
+# Find the format of the workflow's own vector files
+vector_format = read_from_control(controlFolder/controlFile,'vector_format')
 
-# --- QGIS analysis
-# Convert Path() to string for QGIS
-catchment_file = str(catchment_path/catchment_name)
-soil_file      = str(soil_path/soil_name)
+# Load the catchment shape; the sorted catchment in the workflow's own format if it exists
+shp = vector_io.read_vector(vector_io.find_vector(catchment_path/catchment_name, vector_format))
 
-# Load the shape and raster
-layer_polygon = QgsVectorLayer(catchment_file,'merit_hydro_basin','ogr') # this works
-layer_raster  = QgsRasterLayer(soil_file,'soilgrids_soil_classes') # this works
+# Make sure the HRUs are in the same coordinate system as the soil class raster
+soil_file = soil_path/soil_name
+geometries = zs.geometries_in_raster_crs(shp, soil_file)
 
-# Check we loaded the layers correctly
-if not layer_raster.isValid():
-    print('Raster layer failed to load')
-    
-if not layer_polygon.isValid():
-    print('Polygon layer failed to load')
-    
-# Specify the parameters for the zonalHistogram function
+# Count the occurrence of each soil class in each HRU
 band = 1 # raster band with the data we are after
-params = { 'COLUMN_PREFIX': 'USGS_',
-           'INPUT_RASTER' : layer_raster, 
-           'INPUT_VECTOR' : layer_polygon, 
-           'OUTPUT'       : str(intersect_path/intersect_name), 
-           'RASTER_BAND'  : band }
-           
-# Algorithm feedback
-feedback = QgsProcessingFeedback()
+classes, hist = zs.zonal_histogram(soil_file, geometries, band=band, cache_path=label_cache_path)
+
+# Add the histogram to the shape as columns 'USGS_{class}'
+for column,counts in zs.histogram_to_columns('USGS_', classes, hist).items():
+    shp[column] = counts
 
-# Run the zonalHistogram
-res = processing.run("native:zonalhistogram", params, feedback=feedback)
+# Save the catchment shape with the new columns to the intersection location
+vector_io.write_vector(shp, intersect_path/intersect_name, vector_format)
 
 
 # --- Code provenance
@@ -150,6 +140,7 @@ Path( logPath / logFolder ).mkdir(parents=True, exist_ok=True)
 # Copy this script
 thisFile = '2_find_HRU_soil_classes.py'
 copyfile(thisFile, logPath / logFolder / thisFile);
+copyfile('zonal_statistics.py', logPath / logFolder / 'zonal_statistics.py');
 
 # Get current date and time
 now = datetime.now()
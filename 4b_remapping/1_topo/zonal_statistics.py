@@ -0,0 +1,549 @@
+# Zonal statistics engine
+# Replaces the pyQGIS `QgsZonalStatistics` and `native:zonalhistogram` calls used by the scripts in this folder.
+#
+# Workflow:
+# 1. Rasterize the HRU polygons once into a label grid that is aligned with the raster (0 = no HRU, i = i-th HRU),
+#    or use the label grid from the cache if the same HRUs were rasterized onto the same grid before;
+# 2. Sort the HRUs spatially and divide them into batches;
+# 3. For each batch, read only the block-aligned raster windows that overlap the batch's bounding box. Windows are
+#    processed in parallel;
+# 4. Reduce each window into per-HRU sums, counts or class counts with np.bincount() style operations;
+# 5. Combine the window results into one value (or one histogram) per HRU.
+#
+# Note:
+# Pixels are assigned to an HRU if the pixel center falls inside the HRU polygon, in line with QGIS' zonal statistics.
+# HRUs that are too small to contain any pixel center fall back to using all pixels they touch.
+#
+# Memory use:
+# Neither the raster nor the label grid is ever loaded as a whole. Both are read in windows of at most `tile_size` x
+# `tile_size` pixels (rounded up to whole raster blocks), and GDAL's block cache is capped at `gdal_cache_mb`. Memory
+# use therefore depends on the tile size and number of workers, but not on the size of the raster.
+#
+# Terrain statistics:
+# `zonal_terrain()` computes the elevation mean, minimum, maximum and standard deviation, the mean tangent slope and the
+# contour length of each HRU in a single pass over a DEM. Slopes are computed per window with Horn's method, reading a
+# halo of 1 pixel around each window so that pixels on window edges see all their neighbours.
+#
+# Label grid cache:
+# Label grids are stored as GeoTIFFs named 'hru_labels_[shape hash]_[grid hash].tif'. The shape hash is computed from the
+# HRU geometries (in the raster's coordinate system and in shapefile order), the grid hash from the raster's transform,
+# size and coordinate system. Rasters that share a grid definition (e.g. a DEM and a soil map on the same grid) therefore
+# share one cache entry, and updating the values in a raster does not invalidate the cache. Changing the catchment
+# shapefile or the raster grid results in a new cache entry.
+#
+# This file is imported by the numbered scripts in this folder and is not intended to be run on its own.
+
+# modules
+import os
+import math
+import hashlib
+import tempfile
+import functools
+import numpy as np
+import rasterio
+from pathlib import Path
+from rasterio import features
+from rasterio.windows import Window
+from rasterio.errors import WindowError
+from concurrent.futures import ThreadPoolExecutor
+
+
+# --- Settings
+# Default tile size [pixels]: maximum window size for raster reads. Windows are rounded to whole raster blocks
+default_tile_size = 1024
+
+# Default number of HRUs per batch
+default_batch_size = 500
+
+# Size of GDAL's raster block cache [MB]
+gdal_cache_mb = 256
+
+# Meters per degree on a spherical Earth with a radius of 6371 km, used for slopes on rasters in geographic coordinates
+meters_per_degree = math.pi * 6371000 / 180
+
+# Default number of parallel workers. Windows are processed by threads: GDAL releases the Python GIL while it reads
+# and decompresses raster data, so threads give us parallel I/O without copying data to other processes.
+default_ncpus = int(os.environ.get('SLURM_CPUS_PER_TASK', default=os.cpu_count() or 1))
+
+
+# --- Geometry handling
+# Returns the HRU geometries of a GeoDataFrame in the coordinate system of the raster
+def geometries_in_raster_crs(shp, raster_file):
+
+    with rasterio.open(raster_file) as src:
+        if shp.crs is not None and src.crs is not None and shp.crs != src.crs:
+            return shp.geometry.to_crs(src.crs).values
+
+    return shp.geometry.values
+
+# Returns an (n x 4) array with the bounding box (minx, miny, maxx, maxy) of each geometry; NaN for empty geometries
+def geometry_bounds(geometries):
+
+    bounds = np.full((len(geometries),4), np.nan)
+    for idx,geom in enumerate(geometries):
+        if geom is not None and not geom.is_empty:
+            bounds[idx] = geom.bounds
+
+    return bounds
+
+# Rasterizes HRU polygons into a label grid aligned with the given raster grid
+def rasterize_hrus(geometries, transform, shape, all_touched=False, labels=None):
+
+    '''Returns an int32 grid where each pixel contains the label of the HRU it belongs to, or 0. By default the label
+    is the (1-based) position of each geometry in the list.'''
+
+    # Default labels: position in the list + 1 so that 0 can mean 'no HRU'
+    if labels is None:
+        labels = np.arange(1, len(geometries)+1)
+
+    # Pair each geometry with its label
+    shapes = [(geom, int(lab)) for geom,lab in zip(geometries,labels) if geom is not None and not geom.is_empty]
+    if len(shapes) == 0:
+        return np.zeros(shape, dtype='int32')
+
+    # Burn the labels into the grid
+    grid = features.rasterize(shapes, out_shape=shape, transform=transform, fill=0,
+                              all_touched=all_touched, dtype='int32')
+
+    return grid
+
+
+# --- Windows
+# Splits a raster of given dimensions into a list of tile windows
+def make_tiles(height, width, tile_size=default_tile_size):
+
+    tiles = []
+    for row in range(0, height, tile_size):
+        for col in range(0, width, tile_size):
+            tiles.append( Window(col, row, min(tile_size, width-col), min(tile_size, height-row)) )
+
+    return tiles
+
+# Returns the block-aligned windows of at most ~tile_size x tile_size pixels that cover the given bounding box
+def block_windows(src, band, bounds, tile_size=default_tile_size):
+
+    # Find the raster block size and round the tile size up to a whole number of blocks
+    block_rows, block_cols = src.block_shapes[band-1]
+    tile_rows = max(1, tile_size // block_rows) * block_rows
+    tile_cols = max(1, tile_size // block_cols) * block_cols
+
+    # Find the pixel window that covers the bounding box
+    win = rasterio.windows.from_bounds(*bounds, transform=src.transform)
+
+    # Expand to whole blocks and clip to the raster
+    row_start = max(0, math.floor(win.row_off / block_rows) * block_rows)
+    col_start = max(0, math.floor(win.col_off / block_cols) * block_cols)
+    row_stop  = min(src.height, math.ceil((win.row_off + win.height) / block_rows) * block_rows)
+    col_stop  = min(src.width,  math.ceil((win.col_off + win.width)  / block_cols) * block_cols)
+
+    # Split into tiles
+    windows = []
+    for row in range(row_start, row_stop, tile_rows):
+        for col in range(col_start, col_stop, tile_cols):
+            windows.append( Window(col, row, min(tile_cols, col_stop-col), min(tile_rows, row_stop-row)) )
+
+    return windows
+
+# Sorts the HRUs spatially and divides them into batches of at most batch_size HRUs
+def make_batches(src, bounds, batch_size=default_batch_size, tile_size=default_tile_size):
+
+    '''Returns an array with the batch number of each HRU (-1 for empty geometries) and the number of batches.'''
+
+    # Find the pixel location of the center of each HRU's bounding box
+    has_geom = ~np.isnan(bounds[:,0])
+    center_x = (bounds[:,0] + bounds[:,2]) / 2
+    center_y = (bounds[:,1] + bounds[:,3]) / 2
+    cols = (center_x - src.transform.c) / src.transform.a
+    rows = (center_y - src.transform.f) / src.transform.e
+
+    # Sort by tile row first and then by column, so that HRUs in a batch are close together
+    idx   = np.flatnonzero(has_geom)
+    order = idx[ np.lexsort((cols[idx], np.floor(rows[idx] / tile_size))) ]
+
+    # Assign batch numbers in sorted order
+    batch_of = np.full(len(bounds), -1, dtype='int32')
+    batch_of[order] = np.arange(len(order)) // batch_size
+    num_batches = int(math.ceil(len(order) / batch_size))
+
+    return batch_of, num_batches
+
+
+# --- Label grids
+# Finds the cache file name for a set of HRU geometries on a given raster grid
+def label_cache_name(geometries, src):
+
+    # Hash the geometries
+    shape_hash = hashlib.sha256()
+    for geom in geometries:
+        shape_hash.update(b'' if geom is None else geom.wkb)
+
+    # Hash the grid definition
+    crs  = src.crs.to_wkt() if src.crs is not None else ''
+    grid = repr((tuple(src.transform)[:6], src.width, src.height, crs))
+    grid_hash = hashlib.sha256(grid.encode())
+
+    return 'hru_labels_{}_{}.tif'.format(shape_hash.hexdigest()[:16], grid_hash.hexdigest()[:16])
+
+# Writes the label grid for the HRUs on the grid of the given raster to file, one tile at a time
+def write_label_file(src, geometries, bounds, label_file, tile_size=default_tile_size):
+
+    # Label files are stored in blocks of 512 x 512 pixels and written in tiles that are a whole number of blocks
+    block_size = 512
+    tile_size  = max(1, tile_size // block_size) * block_size
+    profile = {'driver': 'GTiff', 'height': src.height, 'width': src.width, 'count': 1, 'dtype': 'int32',
+               'crs': src.crs, 'transform': src.transform, 'nodata': 0, 'sparse_ok': True,
+               'tiled': True, 'blockxsize': block_size, 'blockysize': block_size, 'compress': 'deflate',
+               'BIGTIFF': 'IF_SAFER'}
+
+    # Write to a temporary file first so that incomplete files never look like valid cache entries
+    temp_file = Path(label_file).with_suffix('.tmp{}'.format(os.getpid()))
+    with rasterio.open(temp_file, 'w', **profile) as dst:
+        for window in make_tiles(src.height, src.width, tile_size):
+
+            # Only rasterize the HRUs that overlap this tile; tiles that are never written read as 0 (no HRU)
+            left, bottom, right, top = rasterio.windows.bounds(window, src.transform)
+            sel = np.flatnonzero((bounds[:,0] < right) & (bounds[:,2] > left) & \
+                                 (bounds[:,1] < top)   & (bounds[:,3] > bottom))
+            if len(sel) == 0:
+                continue
+            labels = rasterize_hrus([geometries[ii] for ii in sel], rasterio.windows.transform(window, src.transform),
+                                    (window.height, window.width), labels=sel+1)
+            if labels.any():
+                dst.write(labels, 1, window=window)
+        dst.update_tags(n_hru=len(geometries))
+    os.replace(temp_file, label_file)
+
+    return
+
+# Returns the path to the label grid for the HRUs on the grid of the given raster, creating it if needed
+def get_label_file(src, geometries, bounds, cache_path, tile_size=default_tile_size):
+
+    # Find the cache entry
+    cache_path = Path(cache_path)
+    cache_file = cache_path / label_cache_name(geometries, src)
+
+    # Make the labels if they don't exist yet
+    if not cache_file.is_file():
+        cache_path.mkdir(parents=True, exist_ok=True)
+        write_label_file(src, geometries, bounds, cache_file, tile_size)
+
+    return cache_file
+
+
+# --- Window processing
+# Reads a raster window and returns the data together with a mask of valid (not nodata, not NaN) pixels
+def read_valid(src, band, window):
+
+    data = src.read(band, window=window)
+    valid = np.ones(data.shape, dtype=bool)
+    if src.nodata is not None:
+        valid &= (data != src.nodata)
+    if np.issubdtype(data.dtype, np.floating):
+        valid &= ~np.isnan(data)
+
+    return data, valid
+
+# Reads a raster window plus a halo of pixels on each side. Halo pixels outside the raster are marked as not valid
+def read_valid_halo(src, band, window, halo):
+
+    # Expand the window and clip it to the raster
+    expanded = Window(window.col_off-halo, window.row_off-halo, window.width+2*halo, window.height+2*halo)
+    clipped  = expanded.intersection(Window(0, 0, src.width, src.height))
+
+    # Read the clipped window
+    data, valid = read_valid(src, band, clipped)
+
+    # Pad back to the expanded window size
+    top  = clipped.row_off - expanded.row_off
+    left = clipped.col_off - expanded.col_off
+    pad  = ((top, expanded.height-clipped.height-top), (left, expanded.width-clipped.width-left))
+
+    return np.pad(data, pad), np.pad(valid, pad, constant_values=False)
+
+# Computes per-HRU sums and pixel counts for a single window
+def window_sum_count(data, labels):
+
+    # Only keep the pixels that belong to an HRU and have data
+    mask = labels > 0
+    lab  = labels[mask]
+    val  = data[mask].astype('float64')
+
+    # Reduce per label and only return the labels found in this window
+    sums   = np.bincount(lab, weights=val)
+    counts = np.bincount(lab)
+    found  = np.flatnonzero(counts)
+
+    return found, sums[found], counts[found]
+
+# Computes per-HRU class counts for a single window, as sparse (label, class value, count) triplets
+def window_class_counts(data, labels):
+
+    # Only keep the pixels that belong to an HRU and have data
+    mask = labels > 0
+    lab  = labels[mask].astype('int64')
+    val  = data[mask]
+
+    # Map the class values in this window onto consecutive indices, then count unique (label, class) pairs
+    classes, class_idx = np.unique(val, return_inverse=True)
+    pairs, counts = np.unique(lab * len(classes) + class_idx.ravel(), return_counts=True)
+
+    return pairs // len(classes), classes[pairs % len(classes)], counts
+
+# Computes per-HRU elevation and slope statistics for a single window with a halo of 1 pixel
+def window_terrain(data, valid, labels, window, transform, geographic):
+
+    '''Returns the labels found in the window, an array with per-label sums (pixel count, elevation, elevation
+    squared, area, tangent slope, slope pixel count) and the per-label minimum and maximum elevation.'''
+
+    # Elevations with NaN for missing data
+    z = data.astype('float64')
+    z[~valid] = np.nan
+
+    # Find the pixel sizes [m] of each row in the window
+    lat = transform.f + transform.e * (window.row_off + np.arange(window.height) + 0.5)
+    if geographic:
+        dx = abs(transform.a) * meters_per_degree * np.cos(np.radians(lat))
+        dy = np.full(window.height, abs(transform.e) * meters_per_degree)
+    else:
+        dx = np.full(window.height, abs(transform.a))
+        dy = np.full(window.height, abs(transform.e))
+    dx = dx[:,None]
+    dy = dy[:,None]
+
+    # Horn's method on the 3x3 neighbourhood of each pixel; NaN if any neighbour has no data
+    dzdx = ((z[:-2,2:] + 2*z[1:-1,2:] + z[2:,2:]) - (z[:-2,:-2] + 2*z[1:-1,:-2] + z[2:,:-2])) / (8*dx)
+    dzdy = ((z[2:,:-2] + 2*z[2:,1:-1] + z[2:,2:]) - (z[:-2,:-2] + 2*z[:-2,1:-1] + z[:-2,2:])) / (8*dy)
+    slope = np.sqrt(dzdx**2 + dzdy**2)
+
+    # Only keep the pixels that belong to an HRU and have data
+    mask = labels > 0
+    if not mask.any():
+        return None
+    lab   = labels[mask]
+    elev  = z[1:-1,1:-1][mask]
+    area  = np.broadcast_to(dx*dy, labels.shape)[mask]
+    slope = slope[mask]
+    has_slope = ~np.isnan(slope)
+
+    # Reduce per label
+    size = lab.max() + 1
+    sums = np.stack([np.bincount(lab, minlength=size),
+                     np.bincount(lab, weights=elev, minlength=size),
+                     np.bincount(lab, weights=elev**2, minlength=size),
+                     np.bincount(lab, weights=area, minlength=size),
+                     np.bincount(lab[has_slope], weights=slope[has_slope], minlength=size),
+                     np.bincount(lab[has_slope], minlength=size)], axis=1)
+    found = np.flatnonzero(sums[:,0])
+
+    # Minimum and maximum per label, from the labels in sorted order
+    order  = np.argsort(lab, kind='stable')
+    starts = np.flatnonzero(np.r_[True, lab[order][1:] != lab[order][:-1]])
+    mins   = np.minimum.reduceat(elev[order], starts)
+    maxs   = np.maximum.reduceat(elev[order], starts)
+
+    return found, sums[found], mins, maxs
+
+# Runs a window function over the windows that overlap each HRU batch in parallel and returns the non-empty results
+def run_batches(func, raster_file, band, geometries, cache_path=None,
+                batch_size=default_batch_size, tile_size=default_tile_size, ncpus=default_ncpus, halo=0):
+
+    '''Window functions are called as func(data, labels). If halo > 0, the data is read with `halo` extra pixels on
+    each side of the window and window functions are called as func(data, valid, labels, window) instead.'''
+
+    # Use a temporary label file if no cache is used
+    with tempfile.TemporaryDirectory() as temp_path, rasterio.Env(GDAL_CACHEMAX=gdal_cache_mb):
+
+        # Find the label grid and the batches
+        bounds = geometry_bounds(geometries)
+        with rasterio.open(raster_file) as src:
+            label_file = get_label_file(src, geometries, bounds, cache_path or temp_path, tile_size)
+            batch_of, num_batches = make_batches(src, bounds, batch_size, tile_size)
+
+            # Find the block-aligned windows that cover each batch
+            tasks = []
+            for batch in range(num_batches):
+                members = batch_of == batch
+                batch_bounds = (bounds[members,0].min(), bounds[members,1].min(),
+                                bounds[members,2].max(), bounds[members,3].max())
+                tasks += [(batch, window) for window in block_windows(src, band, batch_bounds, tile_size)]
+
+        # Lookup table from label to batch number; label 0 (no HRU) is in no batch
+        label_batch = np.concatenate(([-1], batch_of))
+
+        # Process a single window
+        def process(task):
+            batch, window = task
+            with rasterio.open(raster_file) as src, rasterio.open(label_file) as lab:
+                labels = lab.read(1, window=window)
+
+                # Only keep the HRUs in this batch; HRUs from other batches are processed with their own batch
+                labels[label_batch[labels] != batch] = 0
+                if not labels.any():
+                    return None
+
+                if halo > 0:
+                    data, valid = read_valid_halo(src, band, window, halo)
+                    labels[~valid[halo:-halo,halo:-halo]] = 0
+                    return func(data, valid, labels, window)
+
+                data, valid = read_valid(src, band, window)
+                labels[~valid] = 0
+
+            return func(data, labels)
+
+        # Process all windows
+        with ThreadPoolExecutor(max_workers=ncpus) as pool:
+            results = [res for res in pool.map(process, tasks) if res is not None]
+
+    return results
+
+# Finds the pixels touched by a single geometry, for HRUs without any pixel center inside them
+def touched_pixels(src, band, geometry):
+
+    # Find the (pixel-aligned) window that covers this geometry. Start and stop are rounded outwards separately, so that
+    # pixels the geometry only partly covers at either edge are kept
+    window = rasterio.windows.from_bounds(*geometry.bounds, transform=src.transform)
+    col_start, row_start = math.floor(window.col_off), math.floor(window.row_off)
+    col_stop  = math.ceil(window.col_off + window.width)
+    row_stop  = math.ceil(window.row_off + window.height)
+    window = Window(col_start, row_start, max(col_stop-col_start, 1), max(row_stop-row_start, 1))
+    try:
+        window = window.intersection(Window(0, 0, src.width, src.height))
+    except WindowError: # geometry is outside the raster
+        return np.array([], dtype=src.dtypes[band-1])
+
+    # Rasterize only this geometry in this window, counting every pixel it touches
+    labels = rasterize_hrus([geometry], src.window_transform(window), (window.height, window.width), all_touched=True)
+
+    # Get the values
+    data, valid = read_valid(src, band, window)
+
+    return data[valid & (labels > 0)]
+
+
+# --- Zonal statistics
+# Computes the mean raster value for each HRU
+def zonal_mean(raster_file, geometries, band=1, cache_path=None,
+               batch_size=default_batch_size, tile_size=default_tile_size, ncpus=default_ncpus):
+
+    '''Returns an array with the mean raster value per geometry (NaN if no data is found).'''
+
+    # Process all windows
+    results = run_batches(window_sum_count, raster_file, band, geometries, cache_path, batch_size, tile_size, ncpus)
+
+    # Combine the window results
+    sums   = np.zeros(len(geometries)+1)
+    counts = np.zeros(len(geometries)+1, dtype='int64')
+    for found, window_sums, window_counts in results:
+        sums[found]   += window_sums
+        counts[found] += window_counts
+
+    # Compute the means, dropping the 'no HRU' label
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = (sums / counts)[1:]
+
+    # Handle HRUs too small to contain a pixel center
+    with rasterio.open(raster_file) as src:
+        for idx in np.flatnonzero(counts[1:] == 0):
+            if geometries[idx] is None or geometries[idx].is_empty:
+                continue
+            values = touched_pixels(src, band, geometries[idx])
+            if values.size > 0:
+                means[idx] = values.astype('float64').mean()
+
+    return means
+
+# Counts the occurrence of each raster value in each HRU
+def zonal_histogram(raster_file, geometries, band=1, cache_path=None,
+                    batch_size=default_batch_size, tile_size=default_tile_size, ncpus=default_ncpus):
+
+    '''Returns the sorted class values found in the raster and an (n_geometries x n_classes) array of pixel counts.'''
+
+    # Process all windows
+    results = run_batches(window_class_counts, raster_file, band, geometries, cache_path, batch_size, tile_size, ncpus)
+
+    # Handle HRUs too small to contain a pixel center
+    with rasterio.open(raster_file) as src:
+        found = np.zeros(len(geometries)+1, dtype=bool)
+        for window_labels,_,_ in results:
+            found[window_labels] = True
+        for idx in np.flatnonzero(~found[1:]):
+            if geometries[idx] is None or geometries[idx].is_empty:
+                continue
+            values, counts = np.unique(touched_pixels(src, band, geometries[idx]), return_counts=True)
+            results.append( (np.full(len(values), idx+1), values, counts) )
+
+    # Find all classes present across windows
+    if len(results) == 0:
+        return np.array([]), np.zeros((len(geometries),0), dtype='int64')
+    classes = np.unique(np.concatenate([window_classes for _,window_classes,_ in results]))
+
+    # Combine the window results into a single histogram table
+    hist = np.zeros((len(geometries)+1, len(classes)), dtype='int64')
+    for window_labels, window_classes, window_counts in results:
+        np.add.at(hist, (window_labels, np.searchsorted(classes, window_classes)), window_counts)
+
+    return classes, hist[1:]
+
+# Computes elevation and slope statistics for each HRU in a single pass over a DEM
+def zonal_terrain(raster_file, geometries, band=1, cache_path=None,
+                  batch_size=default_batch_size, tile_size=default_tile_size, ncpus=default_ncpus):
+
+    '''Returns a dictionary with per-geometry arrays `elev_mean`, `elev_min`, `elev_max`, `elev_std` [m], `tan_slope`
+    [-] and `contourLen` [m] (NaN if no data is found).
+
+    Contour length is estimated by treating each HRU as a planar hillslope: the hillslope length follows from the
+    elevation range and mean slope, and contour length is the HRU area divided by this length.'''
+
+    # Process all windows, with a halo of 1 pixel for the slope calculations
+    with rasterio.open(raster_file) as src:
+        func = functools.partial(window_terrain, transform=src.transform,
+                                 geographic=src.crs is not None and src.crs.is_geographic)
+    results = run_batches(func, raster_file, band, geometries, cache_path, batch_size, tile_size, ncpus, halo=1)
+
+    # Combine the window results
+    sums = np.zeros((len(geometries)+1, 6))
+    mins = np.full(len(geometries)+1, np.inf)
+    maxs = np.full(len(geometries)+1, -np.inf)
+    for found, window_sums, window_mins, window_maxs in results:
+        sums[found] += window_sums
+        mins[found]  = np.minimum(mins[found], window_mins)
+        maxs[found]  = np.maximum(maxs[found], window_maxs)
+    count, elev_sum, elev_sq, area, slope_sum, slope_count = sums[1:].T
+    mins = mins[1:]
+    maxs = maxs[1:]
+
+    # Compute the statistics
+    with np.errstate(invalid='ignore', divide='ignore'):
+        terrain = {'elev_mean': elev_sum / count,
+                   'elev_min':  np.where(count > 0, mins, np.nan),
+                   'elev_max':  np.where(count > 0, maxs, np.nan),
+                   'elev_std':  np.sqrt(np.maximum(elev_sq / count - (elev_sum / count)**2, 0)),
+                   'tan_slope': slope_sum / slope_count}
+        relief = terrain['elev_max'] - terrain['elev_min']
+        terrain['contourLen'] = np.where((relief > 0) & (terrain['tan_slope'] > 0),
+                                         area * terrain['tan_slope'] / relief, np.sqrt(area))
+        terrain['contourLen'][np.isnan(terrain['tan_slope'])] = np.nan
+
+    # Handle HRUs too small to contain a pixel center; slope and contour length are not estimated for these
+    with rasterio.open(raster_file) as src:
+        for idx in np.flatnonzero(count == 0):
+            if geometries[idx] is None or geometries[idx].is_empty:
+                continue
+            values = touched_pixels(src, band, geometries[idx]).astype('float64')
+            if values.size > 0:
+                terrain['elev_mean'][idx] = values.mean()
+                terrain['elev_min'][idx]  = values.min()
+                terrain['elev_max'][idx]  = values.max()
+                terrain['elev_std'][idx]  = values.std()
+
+    return terrain
+
+# Converts a histogram table into named columns, e.g. 'USGS_0', 'USGS_1', ...
+def histogram_to_columns(prefix, classes, hist):
+
+    columns = {}
+    for ii,value in enumerate(classes):
+        columns[prefix + str(int(value))] = hist[:,ii]
+
+    return columns
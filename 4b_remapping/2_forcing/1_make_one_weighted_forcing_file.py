@@ -15,6 +15,7 @@
 
 # modules
 import os
+import sys
 import glob
 import easymore
 from pathlib import Path
@@ -22,6 +23,10 @@ from shutil import rmtree
 from shutil import copyfile
 from datetime import datetime
 
+# Vector file input and output, see 0_tools/vector_io.py
+sys.path.append('../../0_tools')
+import vector_io
+
 
 # --- Control file handling
 # Easy access to control file folder
@@ -166,7 +171,12 @@ esmr.source_shp_lat = read_from_control(controlFolder/controlFile,'forcing_shape
 esmr.source_shp_lon = read_from_control(controlFolder/controlFile,'forcing_shape_lon_name') # name of the longitude field
 
 # Catchment shapefile and variable names
-esmr.target_shp = catchment_path/catchment_name
+# EASYMORE reads shapefiles; export the catchment to a temporary shapefile if the workflow stores it in another format
+vector_format = read_from_control(controlFolder/controlFile,'vector_format')
+catchment_file = vector_io.find_vector(catchment_path/catchment_name, vector_format)
+if catchment_file.suffix != '.shp':
+    catchment_file = vector_io.write_vector(vector_io.read_vector(catchment_file), forcing_easymore_path/catchment_name, 'shp')
+esmr.target_shp = catchment_file
 esmr.target_shp_ID  = read_from_control(controlFolder/controlFile,'catchment_shp_hruid') # name of the HRU ID field
 esmr.target_shp_lat = read_from_control(controlFolder/controlFile,'catchment_shp_lat')   # name of the latitude field
 esmr.target_shp_lon = read_from_control(controlFolder/controlFile,'catchment_shp_lon')   # name of the longitude field
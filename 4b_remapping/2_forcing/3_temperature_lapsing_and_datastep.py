@@ -10,6 +10,7 @@
 
 # modules
 import os
+import sys
 import numpy as np
 import xarray as xr
 import pandas as pd
@@ -17,6 +18,13 @@ from pathlib import Path
 from shutil import copyfile
 from datetime import datetime
 
+# Vector file input and output, see 0_tools/vector_io.py
+sys.path.append('../../0_tools')
+import vector_io
+
+# Domain HRU index, see 0_tools/forcing_index.py
+import forcing_index
+
 
 # --- Control file handling
 # Easy access to control file folder
@@ -110,11 +118,18 @@ else:
 # Make the folder if it doesn't exist
 forcing_summa_path.mkdir(parents=True, exist_ok=True)
 
+# Location of the domain HRU index, that describes the SUMMA-ready files
+forcing_index_path = read_from_control(controlFolder/controlFile,'forcing_index_path')
+forcing_index_name = read_from_control(controlFolder/controlFile,'forcing_index_name')
+
+# Specify default path if needed
+if forcing_index_path == 'default':
+    forcing_index_path = make_default_path('forcing/5_forcing_index') # outputs a Path()
+else:
+    forcing_index_path = Path(forcing_index_path) # make sure a user-specified path is a Path()
 
-# --- Find the area-weighted lapse value for each basin
-# Load the intersection file
-topo_data = pd.read_csv(intersect_path/intersect_name) 
 
+# --- Find the area-weighted lapse value for each basin
 # Find hruId name in user's shapefile
 hru_ID_name = read_from_control(controlFolder/controlFile,'catchment_shp_hruid')
 gru_ID_name = read_from_control(controlFolder/controlFile,'catchment_shp_gruid')
@@ -128,6 +143,12 @@ catchment_elev = 'S_1_elev_mean'      # EASYMORE prefix + name used in catchment
 forcing_elev   = 'S_2_elev_m'         # EASYMORE prefix + name used in ERA5 shapefile generation
 weights        = 'weight'             # EASYMORE feature
 
+# Load the intersection file; only the columns we need
+columns = [gru_ID, hru_ID, catchment_elev, forcing_elev, weights]
+topo_data = vector_io.read_table(intersect_path/intersect_name, columns=list(dict.fromkeys(columns)),
+                                 dtypes={gru_ID: 'int32', hru_ID: 'int32', catchment_elev: 'float32',
+                                         forcing_elev: 'float32', weights: 'float32'})
+
 # Define the lapse rate
 lapse_rate = 0.0065 # [K m-1]
 
@@ -145,11 +166,18 @@ else:
 # Sort and set hruID as the index variable
 lapse_values = lapse_values.sort_values(hru_ID).set_index(hru_ID)
 
+# Keep track of the GRU each HRU belongs to, for the domain HRU index
+hru2gru = lapse_values[gru_ID] if gru_ID != hru_ID else pd.Series(lapse_values.index, index=lapse_values.index)
+
 # Close the main file
 del topo_data # hopefully this saves some RAM but this is apparently not so straightforward in Python.. Can't hurt
 
 
 # --- Loop over forcing files; apply lapse rates and add data-step variable
+# Keep track of the HRU order and time period of each file, for the domain HRU index
+forcing_hruIds = None
+file_info = []
+
 # Initiate the loop
 for file in forcing_files:
     
@@ -185,6 +213,22 @@ for file in forcing_files:
         # --- Save to file in new location
         dat.to_netcdf(forcing_summa_path/file) 
         
+        # --- Keep track of HRU order and time period
+        if forcing_hruIds is None:
+            forcing_hruIds = dat['hruId'].values.astype(int)
+        elif not np.array_equal(forcing_hruIds, dat['hruId'].values.astype(int)):
+            raise ValueError('HRU order in {} differs from that in the other forcing files.'.format(file))
+        file_info.append(forcing_index.describe_file(file, dat['time'].values, data_step))
+        
+        
+# --- Write the domain HRU index
+# HRU order, GRU membership and time period of each file; used by later scripts instead of opening the forcing files
+if len(file_info) == 0:
+    raise FileNotFoundError('No forcing files found in {}. Run the EASYMORE remapping first.'.format(forcing_easymore_path))
+index_file = forcing_index.write_index(forcing_index_path/forcing_index_name, forcing_hruIds, 
+                                       hru2gru.loc[forcing_hruIds].values, file_info)
+print('Wrote domain HRU index to {}'.format(index_file))
+        
         
 # --- Code provenance
 # Generates a basic log file in the domain folder and copies the control file and itself there.
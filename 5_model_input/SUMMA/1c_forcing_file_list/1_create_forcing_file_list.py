@@ -1,12 +1,21 @@
 # Create forcing file list
 # Populates a text file with the names of the forcing files used as SUMMA input.
+#
+# Only the forcing files that contain data for (part of) the simulation period are listed, so that SUMMA does not open
+# files it doesn't use. The time period of each file is taken from the domain HRU index, which is written when the
+# forcing files are finalized. If no index exists, all forcing files are listed.
 
 # modules
 import os
+import sys
 from pathlib import Path
 from shutil import copyfile
 from datetime import datetime
 
+# Domain HRU index, see 0_tools/forcing_index.py
+sys.path.append('../../../0_tools')
+import forcing_index
+
 
 # --- Control file handling
 # Easy access to control file folder
@@ -60,6 +69,33 @@ if forcing_path == 'default':
 else:
     forcing_path = Path(forcing_path) # make sure a user-specified path is a Path()
     
+# Domain HRU index path & name; contains the time period of each forcing file
+forcing_index_path = read_from_control(controlFolder/controlFile,'forcing_index_path')
+forcing_index_name = read_from_control(controlFolder/controlFile,'forcing_index_name')
+
+# Specify default path if needed
+if forcing_index_path == 'default':
+    forcing_index_path = make_default_path('forcing/5_forcing_index') # outputs a Path()
+else:
+    forcing_index_path = Path(forcing_index_path) # make sure a user-specified path is a Path()
+    
+    
+# --- Find the simulation period
+# Same as in the file manager
+sim_start = read_from_control(controlFolder/controlFile,'experiment_time_start')
+sim_end   = read_from_control(controlFolder/controlFile,'experiment_time_end')
+
+# Define default times if needed
+if sim_start == 'default':
+    raw_time = read_from_control(controlFolder/controlFile,'forcing_raw_time') # downloaded forcing (years)
+    year_start,_ = raw_time.split(',') # split into separate variables
+    sim_start = year_start + '-01-01 00:00' # construct the filemanager field
+
+if sim_end == 'default':
+    raw_time = read_from_control(controlFolder/controlFile,'forcing_raw_time') # downloaded forcing (years)
+    _,year_end = raw_time.split(',') # split into separate variables
+    sim_end   = year_end   + '-12-31 23:00' # construct the filemanager field
+    
     
 # --- Find where forcing file list needs to go
 # Forcing file list path & name
@@ -77,11 +113,24 @@ file_list_path.mkdir(parents=True, exist_ok=True)
 
 
 # --- Make the file
-# Find a list of forcing files
-_,_,forcing_files = next(os.walk(forcing_path))
-
-# Sort this list
-forcing_files.sort()
+# Find the forcing files that overlap the simulation period
+if (forcing_index_path/forcing_index_name).is_file():
+    index = forcing_index.read_index(forcing_index_path/forcing_index_name)
+    forcing_files = forcing_index.files_in_period(index, sim_start, sim_end)
+    
+    # Check that these cover the full simulation period
+    for problem in forcing_index.check_coverage(index, forcing_files, sim_start, sim_end):
+        print('Warning: ' + problem)
+    print('Listing {} of {} forcing files for simulation period {} to {}'.format(
+           len(forcing_files), len(index['file']), sim_start, sim_end))
+    
+# Use all forcing files if there is no index
+else:
+    print('Forcing index {} not found, listing all forcing files'.format(forcing_index_path/forcing_index_name))
+    _,_,forcing_files = next(os.walk(forcing_path))
+    
+    # Sort this list
+    forcing_files.sort()
 
 # Create the file list
 with open(file_list_path / file_list_name, 'w') as f:
@@ -112,6 +161,6 @@ logFile = now.strftime('%Y%m%d') + log_suffix
 with open( logPath / logFolder / logFile, 'w') as file:
     
     lines = ['Log generated by ' + thisFile + ' on ' + now.strftime('%Y/%m/%d %H:%M:%S') + '\n',
-             'Generated forcing file list.']
+             'Generated forcing file list for simulation period {} to {}.'.format(sim_start, sim_end)]
     for txt in lines:
         file.write(txt) 
\ No newline at end of file
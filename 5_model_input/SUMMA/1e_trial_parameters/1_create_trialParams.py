@@ -2,17 +2,20 @@
 # Creates empty `trialParams.nc` file for SUMMA runs. This file will initially be empty, but can later be populated with parameter values the user whishes to test.
 #
 # Note on HRU order
-#HRU order must be the same in forcing, attributes, initial conditions and trial parameter files. Order will be taken from forcing files to ensure consistency.
+#HRU order must be the same in forcing, attributes, initial conditions and trial parameter files. Order will be taken from forcing files to ensure consistency, through the domain HRU index.
 
 # modules
-import os
+import sys
 import numpy as np
-import xarray as xr
 import netCDF4 as nc4
 from pathlib import Path
 from shutil import copyfile
 from datetime import datetime
 
+# Domain HRU index, see 0_tools/forcing_index.py
+sys.path.append('../../../0_tools')
+import forcing_index
+
 
 # --- Control file handling
 # Easy access to control file folder
@@ -56,7 +59,7 @@ def make_default_path(suffix):
     return defaultPath
     
     
-# --- Find forcing location and an example file
+# --- Find forcing location and the domain HRU index
 # Forcing path
 forcing_path = read_from_control(controlFolder/controlFile,'forcing_summa_path')
 
@@ -66,11 +69,15 @@ if forcing_path == 'default':
 else:
     forcing_path = Path(forcing_path) # make sure a user-specified path is a Path()
     
-# Find a list of forcing files
-_,_,forcing_files = next(os.walk(forcing_path))
+# Domain HRU index path & name; contains the hruId order of the forcing files
+forcing_index_path = read_from_control(controlFolder/controlFile,'forcing_index_path')
+forcing_index_name = read_from_control(controlFolder/controlFile,'forcing_index_name')
 
-# Select a random file as a template for hruId order
-forcing_name = forcing_files[0]
+# Specify default path if needed
+if forcing_index_path == 'default':
+    forcing_index_path = make_default_path('forcing/5_forcing_index') # outputs a Path()
+else:
+    forcing_index_path = Path(forcing_index_path) # make sure a user-specified path is a Path()
 
 
 # --- Find where the trial parameter file needs to go
@@ -89,11 +96,8 @@ parameter_path.mkdir(parents=True, exist_ok=True)
 
 
 # --- Find order and number of HRUs in forcing file
-# Open the forcing file
-forc = xr.open_dataset(forcing_path/forcing_name)
-
-# Get the sorting order from the forcing file
-forcing_hruIds = forc['hruId'].values.astype(int) # 'hruId' is prescribed by SUMMA so this variable must exist
+# Get the sorting order of the forcing files from the domain HRU index (or from a forcing file if there is no index)
+forcing_hruIds = forcing_index.read_hru_ids(forcing_index_path/forcing_index_name, forcing_path)
 
 # Number of HRUs
 num_hru = len(forcing_hruIds)
@@ -0,0 +1,449 @@
+# Create attributes.nc
+# Creates the attributes .nc file in a single pass. See: https://summa.readthedocs.io/en/master/input_output/SUMMA_input/
+#
+# The catchment shapefile, the soil and land class histograms and the elevation statistics are joined into one table
+# with one row per HRU. This table is checked for missing values and then written to the attributes file in one go.
+#
+# Note on HRU order
+# HRU order must be the same in forcing, attributes, initial conditions and trial parameter files. Order will be taken from forcing files to ensure consistency, through the domain HRU index.
+#
+# Values
+# | Variable       | Value |
+# |:---------------|:------|
+# | hruId          | taken from the shapefile index values |
+# | gruId          | taken from the shapefile index values |
+# | hru2gruId      | taken from the shapefile index values |
+# | downHRUindex   | 0, each HRU is independent column; optionally based on relative HRU elevation in each GRU |
+# | longitude      | taken from the shapefile geometry |
+# | latitude       | taken from the shapefile geometry |
+# | elevation      | mean HRU elevation from the MERIT Hydro DEM |
+# | HRUarea        | taken from the shapefile attributes |
+# | tan_slope      | mean slope from the MERIT Hydro DEM, default value 0.1 [-] if this could not be found |
+# | contourLength  | estimated contour length from the MERIT Hydro DEM, default value 30 [m] if this could not be found |
+# | slopeTypeIndex | unused in current set up, fixed at 1 [-] |
+# | soilTypeIndex  | mode soil class from SOILGRIDS |
+# | vegTypeIndex   | mode land class from MODIS veg |
+# | mHeight        | forcing measurement height, from the control file |
+#
+# Soil class
+# The intersection code stores a histogram of soil classes in fields `USGS_{0,1,...,12}`. Soil class 0 (no sand/silt/
+# clay data in SOILGRIDS; oceans, glaciers, open water) is never selected. If it is the most common class, the class with
+# the second most occurences is used. If tied, the first in the list is used.
+#
+# Land class
+# The intersection code stores a histogram of land classes in fields `IGBP_{1,2,...,17}`. If water (class 17) is the most
+# common class but other land classes are present, the second most common class is used. HRUs that contain only water
+# keep class 17. Note that SUMMA skips hydrologic calculations for such HRUs.
+#
+# Assumed modeling decisions
+# `slopeTypeIndex` is a legacy variable that is no longer used. `tan_slope` and `contourLength` are needed for the `qbaseTopmodel` modeling option.
+#
+# `downHRUindex` is set to 0, indicating that each HRU will be modeled as an independent column. This can optionally be changed by setting the flag `settings_summa_connect_HRUs` to `yes` in the control file. In that case the relative elevations of HRUs in each GRU are used to define downslope HRU IDs: each HRU drains into the next lower HRU in its GRU, and the lowest HRU (the GRU outlet) gets `downHRUindex` 0.
+#
+# Validation
+# Soil classes, land classes and elevations that can't be found (e.g. HRUs missing from an intersection, or a mismatch
+# between histogram field names and class values) are set to -999. The attributes file is only written if no such
+# values remain; otherwise the affected HRUs are listed and the script stops.
+
+# modules
+import sys
+import numpy as np
+import pandas as pd
+import netCDF4 as nc4
+from pathlib import Path
+from shutil import copyfile
+from datetime import datetime
+
+# Vector file input and output, see 0_tools/vector_io.py
+sys.path.append('../../../0_tools')
+import vector_io
+
+# Domain HRU index, see 0_tools/forcing_index.py
+import forcing_index
+
+
+# --- Control file handling
+# Easy access to control file folder
+controlFolder = Path('../../../0_control_files')
+
+# Store the name of the 'active' file in a variable
+controlFile = 'control_active.txt'
+
+# Function to extract a given setting from the control file
+def read_from_control( file, setting ):
+    
+    # Open 'control_active.txt' and ...
+    with open(file) as contents:
+        for line in contents:
+            
+            # ... find the line with the requested setting
+            if setting in line and not line.startswith('#'):
+                break
+    
+    # Extract the setting's value
+    substring = line.split('|',1)[1]      # Remove the setting's name (split into 2 based on '|', keep only 2nd part)
+    substring = substring.split('#',1)[0] # Remove comments, does nothing if no '#' is found
+    substring = substring.strip()         # Remove leading and trailing whitespace, tabs, newlines
+       
+    # Return this value    
+    return substring
+    
+# Function to specify a default path
+def make_default_path(suffix):
+    
+    # Get the root path
+    rootPath = Path( read_from_control(controlFolder/controlFile,'root_path') )
+    
+    # Get the domain folder
+    domainName = read_from_control(controlFolder/controlFile,'domain_name')
+    domainFolder = 'domain_' + domainName
+    
+    # Specify the forcing path
+    defaultPath = rootPath / domainFolder / suffix
+    
+    return defaultPath
+    
+    
+# --- Settings
+# Print the attributes of every HRU. All HRUs are written at once, so this is only useful for checking
+print_progress = False
+
+# Default values of attributes that can't always be derived from the DEM
+default_tan_slope      = 0.1 # [-]; only used in qbaseTopmodel modelling decision
+default_contour_length = 30  # [m]; only used in qbaseTopmodel modelling decision
+
+# Placeholder for values that could not be found
+missing_value = -999
+
+
+# --- Find shapefile location and name
+# Catchment shapefile path & name
+catchment_path = read_from_control(controlFolder/controlFile,'catchment_shp_path')
+catchment_name = read_from_control(controlFolder/controlFile,'catchment_shp_name')
+
+# Specify default path if needed
+if catchment_path == 'default':
+    catchment_path = make_default_path('shapefiles/catchment') # outputs a Path()
+else:
+    catchment_path = Path(catchment_path) # make sure a user-specified path is a Path()
+    
+# Variable names used in shapefile
+catchment_hruId_var = read_from_control(controlFolder/controlFile,'catchment_shp_hruid')
+catchment_gruId_var = read_from_control(controlFolder/controlFile,'catchment_shp_gruid')
+catchment_area_var = read_from_control(controlFolder/controlFile,'catchment_shp_area')
+catchment_lat_var = read_from_control(controlFolder/controlFile,'catchment_shp_lat')
+catchment_lon_var = read_from_control(controlFolder/controlFile,'catchment_shp_lon')
+
+
+# --- Find intersection locations and names
+# Path to and name of shapefile with intersection between catchment and soil classes
+intersect_soil_path = read_from_control(controlFolder/controlFile,'intersect_soil_path')
+intersect_soil_name = read_from_control(controlFolder/controlFile,'intersect_soil_name')
+
+# Specify default path if needed
+if intersect_soil_path == 'default':
+    intersect_soil_path = make_default_path('shapefiles/catchment_intersection/with_soilgrids') # outputs a Path()
+else:
+    intersect_soil_path = Path(intersect_soil_path) # make sure a user-specified path is a Path()
+
+# Path to and name of shapefile with intersection between catchment and land classes
+intersect_land_path = read_from_control(controlFolder/controlFile,'intersect_land_path')
+intersect_land_name = read_from_control(controlFolder/controlFile,'intersect_land_name')
+
+# Specify default path if needed
+if intersect_land_path == 'default':
+    intersect_land_path = make_default_path('shapefiles/catchment_intersection/with_modis') # outputs a Path()
+else:
+    intersect_land_path = Path(intersect_land_path) # make sure a user-specified path is a Path()
+
+# Path to and name of shapefile with intersection between catchment and DEM
+intersect_dem_path = read_from_control(controlFolder/controlFile,'intersect_dem_path')
+intersect_dem_name = read_from_control(controlFolder/controlFile,'intersect_dem_name')
+
+# Specify default path if needed
+if intersect_dem_path == 'default':
+    intersect_dem_path = make_default_path('shapefiles/catchment_intersection/with_dem') # outputs a Path()
+else:
+    intersect_dem_path = Path(intersect_dem_path) # make sure a user-specified path is a Path()
+
+# Find the format of the workflow's own vector files
+vector_format = read_from_control(controlFolder/controlFile,'vector_format')
+
+# Find if HRUs need to be connected based on their elevation
+do_downHRUindex = read_from_control(controlFolder/controlFile,'settings_summa_connect_HRUs')
+
+
+# --- Find forcing location and the domain HRU index
+# Forcing path
+forcing_path = read_from_control(controlFolder/controlFile,'forcing_summa_path')
+
+# Specify default path if needed
+if forcing_path == 'default':
+    forcing_path = make_default_path('forcing/4_SUMMA_input') # outputs a Path()
+else:
+    forcing_path = Path(forcing_path) # make sure a user-specified path is a Path()
+    
+# Domain HRU index path & name; contains the hruId order of the forcing files
+forcing_index_path = read_from_control(controlFolder/controlFile,'forcing_index_path')
+forcing_index_name = read_from_control(controlFolder/controlFile,'forcing_index_name')
+
+# Specify default path if needed
+if forcing_index_path == 'default':
+    forcing_index_path = make_default_path('forcing/5_forcing_index') # outputs a Path()
+else:
+    forcing_index_path = Path(forcing_index_path) # make sure a user-specified path is a Path()
+
+# Find the forcing measurement height
+forcing_measurement_height = float(read_from_control(controlFolder/controlFile,'forcing_measurement_height'))
+
+
+# --- Find where the attributes need to go
+# Attribute path & name
+attribute_path = read_from_control(controlFolder/controlFile,'settings_summa_path')
+attribute_name = read_from_control(controlFolder/controlFile,'settings_summa_attributes')
+
+# Specify default path if needed
+if attribute_path == 'default':
+    attribute_path = make_default_path('settings/SUMMA') # outputs a Path()
+else:
+    attribute_path = Path(attribute_path) # make sure a user-specified path is a Path()
+    
+# Make the folder if it doesn't exist
+attribute_path.mkdir(parents=True, exist_ok=True)
+
+
+# --- Functions
+# Function to read an intersection, indexed by HRU ID. Only the HRU ID and the given columns are read, and all columns 
+# whose name starts with 'prefix' if given. The first row is used if an HRU occurs twice
+def read_intersection(file, columns=[], prefix=None, dtypes={}):
+    file = vector_io.find_vector(file, vector_format)
+    available = vector_io.vector_columns(file)
+    columns = [column for column in columns if column in available]
+    if prefix is not None:
+        columns += [column for column in available if column.startswith(prefix)]
+    data = vector_io.read_vector(file, columns=[catchment_hruId_var] + columns, geometry=False,
+                                 dtypes={catchment_hruId_var: 'int32', **dtypes})
+    data = data.set_index(catchment_hruId_var)
+    return data[~data.index.duplicated(keep='first')]
+
+# Function to stack histogram columns 'prefix'+class into an array of size (nHru, nClass), with one column for each of
+# 'classes'. Classes that don't occur in the domain have no field and get 0 occurences. HRUs that are not in the
+# histogram table get -1 occurences for all classes
+def stack_histogram(hist_table, prefix, classes, hru_ids):
+    hist_rows = hist_table.reindex(hru_ids)
+    hist = np.zeros((len(hru_ids), len(classes)), dtype='int64')
+    for j,value in enumerate(classes):
+        if prefix + str(value) in hist_table.columns:
+            hist[:,j] = hist_rows[prefix + str(value)].fillna(-1).values
+    hist[~hru_ids.isin(hist_table.index),:] = -1
+    return hist
+
+# Function to find the mode class of each HRU, checking the assumption that the column index maps onto the class value
+def mode_class(hist, hist_table, prefix, classes, hru_ids, name):
+    classes = np.asarray(classes)
+    mode = classes[np.argmax(hist, axis=1)]
+    hist_rows = hist_table.reindex(hru_ids)
+    for j,value in enumerate(classes):
+        column = prefix + str(value)
+        values = hist_rows[column].values if column in hist_table.columns else np.zeros(len(hru_ids))
+        mismatch = (mode == value) & (values != hist[:,j]) & (hist[:,j] >= 0)
+        for hru in hru_ids[mismatch]:
+            print('Index and mode {} class do not match at hru_id {}'.format(name, hru))
+        mode[mismatch] = missing_value
+    mode[(hist < 0).all(axis=1)] = missing_value # HRU not in the intersection
+    return mode
+
+
+# --- Load the catchment shapefile and sort it based on HRU order in the forcing file
+# Open the catchment shape; only the columns we need, without geometries
+shp = vector_io.read_vector(vector_io.find_vector(catchment_path/catchment_name, vector_format),
+                           columns=[catchment_hruId_var, catchment_gruId_var, catchment_area_var,
+                                    catchment_lat_var, catchment_lon_var], geometry=False)
+
+# Get the sorting order of the forcing files from the domain HRU index (or from a forcing file if there is no index)
+forcing_hruIds = forcing_index.read_hru_ids(forcing_index_path/forcing_index_name, forcing_path)
+
+# Make the hruId variable in the shapefile the index, enforce index as integers, and sort based on the forcing HRU order
+shp = shp.set_index(catchment_hruId_var)
+shp.index = shp.index.astype(int)
+shp = shp.loc[forcing_hruIds]
+
+# Start the table of attributes; one row per HRU, in forcing order
+hru_ids = shp.index
+attributes = pd.DataFrame(index=hru_ids)
+attributes['hru2gruId']      = shp[catchment_gruId_var].values.astype(int)
+attributes['HRUarea']        = shp[catchment_area_var].values.astype(float)
+attributes['latitude']       = shp[catchment_lat_var].values.astype(float)
+attributes['longitude']      = shp[catchment_lon_var].values.astype(float)
+attributes['slopeTypeIndex'] = 1                          # Needs to be set but not used
+attributes['mHeight']        = forcing_measurement_height # Forcing data height; used in some scaling equations
+
+# Find the GRUs in order of first occurence
+gru_ids = pd.unique(attributes['hru2gruId'].values)
+
+
+# --- Soil classes
+# Stack the histogram values, so that the column index is the soil class (USGS_0 to USGS_12)
+soil_classes = list(range(0,13))
+soil = read_intersection(intersect_soil_path/intersect_soil_name, prefix='USGS_', dtypes={'USGS_' + str(j): 'uint32' for j in soil_classes})
+soil_hist = stack_histogram(soil, 'USGS_', soil_classes, hru_ids)
+
+# Set the '0' class to having -1 occurences -> that must make some other class the most occuring one. 
+# Using -1 also accounts for cases where SOILGRIDS has no sand/silt/clay data (oceans, glaciers, open water)
+# and returns soil class =0. In such cases we default to the soilclass with the second most occurences. If 
+# tied, we use the first in the list. We should never return soilclass = 0 in this way.
+soil_hist[:,0] = np.minimum(soil_hist[:,0], -1)
+
+# Find the class with the most occurences for all HRUs at once
+attributes['soilTypeIndex'] = mode_class(soil_hist, soil, 'USGS_', soil_classes, hru_ids, 'soil')
+del soil, soil_hist
+
+
+# --- Land classes
+# Stack the histogram values, so that the column index is the land class - 1 (IGBP_1 to IGBP_17)
+land_classes = list(range(1,18))
+land = read_intersection(intersect_land_path/intersect_land_name, prefix='IGBP_', dtypes={'IGBP_' + str(j): 'uint32' for j in land_classes})
+land_hist = stack_histogram(land, 'IGBP_', land_classes, hru_ids)
+
+# Find the class with the most occurences for all HRUs at once
+land_class = mode_class(land_hist, land, 'IGBP_', land_classes, hru_ids, 'land')
+
+# Handle the case where we have water (IGBP = 17)
+is_mostly_water = (land_class == 17)
+has_land = (land_hist[:,0:-1] > 0).any(axis=1)
+replace = is_mostly_water & has_land # HRU is mostly water but other land classes are present
+land_class[replace] = np.argmax(land_hist[replace,0:-1], axis=1) + 1 # select 2nd-most common class
+is_water = np.sum(is_mostly_water & ~has_land) # HRU is exclusively water
+attributes['vegTypeIndex'] = land_class
+del land, land_hist
+
+# Print water counts
+print('{} HRUs were identified as containing only open water. Note that SUMMA skips hydrologic calculations for such HRUs.'.format(is_water))
+
+
+# --- Elevation, slope and contour length
+# Join the DEM statistics to the HRUs
+dem = read_intersection(intersect_dem_path/intersect_dem_name, columns=['elev_mean', 'tan_slope', 'contourLen'],
+                        dtypes={'elev_mean': 'float32', 'tan_slope': 'float32', 'contourLen': 'float32'})
+dem = dem.reindex(hru_ids)
+
+# Elevation; HRUs that are not in the intersection or have no DEM values get the placeholder value
+attributes['elevation'] = dem['elev_mean'].astype(float).fillna(missing_value).values
+
+# Use the DEM-derived slope and contour length where these were found, and the defaults otherwise
+attributes['tan_slope'] = default_tan_slope
+attributes['contourLength'] = default_contour_length
+if 'tan_slope' in dem.columns:
+    attributes['tan_slope'] = dem['tan_slope'].astype(float).fillna(default_tan_slope).values
+if 'contourLen' in dem.columns:
+    attributes['contourLength'] = dem['contourLen'].astype(float).fillna(default_contour_length).values
+del dem
+
+
+# --- Define downHRUindex values
+# All HRUs modeled as independent columns, unless connecting HRUs is requested by the user
+attributes['downHRUindex'] = 0
+if do_downHRUindex.lower() == 'yes':
+    
+    # Sort the HRUs by GRU, and by decreasing elevation within each GRU. Sorting is stable, so HRUs with the same 
+    # elevation keep their order in the forcing file
+    tmp_sort = attributes.sort_values(['hru2gruId','elevation'], ascending=[True,False], kind='mergesort')
+    
+    # Each HRU drains into the next lower HRU in the same GRU. The lowest HRU (possibly the only one) is the GRU outlet 
+    # and has no next HRU in its GRU, so it gets downHRUindex = 0
+    next_hru = pd.Series(tmp_sort.index, index=tmp_sort.index).groupby(tmp_sort['hru2gruId']).shift(-1)
+    attributes['downHRUindex'] = next_hru.reindex(hru_ids).fillna(0).astype(int).values
+    
+    
+# --- Check that all values were found
+# Find HRUs with placeholder or missing values
+missing = {}
+for var in ['elevation', 'soilTypeIndex', 'vegTypeIndex']:
+    is_missing = (attributes[var] == missing_value)
+    if is_missing.any():
+        missing[var] = list(hru_ids[is_missing.values])
+
+# Stop if any are left
+if len(missing) > 0:
+    for var,hrus in missing.items():
+        print('No {} found for {} HRUs: {}'.format(var, len(hrus), hrus[:20]))
+    raise ValueError('Attributes contain missing values, see above. Check the intersections in {}, {} and {}. '
+                     '{} was not written.'.format(intersect_soil_path, intersect_land_path, intersect_dem_path, 
+                                                  attribute_path/attribute_name))
+
+# Show the attributes
+if print_progress:
+    print(attributes.to_string())
+
+
+# --- Create the new attributes file
+# Specify the variables as (name, type, dimension, units, long name)
+variables = [('hruId',          'i4', 'hru', '-',                    'Index of hydrological response unit (HRU)'),
+             ('gruId',          'i4', 'gru', '-',                    'Index of grouped response unit (GRU)'),
+             ('hru2gruId',      'i4', 'hru', '-',                    'Index of GRU to which the HRU belongs'),
+             ('downHRUindex',   'i4', 'hru', '-',                    'Index of downslope HRU (0 = basin outlet)'),
+             ('longitude',      'f8', 'hru', 'Decimal degree east',  'Longitude of HRU''s centroid'),
+             ('latitude',       'f8', 'hru', 'Decimal degree north', 'Latitude of HRU''s centroid'),
+             ('elevation',      'f8', 'hru', 'm',                    'Mean HRU elevation'),
+             ('HRUarea',        'f8', 'hru', 'm^2',                  'Area of HRU'),
+             ('tan_slope',      'f8', 'hru', 'm m-1',                'Average tangent slope of HRU'),
+             ('contourLength',  'f8', 'hru', 'm',                    'Contour length of HRU'),
+             ('slopeTypeIndex', 'i4', 'hru', '-',                    'Index defining slope'),
+             ('soilTypeIndex',  'i4', 'hru', '-',                    'Index defining soil type'),
+             ('vegTypeIndex',   'i4', 'hru', '-',                    'Index defining vegetation type'),
+             ('mHeight',        'f8', 'hru', 'm',                    'Measurement height above bare ground')]
+
+# Create the new .nc file
+with nc4.Dataset(attribute_path/attribute_name, "w", format="NETCDF4") as att:
+
+    # General attributes
+    now = datetime.now()
+    att.setncattr('Author', "Created by SUMMA workflow scripts")
+    att.setncattr('History','Created ' + now.strftime('%Y/%m/%d %H:%M:%S'))
+
+    # Define the dimensions 
+    att.createDimension('hru',len(hru_ids))
+    att.createDimension('gru',len(gru_ids))
+    
+    # Define and fill the variables; each in a single write
+    for var,var_type,dim,units,long_name in variables:
+        att.createVariable(var, var_type, dim, fill_value = False)
+        att[var].setncattr('units', units)
+        att[var].setncattr('long_name', long_name)
+        if var == 'hruId':
+            att[var][:] = hru_ids.values.astype(int)
+        elif var == 'gruId':
+            att[var][:] = gru_ids.astype(int)
+        else:
+            att[var][:] = attributes[var].values
+    
+    # Progress
+    print('Wrote attributes of {} HRUs in {} GRUs to {}'.format(len(hru_ids), len(gru_ids), attribute_path/attribute_name))
+        
+        
+# --- Code provenance
+# Generates a basic log file in the domain folder and copies the control file and itself there.
+
+# Set the log path and file name
+logPath = attribute_path
+log_suffix = '_create_attributes.txt'
+
+# Create a log folder
+logFolder = '_workflow_log'
+Path( logPath / logFolder ).mkdir(parents=True, exist_ok=True)
+
+# Copy this script
+thisFile = '1_create_attributes_nc.py'
+copyfile(thisFile, logPath / logFolder / thisFile);
+
+# Get current date and time
+now = datetime.now()
+
+# Create a log file 
+logFile = now.strftime('%Y%m%d') + log_suffix
+with open( logPath / logFolder / logFile, 'w') as file:
+    
+    lines = ['Log generated by ' + thisFile + ' on ' + now.strftime('%Y/%m/%d %H:%M:%S') + '\n',
+             'Created the attributes .nc file with soil classes, land classes, elevation, slope and contour length.']
+    for txt in lines:
+        file.write(txt)
@@ -0,0 +1,283 @@
+# Partition GRUs into blocks with balanced run times
+# Divides the GRUs of the domain into `settings_summa_block_tasks` contiguous ranges (one per array task) so that the
+# expected SUMMA run time of each range is about the same. With blocks of a fixed number of GRUs, tasks that contain
+# many HRUs or mountainous, snow-dominated GRUs take much longer than others, and the array job has to wait for the
+# slowest task. The ranges are written to `settings_summa_block_list` as one line per task: `gru_start gru_count`.
+#
+# Cost model:
+# - Each GRU gets a set of features from the attributes file: a constant (fixed cost per GRU), its number of HRUs and
+#   its number of HRUs times its elevation range [km] (a proxy for snow and steep terrain);
+# - Without logs of a previous run, the expected run time of a GRU is 'n_hru * (1 + elevation range [km])';
+# - If `settings_summa_cost_logs` points to the SUMMA logs of a previous array run, the weight of each feature is
+#   fitted to the elapsed times of the successful tasks (non-negative least squares). The expected time of the GRUs of
+#   each successful task is then scaled so that these add up to the time that task actually took.
+#
+# The GRU range of a log is found from the SUMMA command at the top of the log (as written by
+# `6_model_runs/1_run_summa_as_array.sh`): either `-g gru_start gru_count` or a GRU block folder `G[start]-[end]`.
+# The elapsed time is found at the end of the log, in the same way as `0_tools/SUMMA_plot_computational_times.py`.
+#
+# Workflow:
+# - Find the GRU order, number of HRUs and elevation range of each GRU in the attributes file;
+# - Estimate the run time of each GRU, learning from the logs of a previous run if these are available;
+# - Find the contiguous GRU ranges that minimize the run time of the slowest task;
+# - Write the GRU range of each task to the block list.
+#
+# Notes:
+# - GRUs are counted from 1 in the order of variable `gruId` in the attributes file, as with SUMMA's -g argument;
+# - Script `2_split_into_gru_blocks.py` uses the block list to pre-split the inputs if `settings_summa_block_tasks` is
+#   larger than 0. The array job script can read the GRU range of each task from the block list, see
+#   `6_model_runs/README.md`;
+# - The number of ranges can be smaller than the number of tasks if a few GRUs dominate the total run time.
+
+# modules
+import re
+import sys
+import numpy as np
+import netCDF4 as nc4
+from pathlib import Path
+from shutil import copyfile
+from datetime import datetime
+from collections import deque
+from scipy.optimize import nnls
+
+
+
+# --- Control file handling
+# Easy access to control file folder
+controlFolder = Path('../../../0_control_files')
+
+# Store the name of the 'active' file in a variable
+controlFile = 'control_active.txt'
+
+# Function to extract a given setting from the control file
+def read_from_control( file, setting ):
+
+    # Open 'control_active.txt' and ...
+    with open(file) as contents:
+        for line in contents:
+
+            # ... find the line with the requested setting
+            if setting in line and not line.startswith('#'):
+                break
+
+    # Extract the setting's value
+    substring = line.split('|',1)[1]      # Remove the setting's name (split into 2 based on '|', keep only 2nd part)
+    substring = substring.split('#',1)[0] # Remove comments, does nothing if no '#' is found
+    substring = substring.strip()         # Remove leading and trailing whitespace, tabs, newlines
+
+    # Return this value
+    return substring
+
+# Function to specify a default path
+def make_default_path(suffix):
+
+    # Get the root path
+    rootPath = Path( read_from_control(controlFolder/controlFile,'root_path') )
+
+    # Get the domain folder
+    domainName = read_from_control(controlFolder/controlFile,'domain_name')
+    domainFolder = 'domain_' + domainName
+
+    # Specify the forcing path
+    defaultPath = rootPath / domainFolder / suffix
+
+    return defaultPath
+
+
+# --- Settings
+# Number of lines at the end of each log that are searched for the elapsed time
+log_tail_lines = 30
+
+
+# --- Find the number of tasks and where the block list needs to go
+# Number of array tasks
+block_tasks = int(read_from_control(controlFolder/controlFile,'settings_summa_block_tasks'))
+if block_tasks <= 0:
+    print('settings_summa_block_tasks is {}, GRUs are not partitioned by run time.'.format(block_tasks))
+    sys.exit(0)
+
+# Block path
+block_path = read_from_control(controlFolder/controlFile,'settings_summa_block_path')
+
+# Specify default path if needed
+if block_path == 'default':
+    block_path = make_default_path('settings/SUMMA_gru_blocks') # outputs a Path()
+else:
+    block_path = Path(block_path) # make sure a user-specified path is a Path()
+
+# Block list name
+block_list = read_from_control(controlFolder/controlFile,'settings_summa_block_list')
+
+
+# --- Find the attributes and the logs of a previous run
+# Settings path
+settings_path = read_from_control(controlFolder/controlFile,'settings_summa_path')
+
+# Specify default path if needed
+if settings_path == 'default':
+    settings_path = make_default_path('settings/SUMMA') # outputs a Path()
+else:
+    settings_path = Path(settings_path) # make sure a user-specified path is a Path()
+
+# Attributes file name
+attributes_nc = read_from_control(controlFolder/controlFile,'settings_summa_attributes')
+
+# Log path; 'none' if no previous run is available
+cost_logs = read_from_control(controlFolder/controlFile,'settings_summa_cost_logs')
+if cost_logs.lower() != 'none':
+    cost_logs = Path(cost_logs) # make sure a user-specified path is a Path()
+else:
+    cost_logs = None
+
+
+# --- Functions
+# Function to find the GRU range and elapsed time [s] of a SUMMA log. Returns None if the log doesn't record a
+# successful run or its GRU range can't be found
+def read_log(file):
+    with open(file) as log:
+        first_line = log.readline()
+        tail = deque(log, maxlen=log_tail_lines)
+
+    # Find the GRU range in the SUMMA command at the top of the log, or in the log name
+    gru_range = None
+    for txt in [first_line, file.name]:
+        found_g = re.search(r'-g\s+(\d+)\s+(\d+)', txt)
+        found_block = re.search(r'G(\d+)-(\d+)', txt)
+        if found_g:
+            gru_range = (int(found_g.group(1)), int(found_g.group(2)))
+            break
+        elif found_block:
+            gru_range = (int(found_block.group(1)), int(found_block.group(2)) - int(found_block.group(1)) + 1)
+            break
+    if gru_range is None:
+        return None
+
+    # Find the elapsed time of a successful run
+    if not any('successfully' in line for line in tail):
+        return None
+    for line in tail:
+        if 'elapsed time' in line:
+            return gru_range + (float(re.sub(r'[^\d\.]', '', line)),)
+    return None
+
+# Function to find the contiguous ranges of GRUs that minimize the maximum cost of a range, for a given maximum number
+# of ranges. Bisects on the cost limit; for each limit, ranges are filled greedily using the cumulative cost
+def balanced_ranges(cost, n_ranges):
+    cum_cost = np.concatenate([[0], np.cumsum(cost)])
+
+    # Function to find the ends of the ranges for a given cost limit
+    def fill_ranges(limit):
+        ends = []
+        start = 0
+        while start < len(cost):
+            end = np.searchsorted(cum_cost, cum_cost[start] + limit, side='right') - 1
+            start = max(end, start+1) # a single GRU that exceeds the limit gets its own range
+            ends.append(start)
+        return ends
+
+    # Find the lowest limit that needs no more than n_ranges ranges
+    low, high = cost.max(), cum_cost[-1]
+    while high - low > 1e-6 * high:
+        limit = (low + high) / 2
+        if len(fill_ranges(limit)) <= n_ranges:
+            high = limit
+        else:
+            low = limit
+    ends = np.array(fill_ranges(high))
+    starts = np.concatenate([[0], ends[:-1]])
+    return starts, ends
+
+
+# --- Find the features of each GRU
+# Read the GRU order and the HRU information from the attributes file
+with nc4.Dataset(settings_path/attributes_nc) as att:
+    gru_ids   = np.asarray(att['gruId'][:]).astype(int)
+    hru2gru   = np.asarray(att['hru2gruId'][:]).astype(int)
+    elevation = np.asarray(att['elevation'][:]).astype(float)
+
+# Number of HRUs and elevation range of each GRU, in gruId order
+gru_index = np.searchsorted(gru_ids, hru2gru, sorter=np.argsort(gru_ids))
+gru_index = np.argsort(gru_ids)[gru_index]
+n_hru = np.bincount(gru_index, minlength=len(gru_ids)).astype(float)
+elev_max = np.full(len(gru_ids), -np.inf)
+elev_min = np.full(len(gru_ids), np.inf)
+np.maximum.at(elev_max, gru_index, elevation)
+np.minimum.at(elev_min, gru_index, elevation)
+elev_range = (elev_max - elev_min) / 1000 # [km]
+
+# Features: fixed cost per GRU, cost per HRU and cost per HRU and km of elevation range
+features = np.column_stack([np.ones(len(gru_ids)), n_hru, n_hru * elev_range])
+
+
+# --- Estimate the run time of each GRU
+# Default estimate from the attributes
+cost = features @ np.array([0, 1, 1])
+cost_unit = 'relative'
+
+# Learn from the logs of a previous run, if any
+if cost_logs is not None:
+
+    # Read the GRU range and elapsed time of each successful run
+    runs = [read_log(file) for file in sorted(cost_logs.glob('*.txt'))]
+    runs = [run for run in runs if run is not None and run[0] >= 1 and run[0] + run[1] - 1 <= len(gru_ids)]
+    print('Found {} successful runs with a known GRU range in {}'.format(len(runs), cost_logs))
+
+    if len(runs) > 0:
+
+        # Fit the feature weights to the elapsed times of the runs
+        run_features = np.array([features[start-1:start-1+count].sum(axis=0) for start,count,_ in runs])
+        run_times = np.array([time for _,_,time in runs])
+        weights,_ = nnls(run_features, run_times)
+        if (features @ weights).min() <= 0: # not enough information in the logs to estimate all weights
+            weights = np.array([0, 1, 1]) * run_times.sum() / (run_features @ np.array([0, 1, 1])).sum()
+        cost = features @ weights
+
+        # Scale the estimates of the GRUs in each run to the time that run took
+        for start,count,time in runs:
+            run_cost = cost[start-1:start-1+count]
+            cost[start-1:start-1+count] = run_cost * time / run_cost.sum()
+        cost_unit = 's'
+
+
+# --- Find the GRU ranges
+starts, ends = balanced_ranges(cost, min(block_tasks, len(gru_ids)))
+range_cost = np.add.reduceat(cost, starts)
+print('Partitioned {} GRUs into {} ranges of {} to {} GRUs. Expected time per range: mean {:.1f}, max {:.1f} ({}); '
+      'max with {} equal ranges: {:.1f}'.format(len(gru_ids), len(starts), (ends-starts).min(), (ends-starts).max(),
+      range_cost.mean(), range_cost.max(), cost_unit, len(starts),
+      max(chunk.sum() for chunk in np.array_split(cost, len(starts)))))
+
+# Write the block list; GRU numbers count from 1, as in SUMMA's -g argument
+block_path.mkdir(parents=True, exist_ok=True)
+with open(block_path/block_list, 'w') as file:
+    for start,end in zip(starts,ends):
+        file.write('{} {}\n'.format(start+1, end-start))
+
+
+# --- Code provenance
+# Generates a basic log file in the domain folder and copies the control file and itself there.
+
+# Set the log path and file name
+logPath = block_path
+log_suffix = '_partition_grus.txt'
+
+# Create a log folder
+logFolder = '_workflow_log'
+Path( logPath / logFolder ).mkdir(parents=True, exist_ok=True)
+
+# Copy this script
+thisFile = '1_partition_grus.py'
+copyfile(thisFile, logPath / logFolder / thisFile);
+
+# Get current date and time
+now = datetime.now()
+
+# Create a log file
+logFile = now.strftime('%Y%m%d') + log_suffix
+with open( logPath / logFolder / logFile, 'w') as file:
+
+    lines = ['Log generated by ' + thisFile + ' on ' + now.strftime('%Y/%m/%d %H:%M:%S') + '\n',
+             'Partitioned {} GRUs into {} ranges with balanced expected run times ({} estimate from {}).'.format(
+              len(gru_ids), len(starts), cost_unit, 'attributes' if cost_logs is None else cost_logs)]
+    for txt in lines:
+        file.write(txt)
@@ -0,0 +1,351 @@
+# Split SUMMA inputs into GRU blocks
+# Writes the forcing, attributes, trial parameter and initial conditions files pre-split into blocks of GRUs, for SUMMA
+# runs as array jobs (`6_model_runs/1_run_summa_as_array.sh`). Each block gets its own folder with the subset of each
+# input file, a forcing file list and a file manager. An array task that runs a block then only reads the forcing data
+# of its own HRUs, instead of reading the full-domain forcing files and discarding all other HRUs.
+#
+# Blocks follow SUMMA's `-g gru_start gru_count` decomposition: GRUs are counted (from 1) in the order of variable
+# `gruId` in the attributes file, and each block contains `settings_summa_block_size` GRUs (the last block may have
+# fewer). If `settings_summa_block_tasks` is larger than 0, the blocks are instead the variable-size GRU ranges in the
+# block list written by `1_partition_grus.py`. Block folders are named `G[start]-[end]` (e.g. `G000001-000100`), as in
+# SUMMA's own split-domain output names. The array tasks must use the same GRU ranges as the blocks.
+#
+# Workflow:
+# - Define the blocks from the GRU order in the attributes file, or from the block list;
+# - Split the attributes, trial parameter and initial conditions files;
+# - Split the forcing files; each forcing file is read once, in chunks of time steps, and written to all blocks;
+# - Copy the remaining settings files and write a file manager for each block.
+#
+# Notes:
+# - The HRU order in the forcing files must be the same as in the attributes file. This is checked against the domain
+#   HRU index before splitting;
+# - Each block's file manager points to the block's own settings and forcing folders. Outputs go to the experiment's
+#   output folder, with the block name added to the output prefix so that blocks don't overwrite each other;
+# - Forcing files are split in parallel. The number of parallel processes is taken from environment variable
+#   `SLURM_CPUS_PER_TASK` if it exists and is otherwise equal to the number of CPUs.
+
+# modules
+import os
+import sys
+import shutil
+import numpy as np
+import netCDF4 as nc4
+import multiprocessing as mp
+from functools import partial
+from pathlib import Path
+from shutil import copyfile
+from datetime import datetime
+
+# Domain HRU index, see 0_tools/forcing_index.py
+sys.path.append('../../../0_tools')
+import forcing_index
+
+
+
+# --- Control file handling
+# Easy access to control file folder
+controlFolder = Path('../../../0_control_files')
+
+# Store the name of the 'active' file in a variable
+controlFile = 'control_active.txt'
+
+# Function to extract a given setting from the control file
+def read_from_control( file, setting ):
+    
+    # Open 'control_active.txt' and ...
+    with open(file) as contents:
+        for line in contents:
+            
+            # ... find the line with the requested setting
+            if setting in line and not line.startswith('#'):
+                break
+    
+    # Extract the setting's value
+    substring = line.split('|',1)[1]      # Remove the setting's name (split into 2 based on '|', keep only 2nd part)
+    substring = substring.split('#',1)[0] # Remove comments, does nothing if no '#' is found
+    substring = substring.strip()         # Remove leading and trailing whitespace, tabs, newlines
+       
+    # Return this value    
+    return substring
+    
+# Function to specify a default path
+def make_default_path(suffix):
+    
+    # Get the root path
+    rootPath = Path( read_from_control(controlFolder/controlFile,'root_path') )
+    
+    # Get the domain folder
+    domainName = read_from_control(controlFolder/controlFile,'domain_name')
+    domainFolder = 'domain_' + domainName
+    
+    # Specify the forcing path
+    defaultPath = rootPath / domainFolder / suffix
+    
+    return defaultPath
+    
+    
+# --- Settings
+# Maximum size of the part of a variable that is held in memory while splitting [bytes]
+chunk_bytes = 512*1024*1024
+
+# Maximum number of block files that are open at the same time
+max_open_files = 256
+
+# Number of parallel processes used to split the forcing files
+ncpus = int(os.environ.get('SLURM_CPUS_PER_TASK', default=os.cpu_count() or 1))
+
+
+# --- Find the block size and where the blocks need to go
+# Number of GRUs per block, or number of variable-size blocks from the block list
+block_size = int(read_from_control(controlFolder/controlFile,'settings_summa_block_size'))
+block_tasks = int(read_from_control(controlFolder/controlFile,'settings_summa_block_tasks'))
+if block_size <= 0 and block_tasks <= 0:
+    print('settings_summa_block_size and settings_summa_block_tasks are 0, SUMMA inputs are not split into GRU blocks.')
+    sys.exit(0)
+
+# Block path
+block_path = read_from_control(controlFolder/controlFile,'settings_summa_block_path')
+
+# Specify default path if needed
+if block_path == 'default':
+    block_path = make_default_path('settings/SUMMA_gru_blocks') # outputs a Path()
+else:
+    block_path = Path(block_path) # make sure a user-specified path is a Path()
+
+# Block list name
+block_list = read_from_control(controlFolder/controlFile,'settings_summa_block_list')
+
+
+# --- Find the SUMMA settings and forcing
+# Settings path
+settings_path = read_from_control(controlFolder/controlFile,'settings_summa_path')
+
+# Specify default path if needed
+if settings_path == 'default':
+    settings_path = make_default_path('settings/SUMMA') # outputs a Path()
+else:
+    settings_path = Path(settings_path) # make sure a user-specified path is a Path()
+    
+# File names of setting files
+filemanager_name      = read_from_control(controlFolder/controlFile,'settings_summa_filemanager')
+initial_conditions_nc = read_from_control(controlFolder/controlFile,'settings_summa_coldstate')
+attributes_nc         = read_from_control(controlFolder/controlFile,'settings_summa_attributes')
+trial_parameters_nc   = read_from_control(controlFolder/controlFile,'settings_summa_trialParams')
+forcing_file_list_txt = read_from_control(controlFolder/controlFile,'settings_summa_forcing_list')
+
+# Forcing path
+forcing_path = read_from_control(controlFolder/controlFile,'forcing_summa_path')
+
+# Specify default path if needed
+if forcing_path == 'default':
+    forcing_path = make_default_path('forcing/4_SUMMA_input') # outputs a Path()
+else:
+    forcing_path = Path(forcing_path) # make sure a user-specified path is a Path()
+    
+# Domain HRU index path & name; contains the hruId order of the forcing files
+forcing_index_path = read_from_control(controlFolder/controlFile,'forcing_index_path')
+forcing_index_name = read_from_control(controlFolder/controlFile,'forcing_index_name')
+
+# Specify default path if needed
+if forcing_index_path == 'default':
+    forcing_index_path = make_default_path('forcing/5_forcing_index') # outputs a Path()
+else:
+    forcing_index_path = Path(forcing_index_path) # make sure a user-specified path is a Path()
+    
+# Forcing files used in this experiment
+with open(settings_path/forcing_file_list_txt) as file:
+    forcing_files = [line.strip().strip("'") for line in file if line.strip() != '']
+
+
+# --- Functions
+# Function to create the files of a number of blocks with the same structure as a source file, but with only the HRUs
+# and GRUs of each block
+def create_block_files(src, files, blocks):
+    dsts = []
+    for file,block in zip(files,blocks):
+        dst = nc4.Dataset(file, 'w', format=src.data_model)
+        dst.set_auto_mask(False)
+        dst.setncatts({name: src.getncattr(name) for name in src.ncattrs()})
+        for name,dim in src.dimensions.items():
+            if name in ['hru','gru']:
+                dst.createDimension(name, len(block[name]))
+            else:
+                dst.createDimension(name, None if dim.isunlimited() else len(dim))
+        for name,var in src.variables.items():
+            fill_value = var.getncattr('_FillValue') if '_FillValue' in var.ncattrs() else False
+            dst.createVariable(name, var.datatype, var.dimensions, fill_value=fill_value)
+            dst[name].setncatts({attr: var.getncattr(attr) for attr in var.ncattrs() if attr != '_FillValue'})
+        dsts.append(dst)
+    return dsts
+
+# Function to copy one variable from a source file into the files of a number of blocks. Variables that have an 'hru'
+# or 'gru' dimension are subset to the HRUs or GRUs of each block. Variables are read in chunks along their first
+# dimension (e.g. time) if that dimension is not 'hru' or 'gru', so that no more than 'chunk_bytes' is held in memory
+def copy_variable(src, dsts, blocks, name):
+    var = src[name]
+    dims = var.dimensions
+
+    # Variables without HRUs or GRUs are the same for each block
+    split_dims = [(axis,dim) for axis,dim in enumerate(dims) if dim in ['hru','gru']]
+    if len(split_dims) == 0:
+        data = var[...]
+        for dst in dsts:
+            dst[name][...] = data
+        return
+    axis, dim = split_dims[0]
+
+    # Find the chunks along the first dimension
+    if axis == 0 or len(dims) == 0:
+        chunks = [slice(None)]
+    else:
+        row_bytes = var.dtype.itemsize * int(np.prod(var.shape[1:]))
+        rows = max(1, chunk_bytes // max(row_bytes,1))
+        chunks = [slice(start, min(start+rows, var.shape[0])) for start in range(0, var.shape[0], rows)]
+
+    # Copy the data of each block
+    for chunk in chunks:
+        data = var[chunk]
+        for dst,block in zip(dsts,blocks):
+            dst[name][chunk] = np.take(data, block[dim], axis=axis)
+    return
+
+# Function to split a netCDF file into blocks. Files of at most 'max_open_files' blocks are open at the same time
+def split_file(src_file, dst_name, blocks, subfolder=''):
+    with nc4.Dataset(src_file) as src:
+        src.set_auto_mask(False)
+        for start in range(0, len(blocks), max_open_files):
+            group = blocks[start:start+max_open_files]
+            files = [block['path']/subfolder/dst_name for block in group]
+            dsts = create_block_files(src, files, group)
+            try:
+                for name in src.variables:
+                    copy_variable(src, dsts, group, name)
+            finally:
+                for dst in dsts:
+                    dst.close()
+    return dst_name
+
+# Function to split a single forcing file into blocks
+def split_forcing_file(file, blocks):
+    return split_file(forcing_path/file, file, blocks, subfolder='forcing')
+
+
+# --- Split the inputs
+# All work happens in the main process only. Processes that split the forcing files import this script again when they
+# start (on systems that spawn new processes), and should then only define the settings and functions above
+if __name__ == "__main__":
+
+    # --- Define the blocks
+    # Find the GRU order and the GRU of each HRU in the attributes file
+    with nc4.Dataset(settings_path/attributes_nc) as att:
+        gru_ids   = np.asarray(att['gruId'][:]).astype(int)
+        hru_ids   = np.asarray(att['hruId'][:]).astype(int)
+        hru2gru   = np.asarray(att['hru2gruId'][:]).astype(int)
+
+    # Check that the forcing files have the same HRU order
+    forcing_hruIds = forcing_index.read_hru_ids(forcing_index_path/forcing_index_name, forcing_path)
+    if not np.array_equal(forcing_hruIds, hru_ids):
+        raise ValueError('HRU order in the forcing files differs from that in {}. Re-create the attributes file before '
+                         'splitting the inputs into GRU blocks.'.format(settings_path/attributes_nc))
+
+    # Find the GRU ranges (start, count) of the blocks; GRU numbers count from 1, as in SUMMA's -g argument
+    if block_tasks > 0:
+        gru_ranges = np.loadtxt(block_path/block_list, dtype=int, ndmin=2)
+        if gru_ranges[0,0] != 1 or (gru_ranges[1:,0] != gru_ranges[:-1].sum(axis=1)).any() or \
+           gru_ranges[-1].sum() - 1 != len(gru_ids):
+            raise ValueError('GRU ranges in {} do not cover the {} GRUs in {} in order. Re-run 1_partition_grus.py '
+                             'before splitting the inputs into GRU blocks.'.format(block_path/block_list, len(gru_ids),
+                                                                                  settings_path/attributes_nc))
+    else:
+        gru_ranges = [(gru_start+1, min(block_size, len(gru_ids)-gru_start))
+                      for gru_start in range(0, len(gru_ids), block_size)]
+
+    # Define the blocks
+    blocks = []
+    for gru_start,gru_count in gru_ranges:
+        gru_index = np.arange(gru_start-1, gru_start-1+gru_count)
+        name = 'G{:06d}-{:06d}'.format(gru_index[0]+1, gru_index[-1]+1)
+        blocks.append({'name': name,
+                       'path': block_path/name,
+                       'gru': gru_index,
+                       'hru': np.flatnonzero(np.isin(hru2gru, gru_ids[gru_index]))})
+        (block_path/name/'forcing').mkdir(parents=True, exist_ok=True)
+    block_sizes = [len(block['gru']) for block in blocks]
+    print('Splitting {} GRUs into {} blocks of {} to {} GRUs'.format(len(gru_ids), len(blocks), min(block_sizes),
+                                                                     max(block_sizes)))
+
+    # Remove blocks of an earlier split with different GRU ranges, so that array tasks can't run these by accident
+    block_names = [block['name'] for block in blocks]
+    for folder in block_path.glob('G[0-9]*-[0-9]*'):
+        if folder.is_dir() and folder.name not in block_names:
+            shutil.rmtree(folder)
+
+
+    # --- Split the settings files
+    for file in [attributes_nc, trial_parameters_nc, initial_conditions_nc]:
+        split_file(settings_path/file, file, blocks)
+        print('Split {}'.format(file))
+
+
+    # --- Split the forcing files
+    # Each process reads one forcing file and writes it to all blocks
+    with mp.Pool(processes=max(1,min(ncpus,len(forcing_files)))) as pool:
+        for file in pool.imap_unordered(partial(split_forcing_file, blocks=blocks), forcing_files):
+            print('Split {}'.format(file))
+
+
+    # --- Copy the remaining settings and write a file manager for each block
+    # Read the domain's file manager
+    with open(settings_path/filemanager_name) as file:
+        filemanager = file.readlines()
+
+    # Find the other settings files (decisions, output control, parameter tables)
+    split_files = [attributes_nc, trial_parameters_nc, initial_conditions_nc, filemanager_name]
+    other_files = [file for file in settings_path.iterdir() if file.is_file() and file.name not in split_files]
+
+    for block in blocks:
+    
+        # Copy the settings that are the same for all blocks, including the forcing file list
+        for file in other_files:
+            copyfile(file, block['path']/file.name)
+        
+        # Write the file manager; the block uses its own settings and forcing folder and output prefix
+        with open(block['path']/filemanager_name, 'w') as fm:
+            for line in filemanager:
+                if line.startswith('settingsPath'):
+                    line = "settingsPath         '{}/' ! \n".format(block['path'])
+                elif line.startswith('forcingPath'):
+                    line = "forcingPath          '{}/' ! \n".format(block['path']/'forcing')
+                elif line.startswith('outFilePrefix'):
+                    prefix = line.split("'")[1]
+                    line = "outFilePrefix        '{}_{}' ! \n".format(prefix, block['name'])
+                fm.write(line)
+            
+            
+    # --- Code provenance
+    # Generates a basic log file in the domain folder and copies the control file and itself there.
+
+    # Set the log path and file name
+    logPath = block_path
+    log_suffix = '_split_into_gru_blocks.txt'
+
+    # Create a log folder
+    logFolder = '_workflow_log'
+    Path( logPath / logFolder ).mkdir(parents=True, exist_ok=True)
+
+    # Copy this script
+    thisFile = '2_split_into_gru_blocks.py'
+    copyfile(thisFile, logPath / logFolder / thisFile);
+
+    # Get current date and time
+    now = datetime.now()
+
+    # Create a log file 
+    logFile = now.strftime('%Y%m%d') + log_suffix
+    with open( logPath / logFolder / logFile, 'w') as file:
+    
+        lines = ['Log generated by ' + thisFile + ' on ' + now.strftime('%Y/%m/%d %H:%M:%S') + '\n',
+                 'Split SUMMA inputs of {} GRUs into {} blocks of {} to {} GRUs.'.format(
+                  len(gru_ids), len(blocks), min(block_sizes), max(block_sizes))]
+        for txt in lines:
+            file.write(txt)
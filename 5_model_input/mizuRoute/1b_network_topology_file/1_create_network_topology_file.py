@@ -5,13 +5,17 @@
 
 # modules
 import os
+import sys
 import pandas as pd
 import netCDF4 as nc4
-import geopandas as gpd
 from pathlib import Path
 from shutil import copyfile
 from datetime import datetime
 
+# Vector file input and output, see 0_tools/vector_io.py
+sys.path.append('../../../0_tools')
+import vector_io
+
 
 # --- Control file handling
 # Easy access to control file folder
@@ -117,9 +121,14 @@ else:
 
 
 # --- Make the river network topology file
-# Open the shapefile
-shp_river = gpd.read_file(river_network_path/river_network_name)
-shp_basin = gpd.read_file(river_basin_path/river_basin_name)
+# Find the format of the workflow's own vector files
+vector_format = read_from_control(controlFolder/controlFile,'vector_format')
+
+# Open the shapes; only the columns we need, without geometries
+shp_river = vector_io.read_vector(vector_io.find_vector(river_network_path/river_network_name, vector_format),
+                                  columns=[river_seg_id, river_down_seg_id, river_slope, river_length], geometry=False)
+shp_basin = vector_io.read_vector(vector_io.find_vector(river_basin_path/river_basin_name, vector_format),
+                                  columns=[basin_hru_id, basin_hru_area, basin_hru_to_seg], geometry=False)
 
 # Find the number of segments and mizuRoute-HRUs (SUMMA-GRUs)
 num_seg = len(shp_river)
@@ -4,15 +4,19 @@
 # **_This code assumes routing occurs at the GRU level of SUMMA outputs. SUMMA-HRU-level routing is not supported._**
 
 # modules
+import sys
 import itertools
 import pandas as pd
 import netCDF4 as nc4
-import geopandas as gpd
 from pathlib import Path
 from shutil import copyfile
 import easymore.easymore as esmr
 from datetime import datetime
 
+# Vector file input and output, see 0_tools/vector_io.py
+sys.path.append('../../../0_tools')
+import vector_io
+
 
 # --- Control file handling
 # Easy access to control file folder
@@ -127,9 +131,12 @@ remap_path.mkdir(parents=True, exist_ok=True)
 
 
 # --- Call EASYMORE to do the intersection
-# Load both shapefiles
-hm_shape = gpd.read_file(hm_catchment_path/hm_catchment_name)
-rm_shape = gpd.read_file(rm_catchment_path/rm_catchment_name)
+# Find the format of the workflow's own vector files
+vector_format = read_from_control(controlFolder/controlFile,'vector_format')
+
+# Load both shapes
+hm_shape = vector_io.read_vector(vector_io.find_vector(hm_catchment_path/hm_catchment_name, vector_format))
+rm_shape = vector_io.read_vector(vector_io.find_vector(rm_catchment_path/rm_catchment_name, vector_format))
 
 # Create a EASYMORE object
 esmr_caller = esmr()
@@ -145,7 +152,7 @@ intersected_shape = esmr.intersection_shp(esmr_caller,rm_shape,hm_shape)
 intersected_shape = intersected_shape.to_crs('EPSG:4326')
 
 # Save the intersection to file
-intersected_shape.to_file(intersect_path/intersect_name)
+vector_io.write_vector(intersected_shape, intersect_path/intersect_name, vector_format)
 
 
 # --- Pre-process the variables
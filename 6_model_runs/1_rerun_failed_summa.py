@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# Find and re-run failed SUMMA chunks
+# Checks the logs of a SUMMA run that was split into chunks of GRUs (with `1_run_summa_as_array.sh` or
+# `1_run_summa_parallel.py`), finds the GRUs that have not been simulated successfully, and runs only these GRUs again.
+# Reads all the required info from `control_active.txt`.
+#
+# Logs are classified in the same way as by `0_tools/SUMMA_summarize_logs.py`:
+# - success:           the log ends with SUMMA's final 'successfully' message;
+# - SUMMA error:       the log contains a SUMMA 'FATAL ERROR' message;
+# - early termination: neither, e.g. because the job ran out of time or memory (check the SLURM logs).
+# The GRU range of each log is read from the SUMMA command on the first line of the log (`-g gru_start gru_count`, a
+# GRU block folder `G[start]-[end]`, or the full domain if neither is present).
+#
+# Workflow:
+# - Classify the logs and find the GRU range of each log;
+# - Find the GRUs that are not part of any successful run, and combine these into contiguous GRU ranges;
+# - Optionally split these ranges into smaller chunks of at most `experiment_rerun_chunk_size` GRUs;
+# - Write the ranges to a GRU list (`rerun_lists/rerun_[n].txt` in the SUMMA output folder), one 'gru_start gru_count'
+#   line per chunk;
+# - Run the GRU list, depending on `experiment_rerun_method`: 'slurm' submits an array job that runs
+#   `1_run_summa_as_array.sh` for each line of the list (with additional `sbatch` options from `experiment_rerun_sbatch`,
+#   e.g. a longer wall time), 'local' runs the list with `1_run_summa_parallel.py`, and 'none' only writes the list.
+#
+# Notes:
+# - Logs of re-runs are named after the GRU list (e.g. `summa_log_rerun_1_3.txt`) so that they don't replace the logs
+#   of the original run. Running this script again after the re-runs finish uses both, and finds the GRUs that still
+#   failed;
+# - Logs that don't record their GRU range (e.g. logs written before the SUMMA command was added to the logs) are
+#   reported and otherwise ignored;
+# - Failed runs can leave incomplete output files. These are reported, so that they can be removed before the split
+#   outputs are merged.
+
+# modules
+import re
+import sys
+import shlex
+import subprocess
+import numpy as np
+import netCDF4 as nc4
+from pathlib import Path
+from shutil import copyfile
+from datetime import datetime
+from collections import deque
+
+
+
+# --- Control file handling
+# Easy access to control file folder
+controlFolder = Path('../0_control_files')
+
+# Store the name of the 'active' file in a variable
+controlFile = 'control_active.txt'
+
+# Function to extract a given setting from the control file
+def read_from_control( file, setting ):
+
+    # Open 'control_active.txt' and ...
+    with open(file) as contents:
+        for line in contents:
+
+            # ... find the line with the requested setting
+            if setting in line and not line.startswith('#'):
+                break
+
+    # Extract the setting's value
+    substring = line.split('|',1)[1]      # Remove the setting's name (split into 2 based on '|', keep only 2nd part)
+    substring = substring.split('#',1)[0] # Remove comments, does nothing if no '#' is found
+    substring = substring.strip()         # Remove leading and trailing whitespace, tabs, newlines
+
+    # Return this value
+    return substring
+
+# Function to specify a default path
+def make_default_path(suffix):
+
+    # Get the root path
+    rootPath = Path( read_from_control(controlFolder/controlFile,'root_path') )
+
+    # Get the domain folder
+    domainName = read_from_control(controlFolder/controlFile,'domain_name')
+    domainFolder = 'domain_' + domainName
+
+    # Specify the forcing path
+    defaultPath = rootPath / domainFolder / suffix
+
+    return defaultPath
+
+
+# --- Settings
+# Number of lines at the end of each log that are checked for SUMMA's final message
+log_tail_lines = 30
+
+
+# --- Find the SUMMA settings
+# Settings path
+settings_path = read_from_control(controlFolder/controlFile,'settings_summa_path')
+
+# Specify default path if needed
+if settings_path == 'default':
+    settings_path = make_default_path('settings/SUMMA') # outputs a Path()
+else:
+    settings_path = Path(settings_path) # make sure a user-specified path is a Path()
+
+# Attributes file name
+attributes_nc = read_from_control(controlFolder/controlFile,'settings_summa_attributes')
+
+
+# --- Find where the outputs and logs are
+# Experiment ID
+experiment_id = read_from_control(controlFolder/controlFile,'experiment_id')
+
+# SUMMA output path
+summa_out_path = read_from_control(controlFolder/controlFile,'experiment_output_summa')
+
+# Specify default path if needed
+if summa_out_path == 'default':
+    summa_out_path = make_default_path('simulations/' + experiment_id + '/SUMMA') # outputs a Path()
+else:
+    summa_out_path = Path(summa_out_path) # make sure a user-specified path is a Path()
+
+# SUMMA log path
+summa_log_path = read_from_control(controlFolder/controlFile,'experiment_log_summa')
+
+# Specify default path if needed
+if summa_log_path == 'default':
+    summa_log_path = make_default_path('simulations/' + experiment_id + '/SUMMA/SUMMA_logs') # outputs a Path()
+else:
+    summa_log_path = Path(summa_log_path) # make sure a user-specified path is a Path()
+
+
+# --- Find how the failed GRUs need to be run
+rerun_method     = read_from_control(controlFolder/controlFile,'experiment_rerun_method')
+rerun_chunk_size = int(read_from_control(controlFolder/controlFile,'experiment_rerun_chunk_size'))
+rerun_sbatch     = read_from_control(controlFolder/controlFile,'experiment_rerun_sbatch')
+if rerun_method not in ['none', 'local', 'slurm']:
+    raise ValueError("experiment_rerun_method is {}. Use 'none', 'local' or 'slurm'.".format(rerun_method))
+
+
+# --- Functions
+# Function to classify a SUMMA log and find its GRU range. Returns the status ('success', 'SUMMA error' or 'early
+# termination'), the GRU range (start, count; None if unknown) and a message
+def read_log(file, n_gru):
+    with open(file) as log:
+        first_line = log.readline()
+        tail = deque(log, maxlen=log_tail_lines)
+
+    # Find the GRU range in the SUMMA command at the top of the log
+    found_g = re.search(r'-g\s+(\d+)\s+(\d+)', first_line)
+    found_block = re.search(r'G(\d+)-(\d+)', first_line)
+    if found_g:
+        gru_range = (int(found_g.group(1)), int(found_g.group(2)))
+    elif found_block:
+        gru_range = (int(found_block.group(1)), int(found_block.group(2)) - int(found_block.group(1)) + 1)
+    elif re.search(r'\s-m\s', first_line):
+        gru_range = (1, n_gru) # full domain
+    else:
+        gru_range = None
+
+    # Find what happened
+    if any('successfully' in line for line in tail):
+        return 'success', gru_range, 'success'
+    for line in tail:
+        if 'FATAL ERROR' in line:
+            return 'SUMMA error', gru_range, line.strip()
+    last_line = tail[-1].strip() if len(tail) > 0 else first_line.strip()
+    return 'early termination', gru_range, 'check SLURM logs - simulation terminated early at: ' + last_line
+
+# Function to find the contiguous ranges of GRUs that are not done, split into chunks of at most 'chunk_size' GRUs
+# (no splitting if 'chunk_size' is 0)
+def failed_ranges(done, chunk_size=0):
+    edges = np.diff(np.concatenate([[0], (~done).astype(int), [0]]))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    ranges = []
+    for start,end in zip(starts,ends):
+        step = chunk_size if chunk_size > 0 else end - start
+        ranges += [(gru_start+1, min(step, end-gru_start)) for gru_start in range(start, end, step)]
+    return ranges
+
+
+# --- Classify the logs
+# Number of GRUs in the domain
+with nc4.Dataset(settings_path/attributes_nc) as att:
+    n_gru = len(att.dimensions['gru'])
+
+# Read the logs; files starting with '_' are summaries written by the log tools
+logs = {file.name: read_log(file, n_gru) for file in sorted(summa_log_path.glob('*.txt'))
+        if not file.name.startswith('_')}
+for status in ['success', 'SUMMA error', 'early termination']:
+    print('{}: {} logs'.format(status, sum(log[0] == status for log in logs.values())))
+
+# Logs without a GRU range
+unknown = [name for name,log in logs.items() if log[1] is None]
+if len(unknown) > 0:
+    print('{} logs do not record their GRU range and are ignored: {}'.format(len(unknown), ', '.join(unknown)))
+
+# Find the GRUs that are part of a successful run
+done = np.zeros(n_gru, dtype=bool)
+for status,gru_range,_ in logs.values():
+    if status == 'success' and gru_range is not None:
+        done[gru_range[0]-1:gru_range[0]-1+gru_range[1]] = True
+
+
+# --- Find the failed GRU ranges
+ranges = failed_ranges(done, rerun_chunk_size)
+if len(ranges) == 0:
+    print('All {} GRUs have been simulated successfully, nothing to re-run.'.format(n_gru))
+    sys.exit(0)
+print('{} of {} GRUs have not been simulated successfully, in {} chunks:'.format((~done).sum(), n_gru, len(ranges)))
+
+# Report why each failed range needs to be re-run
+for name,(status,gru_range,msg) in logs.items():
+    if status != 'success' and gru_range is not None and not done[gru_range[0]-1:gru_range[0]-1+gru_range[1]].all():
+        print('- {} (GRUs {} to {}): {}'.format(name, gru_range[0], gru_range[0]+gru_range[1]-1, msg))
+missing = done.copy()
+for _,gru_range,_ in logs.values():
+    if gru_range is not None:
+        missing[gru_range[0]-1:gru_range[0]-1+gru_range[1]] = True
+for gru_start,gru_count in failed_ranges(missing):
+    print('- no log (GRUs {} to {}): run did not start'.format(gru_start, gru_start+gru_count-1))
+
+# Report incomplete outputs of failed runs
+partial_outputs = []
+for status,gru_range,_ in logs.values():
+    if status != 'success' and gru_range is not None and gru_range != (1, n_gru):
+        block = 'G{:06d}-{:06d}'.format(gru_range[0], gru_range[0]+gru_range[1]-1)
+        partial_outputs += sorted(summa_out_path.glob('*_{}*.nc'.format(block)))
+if len(partial_outputs) > 0:
+    print('Incomplete outputs of failed runs; remove these before merging the outputs:')
+    for file in partial_outputs:
+        print('- {}'.format(file))
+
+
+# --- Write the GRU list
+rerun_path = summa_out_path / 'rerun_lists'
+rerun_path.mkdir(parents=True, exist_ok=True)
+n_list = 1
+while (rerun_path / 'rerun_{}.txt'.format(n_list)).is_file():
+    n_list += 1
+gru_list = rerun_path / 'rerun_{}.txt'.format(n_list)
+with open(gru_list, 'w') as file:
+    for gru_start,gru_count in ranges:
+        file.write('{} {}\n'.format(gru_start, gru_count))
+print('Wrote the failed GRU ranges to {}'.format(gru_list))
+
+
+# --- Run the failed GRUs
+if rerun_method == 'slurm':
+    command = ['sbatch', '--array=1-{}'.format(len(ranges)), '--job-name=summa_{}'.format(gru_list.stem)] + \
+              shlex.split(rerun_sbatch) + \
+              ['--wrap', 'bash 1_run_summa_as_array.sh list $SLURM_ARRAY_TASK_ID {}'.format(gru_list)]
+    print('Submitting: {}'.format(' '.join(shlex.quote(part) for part in command)))
+    subprocess.run(command, check=True)
+elif rerun_method == 'local':
+    subprocess.run([sys.executable, '1_run_summa_parallel.py', str(gru_list)], check=True)
+else:
+    print('experiment_rerun_method is none. Run the failed GRUs with:')
+    print('  sbatch --array=1-{} [options] --wrap "bash 1_run_summa_as_array.sh list \\$SLURM_ARRAY_TASK_ID {}"'.format(
+          len(ranges), gru_list))
+    print('  python 1_run_summa_parallel.py {}'.format(gru_list))
+
+
+# --- Code provenance
+# Generates a basic log file in the domain folder and copies the control file and itself there.
+
+# Set the log path and file name
+logPath = summa_out_path
+log_suffix = '_SUMMA_rerun_failed_log.txt'
+
+# Create a log folder
+logFolder = '_workflow_log'
+Path( logPath / logFolder ).mkdir(parents=True, exist_ok=True)
+
+# Copy this script
+thisFile = '1_rerun_failed_summa.py'
+copyfile(thisFile, logPath / logFolder / thisFile);
+
+# Get current date and time
+now = datetime.now()
+
+# Create a log file
+logFile = now.strftime('%Y%m%d') + log_suffix
+with open( logPath / logFolder / logFile, 'w') as file:
+
+    lines = ['Log generated by ' + thisFile + ' on ' + now.strftime('%Y/%m/%d %H:%M:%S') + '\n',
+             'Found {} of {} GRUs without a successful run; wrote {} chunks to {} (re-run method: {}).'.format(
+              (~done).sum(), n_gru, len(ranges), gru_list, rerun_method)]
+    for txt in lines:
+        file.write(txt)
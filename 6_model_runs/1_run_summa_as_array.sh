@@ -5,6 +5,14 @@
 # gru_start and gru_count
 #
 # These are used to supply SUMMA with the -g argument: -g gru_start gru_count
+#
+# Alternatively, use 'list' and the task number as arguments (e.g. 1_run_summa_as_array.sh list $SLURM_ARRAY_TASK_ID)
+# to take gru_start and gru_count from line [task number] of the block list (see 5_model_input/SUMMA/2_gru_blocks).
+# An optional third argument specifies another list with the same format, e.g. a list of failed GRU ranges written by
+# 1_rerun_failed_summa.py. Logs of such runs are named after the list (summa_log_[list name]_[task number].txt).
+#
+# If the SUMMA inputs are pre-split into GRU blocks (see 5_model_input/SUMMA/2_gru_blocks), the block that starts at
+# gru_start is run with its own file manager instead. SUMMA then only reads the forcing of the GRUs in this block.
 
 # --- Command line arguments
 gru_start=$1
@@ -70,12 +78,78 @@ filemanager=$(echo ${setting_line##*|})
 filemanager=$(echo ${filemanager%%#*})
 
 
+# - Find if the inputs are pre-split into GRU blocks and where these are
+# ---------------------------------------------------------------------
+setting_line=$(grep -m 1 "^settings_summa_block_size" ../0_control_files/control_active.txt) 
+block_size=$(echo ${setting_line##*|}) 
+block_size=$(echo ${block_size%%#*})
+
+setting_line=$(grep -m 1 "^settings_summa_block_tasks" ../0_control_files/control_active.txt) 
+block_tasks=$(echo ${setting_line##*|}) 
+block_tasks=$(echo ${block_tasks%%#*})
+
+setting_line=$(grep -m 1 "^settings_summa_block_list" ../0_control_files/control_active.txt) 
+block_list=$(echo ${setting_line##*|}) 
+block_list=$(echo ${block_list%%#*})
+
+setting_line=$(grep -m 1 "^settings_summa_block_path" ../0_control_files/control_active.txt) 
+block_path=$(echo ${setting_line##*|}) 
+block_path=$(echo ${block_path%%#*})
+
+# Specify the default path if needed
+if [ "$block_path" = "default" ]; then
+  
+ # Get the root path
+ root_line=$(grep -m 1 "^root_path" ../0_control_files/control_active.txt)
+ root_path=$(echo ${root_line##*|}) 
+ root_path=$(echo ${root_path%%#*}) 
+ 
+ # Get the domain name
+ domain_line=$(grep -m 1 "^domain_name" ../0_control_files/control_active.txt)
+ domain_name=$(echo ${domain_line##*|}) 
+ domain_name=$(echo ${domain_name%%#*})
+ 
+ # Make the default path
+ block_path="${root_path}/domain_${domain_name}/settings/SUMMA_gru_blocks/"
+fi
+
+# Find the GRU range of this task in the block list (or another list) if needed
+log_prefix="summa_log_"
+if [ "$gru_start" = "list" ]; then
+ array_id=$2
+ gru_list="${block_path%/}/${block_list}"
+ if [ -n "$3" ]; then
+  gru_list=$3
+  list_name=${gru_list##*/}
+  log_prefix="summa_log_${list_name%.*}_"
+ fi
+ read gru_start gru_count <<< $(sed -n "${array_id}p" ${gru_list})
+ if [ -z "$gru_count" ]; then
+  echo "No GRU range for task ${array_id} in ${gru_list}"
+  exit 1
+ fi
+fi
+
+# Find the block that starts at gru_start, named G[start]-[end]
+block_dir=""
+if [ "${block_size:-0}" != "0" ] || [ "${block_tasks:-0}" != "0" ]; then
+ block_dir=$(ls -d ${block_path%/}/$(printf "G%06d-" $gru_start)* 2>/dev/null | head -n 1)
+ block_end=${block_dir##*-}
+ if [ -z "$block_dir" ]; then
+  echo "No pre-split GRU block starting at GRU ${gru_start} in ${block_path}, using the full-domain inputs"
+ elif [ "$gru_count" != "$((10#${block_end} - gru_start + 1))" ]; then
+  echo "gru_count ${gru_count} differs from the size of block ${block_dir}, using the full-domain inputs"
+  block_dir=""
+ fi
+fi
+
+
 # - Find where the SUMMA logs need to go
 # --------------------------------------
 setting_line=$(grep -m 1 "^experiment_log_summa" ../0_control_files/control_active.txt) 
 summa_log_path=$(echo ${setting_line##*|}) 
 summa_log_path=$(echo ${summa_log_path%%#*})
-summa_log_name="summa_log_${array_id}.txt"
+summa_log_name="${log_prefix}${array_id}.txt"
 
 # Specify the default path if needed
 if [ "$summa_log_path" = "default" ]; then
@@ -150,6 +224,7 @@ echo "filemanager = ${filemanager}"
 echo "log dir     = ${summa_log_path}"
 echo "output dir  = ${summa_out_path}"
 echo "backup dir  = ${backup_path}"
+echo "gru block   = ${block_dir}"
 
 
 # --- Run
@@ -162,8 +237,13 @@ fi
 
 # Run SUMMA
 mkdir -p $summa_log_path
-summa_command="${summa_path}${summa_exe} -g ${gru_start} ${gru_count} -m ${settings_path}${filemanager}"
-$summa_command > $summa_log_path$summa_log_name
+if [ -n "$block_dir" ]; then
+ summa_command="${summa_path}${summa_exe} -m ${block_dir}/${filemanager}" # pre-split inputs of this block only
+else
+ summa_command="${summa_path}${summa_exe} -g ${gru_start} ${gru_count} -m ${settings_path}${filemanager}"
+fi
+echo "$summa_command" > $summa_log_path$summa_log_name # first line of the log records the GRU range of this run
+$summa_command >> $summa_log_path$summa_log_name
 
 
 
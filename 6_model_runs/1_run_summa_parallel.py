@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# Run SUMMA in parallel on a single machine
+# Runs SUMMA for chunks of GRUs (SUMMA's `-g gru_start gru_count` argument) with several SUMMA processes at the same
+# time, without a job scheduler. This is the local equivalent of running `1_run_summa_as_array.sh` as an array job, for
+# use on a large workstation or an interactive node. Reads all the required info from `control_active.txt`.
+#
+# Chunks:
+# - If the GRUs are partitioned into blocks with balanced run times (`settings_summa_block_tasks`), each range in the
+#   block list is a chunk;
+# - Otherwise, if the inputs are pre-split into blocks of `settings_summa_block_size` GRUs, each block is a chunk;
+# - Otherwise, the GRUs are divided into `chunks_per_process` chunks per process, so that processes that finish early
+#   pick up the remaining chunks.
+# As in `1_run_summa_as_array.sh`, a chunk that has a pre-split GRU block (see 5_model_input/SUMMA/2_gru_blocks) is run
+# with the block's own file manager.
+#
+# Usage: python 1_run_summa_parallel.py [optional: gru_list.txt]
+# The optional argument is a file with one 'gru_start gru_count' line per chunk, which is then used instead of the
+# chunks above (e.g. a list of failed GRU ranges written by `1_rerun_failed_summa.py`).
+#
+# Workflow:
+# - Find the SUMMA executable, settings and log folder, and the number of GRUs in the attributes file;
+# - Define the chunks and put these in a work queue;
+# - Run up to `experiment_summa_processes` SUMMA processes at the same time, each writing its own log;
+# - Run chunks that fail again, up to `experiment_summa_retries` times;
+# - Report the chunks that still failed.
+#
+# Notes:
+# - Logs are written the same way as by `1_run_summa_as_array.sh`: to `summa_log_[chunk number].txt` in the SUMMA log
+#   folder (`summa_log_[list name]_[chunk number].txt` for chunks from a GRU list), with the SUMMA command on the first
+#   line. The log tools in `0_tools` can be used on these logs as usual;
+# - Each retry of a chunk writes its own log (`summa_log_[chunk number]_attempt[n].txt`), so that the logs of failed
+#   attempts are kept. Retry logs left by an earlier run of the same chunks are removed when the run starts;
+# - The script exits with status 1 if any chunk still failed, after writing the provenance log;
+# - The settings backup (`experiment_backup_settings`) keeps files that are already in the backup folder, as the array
+#   job does, so that the backup shows the settings of the first run;
+# - A run has succeeded if SUMMA returns without error and its log ends with SUMMA's final 'successfully' message;
+# - The number of processes is taken from environment variable `SLURM_CPUS_PER_TASK` if it exists and is otherwise equal
+#   to the number of CPUs, unless `experiment_summa_processes` is set;
+# - Script `0_tools/SUMMA_stub.py` mimics SUMMA's command line and log messages and can be used to test this script.
+
+# modules
+import os
+import sys
+import shutil
+import subprocess
+import numpy as np
+import netCDF4 as nc4
+from pathlib import Path
+from shutil import copyfile
+from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+
+# --- Control file handling
+# Easy access to control file folder
+controlFolder = Path('../0_control_files')
+
+# Store the name of the 'active' file in a variable
+controlFile = 'control_active.txt'
+
+# Function to extract a given setting from the control file
+def read_from_control( file, setting ):
+
+    # Open 'control_active.txt' and ...
+    with open(file) as contents:
+        for line in contents:
+
+            # ... find the line with the requested setting
+            if setting in line and not line.startswith('#'):
+                break
+
+    # Extract the setting's value
+    substring = line.split('|',1)[1]      # Remove the setting's name (split into 2 based on '|', keep only 2nd part)
+    substring = substring.split('#',1)[0] # Remove comments, does nothing if no '#' is found
+    substring = substring.strip()         # Remove leading and trailing whitespace, tabs, newlines
+
+    # Return this value
+    return substring
+
+# Function to specify a default path
+def make_default_path(suffix):
+
+    # Get the root path
+    rootPath = Path( read_from_control(controlFolder/controlFile,'root_path') )
+
+    # Get the domain folder
+    domainName = read_from_control(controlFolder/controlFile,'domain_name')
+    domainFolder = 'domain_' + domainName
+
+    # Specify the forcing path
+    defaultPath = rootPath / domainFolder / suffix
+
+    return defaultPath
+
+
+# --- Settings
+# Number of chunks per process if the GRUs are not divided into blocks
+chunks_per_process = 4
+
+# Number of lines at the end of each log that are checked for SUMMA's final message
+log_tail_lines = 30
+
+
+# --- Find the SUMMA executable
+# SUMMA install path
+summa_path = read_from_control(controlFolder/controlFile,'install_path_summa')
+
+# Specify default path if needed
+if summa_path == 'default':
+    summa_path = Path( read_from_control(controlFolder/controlFile,'root_path') ) / 'installs/summa/bin' # outputs a Path()
+else:
+    summa_path = Path(summa_path) # make sure a user-specified path is a Path()
+
+# SUMMA executable
+summa_exe = summa_path / read_from_control(controlFolder/controlFile,'exe_name_summa')
+
+
+# --- Find the SUMMA settings
+# Settings path
+settings_path = read_from_control(controlFolder/controlFile,'settings_summa_path')
+
+# Specify default path if needed
+if settings_path == 'default':
+    settings_path = make_default_path('settings/SUMMA') # outputs a Path()
+else:
+    settings_path = Path(settings_path) # make sure a user-specified path is a Path()
+
+# File names of setting files
+filemanager_name = read_from_control(controlFolder/controlFile,'settings_summa_filemanager')
+attributes_nc    = read_from_control(controlFolder/controlFile,'settings_summa_attributes')
+
+
+# --- Find the GRU blocks, if any
+# Block size, number of blocks with balanced run times and block list name
+block_size  = int(read_from_control(controlFolder/controlFile,'settings_summa_block_size'))
+block_tasks = int(read_from_control(controlFolder/controlFile,'settings_summa_block_tasks'))
+block_list  = read_from_control(controlFolder/controlFile,'settings_summa_block_list')
+
+# Block path
+block_path = read_from_control(controlFolder/controlFile,'settings_summa_block_path')
+
+# Specify default path if needed
+if block_path == 'default':
+    block_path = make_default_path('settings/SUMMA_gru_blocks') # outputs a Path()
+else:
+    block_path = Path(block_path) # make sure a user-specified path is a Path()
+
+
+# --- Find where the outputs and logs need to go
+# Experiment ID
+experiment_id = read_from_control(controlFolder/controlFile,'experiment_id')
+
+# SUMMA output path
+summa_out_path = read_from_control(controlFolder/controlFile,'experiment_output_summa')
+
+# Specify default path if needed
+if summa_out_path == 'default':
+    summa_out_path = make_default_path('simulations/' + experiment_id + '/SUMMA') # outputs a Path()
+else:
+    summa_out_path = Path(summa_out_path) # make sure a user-specified path is a Path()
+
+# SUMMA log path
+summa_log_path = read_from_control(controlFolder/controlFile,'experiment_log_summa')
+
+# Specify default path if needed
+if summa_log_path == 'default':
+    summa_log_path = make_default_path('simulations/' + experiment_id + '/SUMMA/SUMMA_logs') # outputs a Path()
+else:
+    summa_log_path = Path(summa_log_path) # make sure a user-specified path is a Path()
+
+# Settings backup
+do_backup = read_from_control(controlFolder/controlFile,'experiment_backup_settings')
+
+
+# --- Find the number of processes and retries
+# Number of SUMMA processes at the same time
+n_processes = read_from_control(controlFolder/controlFile,'experiment_summa_processes')
+if n_processes == 'default':
+    n_processes = int(os.environ.get('SLURM_CPUS_PER_TASK', default=os.cpu_count() or 1))
+else:
+    n_processes = int(n_processes)
+
+# Number of times a failed chunk is run again
+n_retries = int(read_from_control(controlFolder/controlFile,'experiment_summa_retries'))
+
+
+# --- Handle input arguments
+# Optional list of GRU ranges; logs of these chunks are named after the list
+if len(sys.argv) > 1:
+    gru_list = Path(sys.argv[1])
+    log_prefix = 'summa_log_' + gru_list.stem + '_'
+else:
+    gru_list = None
+    log_prefix = 'summa_log_'
+
+
+# --- Functions
+# Function to find the log name of an attempt to run a chunk. The first attempt uses the same name as the array job
+# script; each retry gets its own log
+def log_name(task, attempt):
+    if attempt == 1:
+        return '{}{}.txt'.format(log_prefix, task)
+    return '{}{}_attempt{}.txt'.format(log_prefix, task, attempt)
+
+# Function to find the SUMMA command for a chunk of GRUs. Uses the pre-split GRU block with the same GRUs if it
+# exists, and SUMMA's -g argument otherwise
+def summa_command(gru_start, gru_count):
+    block_dir = block_path / 'G{:06d}-{:06d}'.format(gru_start, gru_start+gru_count-1)
+    if (block_size > 0 or block_tasks > 0) and block_dir.is_dir():
+        return [str(summa_exe), '-m', str(block_dir/filemanager_name)]
+    return [str(summa_exe), '-g', str(gru_start), str(gru_count), '-m', str(settings_path/filemanager_name)]
+
+# Function to check if a log ends with SUMMA's final 'successfully' message. Returns SUMMA's error message, or the last
+# line of the log if the run stopped without one
+def check_log(log_file):
+    with open(log_file) as log:
+        tail = deque(log, maxlen=log_tail_lines)
+    if any('successfully' in line for line in tail):
+        return None
+    for line in tail:
+        if 'FATAL ERROR' in line:
+            return line.strip()
+    return 'terminated early at: ' + (tail[-1].strip() if len(tail) > 0 else 'empty log')
+
+# Function to copy a settings file to the backup folder, unless an earlier run already backed it up (as `cp -n` in
+# `1_run_summa_as_array.sh`)
+def copy_if_new(src, dst):
+    if not os.path.exists(dst):
+        shutil.copy2(src, dst)
+    return dst
+
+# Function to run SUMMA for a single chunk of GRUs. Returns the chunk and an error message, which is None if the run
+# succeeded
+def run_chunk(chunk, attempt):
+    task, gru_start, gru_count = chunk
+    command = summa_command(gru_start, gru_count)
+    log_file = summa_log_path / log_name(task, attempt)
+    with open(log_file, 'w') as log:
+        log.write(' '.join(command) + '\n') # first line of the log records the GRU range of this run
+        log.flush()
+        result = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT)
+    error = check_log(log_file)
+    if result.returncode != 0 and error is None:
+        error = 'SUMMA returned exit code {}'.format(result.returncode)
+    return chunk, error
+
+
+# --- Define the chunks
+# Number of GRUs in the domain
+with nc4.Dataset(settings_path/attributes_nc) as att:
+    n_gru = len(att.dimensions['gru'])
+
+# Find the GRU ranges (start, count) of the chunks; GRU numbers count from 1, as in SUMMA's -g argument
+if gru_list is not None:
+    gru_ranges = [tuple(gru_range) for gru_range in np.loadtxt(gru_list, dtype=int, ndmin=2)]
+elif block_tasks > 0:
+    gru_ranges = [tuple(gru_range) for gru_range in np.loadtxt(block_path/block_list, dtype=int, ndmin=2)]
+else:
+    chunk_size = block_size if block_size > 0 else int(np.ceil(n_gru / (n_processes * chunks_per_process)))
+    gru_ranges = [(gru_start+1, min(chunk_size, n_gru-gru_start)) for gru_start in range(0, n_gru, chunk_size)]
+
+# Chunks are numbered from 1, as array tasks
+chunks = [(task+1, int(gru_start), int(gru_count)) for task,(gru_start,gru_count) in enumerate(gru_ranges)]
+print('Running SUMMA for {} GRUs in {} chunks, with {} processes'.format(n_gru, len(chunks), n_processes))
+
+
+# --- Run
+# Do the settings backup if needed
+if do_backup == 'yes':
+    shutil.copytree(settings_path, summa_out_path/'run_settings', dirs_exist_ok=True, copy_function=copy_if_new)
+
+# Remove retry logs of an earlier run of these chunks, so that these can't be mistaken for retries of this run
+summa_log_path.mkdir(parents=True, exist_ok=True)
+for task,_,_ in chunks:
+    for file in summa_log_path.glob('{}{}_attempt*.txt'.format(log_prefix, task)):
+        file.unlink()
+
+# Run the chunks from a work queue; failed chunks are put back in the queue until they have no retries left
+attempts = {chunk: 0 for chunk in chunks}
+queue = deque(chunks)
+failed = {}
+with ThreadPoolExecutor(max_workers=n_processes) as pool: # threads only wait for their SUMMA process
+    running = set()
+    while len(queue) > 0 or len(running) > 0:
+        while len(queue) > 0 and len(running) < n_processes:
+            chunk = queue.popleft()
+            attempts[chunk] += 1
+            running.add(pool.submit(run_chunk, chunk, attempts[chunk]))
+        done, running = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            chunk, error = future.result()
+            if error is None:
+                failed.pop(chunk, None)
+                print('Chunk {} (GRUs {} to {}) finished'.format(chunk[0], chunk[1], chunk[1]+chunk[2]-1))
+                continue
+            failed[chunk] = error
+            print('Chunk {} (GRUs {} to {}) failed in attempt {}: {}'.format(chunk[0], chunk[1], chunk[1]+chunk[2]-1,
+                                                                           attempts[chunk], error))
+            if attempts[chunk] <= n_retries:
+                queue.append(chunk)
+
+# Report the chunks that failed
+if len(failed) > 0:
+    print('{} of {} chunks failed, see the logs in {}:'.format(len(failed), len(chunks), summa_log_path))
+    for chunk in sorted(failed):
+        print('- {} (GRUs {} to {}): {}'.format(log_name(chunk[0], attempts[chunk]), chunk[1],
+                                               chunk[1]+chunk[2]-1, failed[chunk]))
+else:
+    print('All {} chunks finished successfully'.format(len(chunks)))
+
+
+# --- Code provenance
+# Generates a basic log file in the domain folder and copies the control file and itself there.
+
+# Set the log path and file name
+logPath = summa_out_path
+log_suffix = '_SUMMA_run_parallel_log.txt'
+
+# Create a log folder
+logFolder = '_workflow_log'
+Path( logPath / logFolder ).mkdir(parents=True, exist_ok=True)
+
+# Copy this script
+thisFile = '1_run_summa_parallel.py'
+copyfile(thisFile, logPath / logFolder / thisFile);
+
+# Get current date and time
+now = datetime.now()
+
+# Create a log file
+logFile = now.strftime('%Y%m%d') + log_suffix
+with open( logPath / logFolder / logFile, 'w') as file:
+
+    lines = ['Log generated by ' + thisFile + ' on ' + now.strftime('%Y/%m/%d %H:%M:%S') + '\n',
+             'Ran SUMMA for {} GRUs in {} chunks with {} processes; {} chunks failed.'.format(n_gru, len(chunks),
+                                                                                            n_processes, len(failed))]
+    for txt in lines:
+        file.write(txt)
+
+# Let the caller (e.g. `1_rerun_failed_summa.py`) know that some chunks failed
+if len(failed) > 0:
+    sys.exit(1)
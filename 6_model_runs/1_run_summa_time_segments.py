@@ -0,0 +1,391 @@
+#!/usr/bin/env python
+# Run SUMMA in parallel over time segments
+# SUMMA runs can be split into chunks of GRUs, but each GRU is simulated serially in time. This script instead splits
+# the simulation period into `experiment_segment_count` segments that are run at the same time, so that long runs of
+# small domains can use more processes. Each segment starts `experiment_segment_warmup` days before its own period, from
+# the domain's initial conditions, so that the model states have time to spin up. The outputs of the segments are then
+# stitched into single output files, without the warm-up periods. Reads all the required info from `control_active.txt`.
+#
+# Workflow:
+# - Find the simulation period in the domain's file manager and divide it into segments of equal length (segment
+#   boundaries are rounded to the start of a day);
+# - Prepare a settings folder for each segment, with a file manager for the segment's period (including warm-up) and
+#   a forcing file list with only the forcing files that overlap this period;
+# - Run up to `experiment_summa_processes` segments at the same time, each writing its own log;
+# - Stitch the outputs of the segments into single files in the SUMMA output folder, discarding the warm-up periods;
+# - Report how much the warm-up of each segment differs from the previous segment(s) over the overlapping period
+#   (`segment_seams.txt` in the SUMMA output folder). If the differences at the end of the warm-up are not small, the
+#   warm-up period is too short to remove the effect of the initial conditions.
+#
+# Notes:
+# - Segments run in `segments/segment_[n]` in the SUMMA output folder; their logs go to `segments` in the SUMMA log
+#   folder, with the SUMMA command on the first line;
+# - The difference of a variable between a warm-up and the previous segment(s) is reported as the mean absolute
+#   difference divided by the mean absolute value of the previous segment(s), at the start, a quarter, halfway,
+#   three-quarters and end of the overlap. Only variables with a time dimension are compared;
+# - Stitched outputs are only written if all segments finished successfully. Outputs are read into memory while
+#   stitching, so this is intended for domains with a limited number of GRUs;
+# - The number of processes is taken from environment variable `SLURM_CPUS_PER_TASK` if it exists and is otherwise equal
+#   to the number of CPUs, unless `experiment_summa_processes` is set.
+
+# modules
+import os
+import sys
+import subprocess
+import numpy as np
+import pandas as pd
+import xarray as xr
+from pathlib import Path
+from shutil import copyfile
+from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Domain HRU index, see 0_tools/forcing_index.py
+sys.path.append('../0_tools')
+import forcing_index
+
+
+
+# --- Control file handling
+# Easy access to control file folder
+controlFolder = Path('../0_control_files')
+
+# Store the name of the 'active' file in a variable
+controlFile = 'control_active.txt'
+
+# Function to extract a given setting from the control file
+def read_from_control( file, setting ):
+
+    # Open 'control_active.txt' and ...
+    with open(file) as contents:
+        for line in contents:
+
+            # ... find the line with the requested setting
+            if setting in line and not line.startswith('#'):
+                break
+
+    # Extract the setting's value
+    substring = line.split('|',1)[1]      # Remove the setting's name (split into 2 based on '|', keep only 2nd part)
+    substring = substring.split('#',1)[0] # Remove comments, does nothing if no '#' is found
+    substring = substring.strip()         # Remove leading and trailing whitespace, tabs, newlines
+
+    # Return this value
+    return substring
+
+# Function to specify a default path
+def make_default_path(suffix):
+
+    # Get the root path
+    rootPath = Path( read_from_control(controlFolder/controlFile,'root_path') )
+
+    # Get the domain folder
+    domainName = read_from_control(controlFolder/controlFile,'domain_name')
+    domainFolder = 'domain_' + domainName
+
+    # Specify the forcing path
+    defaultPath = rootPath / domainFolder / suffix
+
+    return defaultPath
+
+
+# --- Settings
+# Number of lines at the end of each log that are checked for SUMMA's final message
+log_tail_lines = 30
+
+# Fractions of the overlap between segments at which differences are reported
+seam_fractions = [0, 0.25, 0.5, 0.75, 1]
+
+
+# --- Find the SUMMA executable
+# SUMMA install path
+summa_path = read_from_control(controlFolder/controlFile,'install_path_summa')
+
+# Specify default path if needed
+if summa_path == 'default':
+    summa_path = Path( read_from_control(controlFolder/controlFile,'root_path') ) / 'installs/summa/bin' # outputs a Path()
+else:
+    summa_path = Path(summa_path) # make sure a user-specified path is a Path()
+
+# SUMMA executable
+summa_exe = summa_path / read_from_control(controlFolder/controlFile,'exe_name_summa')
+
+
+# --- Find the SUMMA settings and forcing
+# Settings path
+settings_path = read_from_control(controlFolder/controlFile,'settings_summa_path')
+
+# Specify default path if needed
+if settings_path == 'default':
+    settings_path = make_default_path('settings/SUMMA') # outputs a Path()
+else:
+    settings_path = Path(settings_path) # make sure a user-specified path is a Path()
+
+# File names of setting files
+filemanager_name      = read_from_control(controlFolder/controlFile,'settings_summa_filemanager')
+forcing_file_list_txt = read_from_control(controlFolder/controlFile,'settings_summa_forcing_list')
+
+# Forcing time step [s]
+data_step = int(read_from_control(controlFolder/controlFile,'forcing_time_step_size'))
+
+# Domain HRU index path & name; contains the time period of each forcing file
+forcing_index_path = read_from_control(controlFolder/controlFile,'forcing_index_path')
+forcing_index_name = read_from_control(controlFolder/controlFile,'forcing_index_name')
+
+# Specify default path if needed
+if forcing_index_path == 'default':
+    forcing_index_path = make_default_path('forcing/5_forcing_index') # outputs a Path()
+else:
+    forcing_index_path = Path(forcing_index_path) # make sure a user-specified path is a Path()
+
+
+# --- Find where the outputs and logs need to go
+# Experiment ID
+experiment_id = read_from_control(controlFolder/controlFile,'experiment_id')
+
+# SUMMA output path
+summa_out_path = read_from_control(controlFolder/controlFile,'experiment_output_summa')
+
+# Specify default path if needed
+if summa_out_path == 'default':
+    summa_out_path = make_default_path('simulations/' + experiment_id + '/SUMMA') # outputs a Path()
+else:
+    summa_out_path = Path(summa_out_path) # make sure a user-specified path is a Path()
+
+# SUMMA log path
+summa_log_path = read_from_control(controlFolder/controlFile,'experiment_log_summa')
+
+# Specify default path if needed
+if summa_log_path == 'default':
+    summa_log_path = make_default_path('simulations/' + experiment_id + '/SUMMA/SUMMA_logs') # outputs a Path()
+else:
+    summa_log_path = Path(summa_log_path) # make sure a user-specified path is a Path()
+
+# Segments go into subfolders of the output and log folders
+segment_path = summa_out_path / 'segments'
+segment_log_path = summa_log_path / 'segments'
+
+
+# --- Find the segments, warm-up and number of processes
+# Number of segments and warm-up period [days]
+n_segments = int(read_from_control(controlFolder/controlFile,'experiment_segment_count'))
+warmup = pd.Timedelta(days=float(read_from_control(controlFolder/controlFile,'experiment_segment_warmup')))
+if n_segments <= 1:
+    print('experiment_segment_count is {}, the simulation period is not split into segments.'.format(n_segments))
+    sys.exit(0)
+
+# Number of SUMMA processes at the same time
+n_processes = read_from_control(controlFolder/controlFile,'experiment_summa_processes')
+if n_processes == 'default':
+    n_processes = int(os.environ.get('SLURM_CPUS_PER_TASK', default=os.cpu_count() or 1))
+else:
+    n_processes = int(n_processes)
+
+
+# --- Functions
+# Function to find the value of a setting in the file manager
+def read_from_filemanager(filemanager, setting):
+    for line in filemanager:
+        if line.startswith(setting):
+            return line.split("'")[1]
+    raise KeyError('{} not found in file manager {}'.format(setting, settings_path/filemanager_name))
+
+# Function to write the settings of a segment: copies of the domain's settings, a forcing file list for the segment's
+# period and a file manager with the segment's period, settings and output folder
+def prepare_segment(segment):
+    path = segment['path']
+    (path/'settings').mkdir(parents=True, exist_ok=True)
+
+    # Copy the settings that are the same for all segments
+    for file in settings_path.iterdir():
+        if file.is_file() and file.name not in [filemanager_name, forcing_file_list_txt]:
+            copyfile(file, path/'settings'/file.name)
+
+    # List the forcing files of this segment's period
+    if index is not None:
+        forcing_files = forcing_index.files_in_period(index, segment['run_start'], segment['end'])
+        for problem in forcing_index.check_coverage(index, forcing_files, segment['run_start'], segment['end']):
+            print('Warning: {}: {}'.format(segment['name'], problem))
+        with open(path/'settings'/forcing_file_list_txt, 'w') as file:
+            for name in forcing_files:
+                file.write(name + '\n')
+    else:
+        copyfile(settings_path/forcing_file_list_txt, path/'settings'/forcing_file_list_txt)
+
+    # Write the file manager
+    with open(path/'settings'/filemanager_name, 'w') as fm:
+        for line in filemanager:
+            if line.startswith('simStartTime'):
+                line = "simStartTime         '{}' ! \n".format(segment['run_start'].strftime('%Y-%m-%d %H:%M'))
+            elif line.startswith('simEndTime'):
+                line = "simEndTime           '{}' ! \n".format(segment['end'].strftime('%Y-%m-%d %H:%M'))
+            elif line.startswith('settingsPath'):
+                line = "settingsPath         '{}/' ! \n".format(path/'settings')
+            elif line.startswith('outputPath'):
+                line = "outputPath           '{}/' ! \n".format(path)
+            fm.write(line)
+    return
+
+# Function to check if a log ends with SUMMA's final 'successfully' message. Returns SUMMA's error message, or the last
+# line of the log if the run stopped without one
+def check_log(log_file):
+    with open(log_file) as log:
+        tail = deque(log, maxlen=log_tail_lines)
+    if any('successfully' in line for line in tail):
+        return None
+    for line in tail:
+        if 'FATAL ERROR' in line:
+            return line.strip()
+    return 'terminated early at: ' + (tail[-1].strip() if len(tail) > 0 else 'empty log')
+
+# Function to run SUMMA for a single segment. Returns the segment and an error message, which is None if the run
+# succeeded
+def run_segment(segment):
+    command = [str(summa_exe), '-m', str(segment['path']/'settings'/filemanager_name)]
+    log_file = segment_log_path / 'summa_log_{}.txt'.format(segment['name'])
+    with open(log_file, 'w') as log:
+        log.write(' '.join(command) + '\n')
+        log.flush()
+        result = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT)
+    error = check_log(log_file)
+    if result.returncode != 0 and error is None:
+        error = 'SUMMA returned exit code {}'.format(result.returncode)
+    return segment, error
+
+# Function to find the relative difference between a warm-up period and a reference over the same time steps, at a
+# number of fractions of the overlap. Returns None if the two don't overlap
+def seam_difference(warm, ref):
+    times = np.intersect1d(warm['time'].values, ref['time'].values)
+    if len(times) == 0:
+        return None
+    diffs = []
+    for fraction in seam_fractions:
+        time = times[int(round(fraction * (len(times)-1)))]
+        a = warm.sel(time=time).values.astype(float)
+        b = ref.sel(time=time).values.astype(float)
+        scale = np.nanmean(np.abs(b))
+        diffs.append(np.nanmean(np.abs(a-b)) / scale if scale > 0 else np.nanmean(np.abs(a-b)))
+    return pd.Timestamp(times[0]), pd.Timestamp(times[-1]), diffs
+
+
+# --- Define the segments
+# Read the domain's file manager and find the simulation period
+with open(settings_path/filemanager_name) as file:
+    filemanager = file.readlines()
+sim_start = pd.Timestamp(read_from_filemanager(filemanager, 'simStartTime'))
+sim_end   = pd.Timestamp(read_from_filemanager(filemanager, 'simEndTime'))
+step = pd.Timedelta(seconds=data_step)
+
+# Segment boundaries; each segment ends one time step before the next one starts
+edges = pd.date_range(sim_start, sim_end + step, periods=n_segments+1).floor('D')
+edges = edges[:1].union(edges[1:-1]).union([sim_start, sim_end + step])
+if len(edges) != n_segments+1:
+    raise ValueError('Simulation period {} to {} is too short for {} segments of at least a day.'.format(
+                      sim_start, sim_end, n_segments))
+
+# Define the segments; each starts 'warmup' before its own period, but not before the simulation start
+segments = []
+for i in range(n_segments):
+    name = 'segment_{:02d}'.format(i+1)
+    segments.append({'name': name,
+                     'path': segment_path/name,
+                     'start': edges[i],
+                     'end': edges[i+1] - step,
+                     'run_start': max(sim_start, edges[i] - warmup)})
+    print('{}: {} to {}, warm-up from {}'.format(name, segments[-1]['start'], segments[-1]['end'],
+                                                 segments[-1]['run_start']))
+
+# Read the forcing index, if any, to list only the forcing files each segment needs
+if (forcing_index_path/forcing_index_name).is_file():
+    index = forcing_index.read_index(forcing_index_path/forcing_index_name)
+else:
+    index = None
+
+
+# --- Run the segments
+for segment in segments:
+    prepare_segment(segment)
+segment_log_path.mkdir(parents=True, exist_ok=True)
+failed = {}
+with ThreadPoolExecutor(max_workers=n_processes) as pool: # threads only wait for their SUMMA process
+    for segment,error in pool.map(run_segment, segments):
+        if error is None:
+            print('{} finished'.format(segment['name']))
+        else:
+            print('{} failed: {}'.format(segment['name'], error))
+            failed[segment['name']] = error
+if len(failed) > 0:
+    print('{} of {} segments failed, see the logs in {}. Outputs are not stitched.'.format(len(failed), len(segments),
+                                                                                             segment_log_path))
+    sys.exit(1)
+
+
+# --- Stitch the outputs and report the differences at the seams
+report = ['Differences between the warm-up of each segment and the previous segment(s), as mean absolute difference '
+          'divided by the mean absolute value of the previous segment(s)\n',
+          'Warm-up: {} days; columns: fraction of the overlap {}\n'.format(warmup.days, seam_fractions)]
+output_files = sorted(file.name for file in segments[0]['path'].glob('*.nc'))
+for output_file in output_files:
+    report.append('\n{}\n'.format(output_file))
+
+    # Open the outputs of all segments
+    outputs = [xr.open_dataset(segment['path']/output_file) for segment in segments]
+    time_vars = [name for name,var in outputs[0].data_vars.items() if 'time' in var.dims and var.dtype.kind in 'fiu']
+
+    # Keep each segment's own period; the warm-up is discarded
+    kept = [output.sel(time=slice(segment['start'], segment['end'])) for output,segment in zip(outputs,segments)]
+
+    # Compare each warm-up with the kept outputs of the segments before it
+    for i in range(1,len(segments)):
+        warm = outputs[i].sel(time=slice(segments[i]['run_start'], segments[i]['start'] - step))
+        ref = xr.concat(kept[:i], dim='time', data_vars='minimal', coords='minimal', compat='override')
+        for name in time_vars:
+            seam = seam_difference(warm[name], ref[name])
+            if seam is None:
+                continue
+            overlap_start, overlap_end, diffs = seam
+            report.append('{} {} ({} to {}): {}\n'.format(segments[i]['name'], name, overlap_start, overlap_end,
+                                                         ' '.join('{:.3g}'.format(diff) for diff in diffs)))
+
+    # Write the stitched output
+    stitched = xr.concat(kept, dim='time', data_vars='minimal', coords='minimal', compat='override')
+    stitched['time'].encoding = outputs[0]['time'].encoding
+    stitched.load().to_netcdf(summa_out_path/output_file)
+    for output in outputs:
+        output.close()
+    print('Stitched {}'.format(output_file))
+
+# Write the report
+with open(summa_out_path/'segment_seams.txt', 'w') as file:
+    for txt in report:
+        file.write(txt)
+print('Differences at the seams between segments are in {}'.format(summa_out_path/'segment_seams.txt'))
+
+
+# --- Code provenance
+# Generates a basic log file in the domain folder and copies the control file and itself there.
+
+# Set the log path and file name
+logPath = summa_out_path
+log_suffix = '_SUMMA_run_time_segments_log.txt'
+
+# Create a log folder
+logFolder = '_workflow_log'
+Path( logPath / logFolder ).mkdir(parents=True, exist_ok=True)
+
+# Copy this script
+thisFile = '1_run_summa_time_segments.py'
+copyfile(thisFile, logPath / logFolder / thisFile);
+
+# Get current date and time
+now = datetime.now()
+
+# Create a log file
+logFile = now.strftime('%Y%m%d') + log_suffix
+with open( logPath / logFolder / logFile, 'w') as file:
+
+    lines = ['Log generated by ' + thisFile + ' on ' + now.strftime('%Y/%m/%d %H:%M:%S') + '\n',
+             'Ran SUMMA from {} to {} in {} segments with {} days of warm-up, and stitched {} output files.'.format(
+              sim_start, sim_end, n_segments, warmup.days, len(output_files))]
+    for txt in lines:
+        file.write(txt)